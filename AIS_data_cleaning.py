@@ -8,12 +8,33 @@ Script to clean AIS data. Steps in the cleaning process include...
         1.3     Removing all non-containerships from dynamic database.
         1.4     Filtering for only navigation codes related to mission (0, 3, 4, 8).
         1.5     Filter out entries with Speed over Ground less than 5.
+        1.6     Take a sample of N containerships.
+
+The dynamic dataset can also be cleaned as a stream of bounded chunks, with
+the filters applied to each chunk as it is read (data_cleaning_streaming).
 
 
 A full description of the research and references used can be found in README.md
 """
 
 
+### Import libraries ###
+import numpy as np
+import pandas as pd
+
+
+# inclusive ranges of AIS ship type codes treated as containerships (7x)
+CONTAINERSHIP_TYPES = [(70, 79)]
+
+# dynamic fields used by the filters and the later pipeline stages
+DYNAMIC_FIELDS = ["sourcemmsi", "navigationalstatus", "speedoverground", "courseoverground", "lon", "lat", "t",
+                  "tobow", "tostern", "tostarboard", "toport", "draught"]
+
+# compact types for the dynamic fields used by the filters, with mmsi read as
+# float so blank mmsi's load as NaN (and are then filtered out)
+DYNAMIC_FILTER_DTYPES = {"sourcemmsi": np.float64, "navigationalstatus": np.float32, "speedoverground": np.float32}
+
+
 def remove_fields(static_dataset):
     """
     1.1 Removing unnecessary fields from the static dataset to reduce computation
@@ -37,55 +58,83 @@ def remove_fields(static_dataset):
 
 
 
-def containerships_index(static_data_rm):
+def containerships_index(static_data_rm, type_ranges=CONTAINERSHIP_TYPES):
     """
-    1.2 Generate dataframe of unique vessel mmsi numbers and their ship codes.
+    1.2 Generate dataframe of unique vessel mmsi numbers and their ship codes
+    for vessels reporting a ship type within the given ranges.
 
     Input:
 
             static_data_rm      static vessel dataset with unused fields
                                 removed.
+            type_ranges         list of inclusive (low, high) ship type code
+                                ranges to keep, containerships (7x) by
+                                default.
 
     Output:
 
             static_container    database of container vessel mmsi's and type
-                                codes.
+                                codes, one row per vessel sorted by mmsi.
 
     """
 
-    # establish empty dataframe
-    columns = ['mmsi', 'shiptype']
-    static_container = pd.DataFrame(columns=cols)
-
+    # parse ship types and mmsi's, invalid entries become NaN
+    shiptype = pd.to_numeric(static_data_rm["shiptype"], errors="coerce").values
+    mmsi = pd.to_numeric(static_data_rm["sourcemmsi"], errors="coerce").values
 
-    # for loop to extract containerships only
-    for ship_row in range(len(static_data_rm)):
-        # use try to account for invalid ship type entries
-        try:
-            # if ship type is a containership (type 7)
-            if str(int(static_data_rm["shiptype"][ship_row]))[0] == '7':
+    # select entries with a valid mmsi and a ship type code in range
+    in_range = np.zeros(len(static_data_rm), dtype=bool)
+    for type_low, type_high in type_ranges:
+        in_range |= (shiptype >= type_low) & (shiptype <= type_high)
 
-                static_container_temp = pd.DataFrame([[static_data_rm["sourcemmsi"][ship_row], int(static_data_rm["shiptype"][ship_row]])])
-                static_container_temp.columns = columns
-                static_container = pd.concat([static_container, static_container_temp], ignore_index=False)
+    valid = in_range & (shiptype == np.floor(shiptype)) & (mmsi > 0) & (mmsi <= np.iinfo(np.uint32).max)
 
-        except ValueError:
-            pass
+    type_codes = pd.DataFrame({"mmsi": mmsi[valid].astype(np.int64), "shiptype": shiptype[valid].astype(np.int64)})
 
+    # resolve vessels reporting several types to their most frequent type,
+    # with ties going to the lowest type code
+    type_counts = type_codes.groupby(["mmsi", "shiptype"]).size().reset_index(name="count")
+    type_counts = type_counts.sort_values(["mmsi", "count", "shiptype"], ascending=[True, False, True])
+    type_counts = type_counts.drop_duplicates(subset="mmsi")
 
-    # reformat and clean as required
-    static_container = static_container.T #??
-    static_container = static_container.drop_duplicates(subset=0) #??
-    static_container = static_container.drop([186295], axis=0) #??
+    static_container = pd.DataFrame({"mmsi": type_counts["mmsi"].values.astype(np.uint32),
+                                     "shiptype": type_counts["shiptype"].values.astype(np.uint8)})
 
     return static_container
 
 
 
 
+def is_member(values, sorted_set):
+    """
+    1.3 Test each value for membership of a sorted set with a binary search.
+
+    Input:
+
+            values              array of values (e.g. mmsi's).
+            sorted_set          sorted array of unique set members.
+
+    Output:
+
+            member              boolean array, True where the value is in the
+                                set.
+
+    """
+
+    if len(sorted_set) == 0:
+        return np.zeros(len(values), dtype=bool)
+
+    position = np.clip(np.searchsorted(sorted_set, values), 0, len(sorted_set) - 1)
+
+    return sorted_set[position] == values
+
+
+
+
 def filter_for_containerships(dynamic_dataset, static_container):
     """
-    1.3 Generate dataframe of unique vessel mmsi numbers and their ship codes.
+    1.3 Remove all non-containerships from the dynamic dataset by checking
+    each entry's mmsi for membership of the sorted containership mmsi's.
 
     Input:
 
@@ -100,21 +149,10 @@ def filter_for_containerships(dynamic_dataset, static_container):
 
     """
 
-    # convert to dictionary for processing speed
-    containership_dictionary = {}
-    for vessel_row in range(len(static_container)):
-        containership_dictionary.update({int(static_container["mmsi"][vessel_row]): int(static_container["mmsi"][vessel_row])})
-
-
-    # establish a list of rows in the dynamic dataset to be deleted
-    dynamic_rows_to_delete = []
+    # sorted unique containership mmsi's
+    containership_mmsi = np.unique(static_container["mmsi"].values.astype(np.int64))
 
-    # run through dynamic dataset
-    for dynamic_row in range(len(dynamic_dataset)):
-        if dynamic_dataset["sourcemmsi"][dynamic_row] not in containership_dictionary.keys():
-            dynamic_rows_to_delete.append(dynamic_row)
-
-    dynamic_container = dynamic_dataset.drop(dynamic_rows_to_delete, axis=0)
+    dynamic_container = dynamic_dataset[is_member(dynamic_dataset["sourcemmsi"].values, containership_mmsi)]
 
     return dynamic_container
 
@@ -141,21 +179,22 @@ def navigation_codes(dynamic_container):
     dynamic_navstat = dynamic_container[dynamic_container['navigationalstatus'].isin([0, 3, 4, 8])]
 
     # dropped automatically generated 'Unnamed: 0' field (could be improved)
-    dynamic_navstat = dynamic_navstat.drop("Unnamed: 0", axis=1)
+    dynamic_navstat = dynamic_navstat.drop("Unnamed: 0", axis=1, errors="ignore")
 
     return dynamic_navstat
 
 
 
 
-def SOG_above_5(dynamic_navstat):
+def SOG_above_5(dynamic_navstat, min_SOG=5.0):
     """
-    1.5 Filter for vessel speed over grounds of greater than 5.
+    1.5 Filter for vessel speed over grounds of greater than 5 (or min_SOG).
 
     Input:
 
             dynamic_navstat     dynamic AIS vessel dataset of containership
                                 movements with nav codes of 0, 3, 4, 8.
+            min_SOG             speed over ground threshold.
 
     Output:
 
@@ -164,7 +203,7 @@ def SOG_above_5(dynamic_navstat):
     """
 
     # filter AIS data for vessel speeds above 5 only
-    dynamic_cleaned = dynamic_navstat[dynamic_navstat["speedoverground"] > 5.0].reset_index().drop('index', axis=1)
+    dynamic_cleaned = dynamic_navstat[dynamic_navstat["speedoverground"] > min_SOG].reset_index().drop('index', axis=1)
 
     return dynamic_cleaned
 
@@ -194,7 +233,7 @@ def generate_sub_sample(dynamic_cleaned): # This should maybe be the first thing
     dynamic_sample = dynamic_cleaned[dynamic_cleaned["sourcemmsi"].isin(dynamic_mmsi_numbers)].reset_index().drop("index", axis=1)
 
     # remove fields that won't be features into the model
-    dynamic_sample = dynamic_sample.drop(["navigationalstatus", "rateofturn", "trueheading"], axis=1)
+    dynamic_sample = dynamic_sample.drop(["navigationalstatus", "rateofturn", "trueheading"], axis=1, errors="ignore")
 
     # option to save
     # dynamic_sample.to_csv("datasets/dynamic_sample.csv")
@@ -204,7 +243,7 @@ def generate_sub_sample(dynamic_cleaned): # This should maybe be the first thing
 
 
 
-def data_cleaning(static_dataset, dynamic_dataset):
+def data_cleaning(static_dataset, dynamic_dataset, min_SOG=5.0, sub_sample=True):
     """
     Compilation function.
 
@@ -212,6 +251,9 @@ def data_cleaning(static_dataset, dynamic_dataset):
 
             static_dataset      static vessel dataset.
             dynamic_dataset     dynamic AIS vessel dataset.
+            min_SOG             speed over ground threshold.
+            sub_sample          keep only a sample of N containerships (1.6),
+                                False to keep them all.
 
     Output:
 
@@ -221,17 +263,104 @@ def data_cleaning(static_dataset, dynamic_dataset):
 
     # filter preparation
     static_data_rm = remove_fields(static_dataset)
-    static_container = get_containerships_index(static_data_rm)
+    static_container = containerships_index(static_data_rm)
 
     # filtering
     dynamic_container = filter_for_containerships(dynamic_dataset, static_container)
-    dynamic_navstat = filter_by_navigation_codes(dynamic_container)
-    dynamic_cleaned = filter_by_SOG(dynamic_navstat)
+    dynamic_navstat = navigation_codes(dynamic_container)
+    dynamic_cleaned = SOG_above_5(dynamic_navstat, min_SOG)
 
-    # generate sample dataset for model creation
-    dynamic_sample = generate_sub_sample(dynamic_cleaned)
+    # generate sample dataset for model creation, or keep every containership
+    if sub_sample:
+        dynamic_sample = generate_sub_sample(dynamic_cleaned)
+    else:
+        dynamic_sample = dynamic_cleaned.drop(["navigationalstatus", "rateofturn", "trueheading"], axis=1, errors="ignore")
 
     # option to save cleaned dataset
     # dynamic_cleaned.to_csv("datasets/cleaned_dynamic.csv")
 
     return dynamic_sample
+
+
+
+
+def clean_dynamic_chunk(dynamic_chunk, static_container, min_SOG=5.0):
+    """
+    Apply the navigation code, speed over ground and containership filters
+    (1.3 - 1.5) to a chunk or batch of the dynamic dataset, cheapest filters
+    first.
+
+    Input:
+
+            dynamic_chunk       chunk of the dynamic AIS vessel dataset.
+            static_container    database of container vessel mmsi's and type
+                                codes.
+            min_SOG             speed over ground threshold.
+
+    Output:
+
+            dynamic_cleaned     cleaned entries of the chunk.
+
+    """
+
+    dynamic_navstat = navigation_codes(dynamic_chunk)
+    dynamic_speed = SOG_above_5(dynamic_navstat, min_SOG)
+    dynamic_cleaned = filter_for_containerships(dynamic_speed, static_container)
+
+    # blank mmsi's match no containership, so the rest are whole numbers
+    dynamic_cleaned = dynamic_cleaned.astype({"sourcemmsi": np.int64})
+
+    return dynamic_cleaned
+
+
+
+
+def data_cleaning_streaming(static_dataset, dynamic_filename, min_SOG=5.0, chunksize=1000000, usecols=DYNAMIC_FIELDS, dtype=DYNAMIC_FILTER_DTYPES,
+                            sub_sample=True):
+    """
+    Compilation function reading the dynamic dataset in bounded chunks. Each
+    chunk is filtered by navigation code, speed over ground and vessel type as
+    soon as it is read, so only surviving entries are held in memory.
+
+    Input:
+
+            static_dataset      static vessel dataset.
+            dynamic_filename    dynamic AIS vessel dataset (CSV).
+            min_SOG             speed over ground threshold.
+            chunksize           number of dynamic entries read per chunk.
+            usecols             dynamic fields to read, None for all fields.
+                                Defaults to the fields the pipeline uses.
+            dtype               types of the dynamic fields passed to the
+                                reader.
+            sub_sample          keep only a sample of N containerships (1.6),
+                                False to keep them all.
+
+    Output:
+
+            dynamic_sample      sample of dynamic dataset with N
+                                containerships, or every containership.
+
+    """
+
+    # filter preparation
+    static_data_rm = remove_fields(static_dataset)
+    static_container = containerships_index(static_data_rm)
+
+    # only pass types for fields that are read
+    if usecols is not None:
+        dtype = {field: field_type for field, field_type in dtype.items() if field in usecols}
+
+    # filtering, keeping surviving entries only
+    dynamic_chunks = []
+    for dynamic_chunk in pd.read_csv(dynamic_filename, chunksize=chunksize, usecols=usecols, dtype=dtype):
+        dynamic_chunks.append(clean_dynamic_chunk(dynamic_chunk, static_container, min_SOG))
+
+    dynamic_cleaned = pd.concat(dynamic_chunks, ignore_index=True)
+
+    # generate sample dataset for model creation, or keep every containership
+    if sub_sample:
+        dynamic_sample = generate_sub_sample(dynamic_cleaned)
+    else:
+        dynamic_sample = dynamic_cleaned.drop(["navigationalstatus", "rateofturn", "trueheading"], axis=1, errors="ignore")
+
+    return dynamic_sample
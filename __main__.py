@@ -12,29 +12,64 @@ Databases used in the study include..
         oceanic condition data              Boudiere et al (2013)
 
 
+Set MARITIME_PROFILE=report.json (and optionally MARITIME_CPROFILE=stage.prof)
+to write a per-stage timing, memory and cache report (see profiling.py).
+
+
 A full description of the research and references used can be found in README.md
 
 To-do/improvements...
 
     - add comments in
-    - combine monthly oceanic datasets in one
 
 """
 
 
 ### Import libraries ###
 import sys
-import math
-import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
 
 ### Import external functions ###
+import data_cache
+import schema
+import pipeline
+import profiling
+import ocean_cube
 import AIS_data_cleaning
+import feature_generation
 import ts_by_month
 import weather_data_cleaning
 import oceanic_matching
 import weather_matching
+import parallel_enrichment
+
+
+# speed over ground threshold (knots) for the data cleaning stage
+MIN_SOG = 5.0
+
+# memory-map mode of the cached input fields, which are read in their declared
+# types and so used without copying (None to read them into memory)
+MMAP_MODE = 'r'
+
+# oceanic fields read, leaving out depth (dpt) and water level (wlv)
+OCEAN_FIELDS = list(schema.OCEAN_SCHEMA)
+
+# oceanic matching method, "nearest" grid point or "linear" interpolation
+# between the bracketing grid points (see ocean_cube.interpolate_ocean_cube)
+OCEAN_METHOD = "nearest"
+
+# weather matching method, "nearest" station or "idw" blend of the nearest
+# stations within a radius (see weather_matching.match_weather_idw)
+WEATHER_METHOD = "nearest"
+
+# interpolate weather observations in time between reports rather than take
+# the closest report (see weather_matching.interpolate_observations)
+WEATHER_TIME_INTERPOLATION = False
+
+# match oceanic and weather parameters in a pool of worker processes (see
+# parallel_enrichment.py), with the same matchers and results as serially
+PARALLEL_ENRICHMENT = False
+ENRICHMENT_WORKERS = None
+
 
 
 def usage_check():
@@ -58,7 +93,7 @@ def usage_check():
 
 
 
-def load_AIS_data(data_dir):
+def load_AIS_data(data_dir, mmap_mode=None, memory_report=None):
     """
     0. Check terminal call usage and load dataset into pandas dataframe using
     arguments given from command line.
@@ -66,6 +101,10 @@ def load_AIS_data(data_dir):
     Inputs:
 
             data_dir        directory of datasets used.
+            mmap_mode       memory-map mode for cached numeric fields (e.g.
+                            'r'), None to read them into memory.
+            memory_report   list to record memory before and after
+                            downcasting to the declared schema, or None.
 
     Outputs:
 
@@ -80,14 +119,47 @@ def load_AIS_data(data_dir):
 
 
     # read datasets into dataframes
-    static_dataset = pd.read_csv(static_filename)
-    dynamic_dataset = pd.read_csv(dynamic_filename)
+    static_dataset = data_cache.cached_read_csv(static_filename, mmap_mode=mmap_mode, field_schema=schema.AIS_STATIC_SCHEMA)
+    dynamic_dataset = data_cache.cached_read_csv(dynamic_filename, mmap_mode=mmap_mode, field_schema=schema.AIS_DYNAMIC_SCHEMA)
+
+    # record memory use, the fields being parsed in their compact types
+    static_dataset = schema.compact_stage(static_dataset, schema.AIS_STATIC_SCHEMA, "load static", memory_report)
+    dynamic_dataset = schema.compact_stage(dynamic_dataset, schema.AIS_DYNAMIC_SCHEMA, "load dynamic", memory_report)
 
     return static_dataset, dynamic_dataset,
 
 
 
-def load_oceanic_data(data_dir):
+def load_static_data(data_dir, mmap_mode=None, memory_report=None):
+    """
+    0. Load the static vessel dataset alone, for when the dynamic AIS dataset
+    is streamed rather than loaded.
+
+    Inputs:
+
+            data_dir        directory of datasets used.
+            mmap_mode       memory-map mode for cached numeric fields (e.g.
+                            'r'), None to read them into memory.
+            memory_report   list to record memory before and after
+                            downcasting to the declared schema, or None.
+
+    Outputs:
+
+            static_df       static vessel dataset
+
+    """
+
+    # read dataset into dataframe
+    static_dataset = data_cache.cached_read_csv(data_dir + r'/nari_static.csv', mmap_mode=mmap_mode, field_schema=schema.AIS_STATIC_SCHEMA)
+
+    # record memory use, the fields being parsed in their compact types
+    static_dataset = schema.compact_stage(static_dataset, schema.AIS_STATIC_SCHEMA, "load static", memory_report)
+
+    return static_dataset
+
+
+
+def load_oceanic_data(data_dir, mmap_mode=None, memory_report=None):
     """
     0. Check terminal call usage and load dataset into pandas dataframe using
     arguments given from command line.
@@ -95,6 +167,10 @@ def load_oceanic_data(data_dir):
     Inputs:
 
             data_dir        directory of datasets used.
+            mmap_mode       memory-map mode for cached numeric fields (e.g.
+                            'r'), None to read them into memory.
+            memory_report   list to record memory before and after
+                            downcasting to the declared schema, or None.
 
     Outputs:
 
@@ -112,18 +188,26 @@ def load_oceanic_data(data_dir):
     oc_mar_filename = data_dir + r'/oc_march.csv'
 
     # read datasets into dataframes
-    oc_oct = pd.read_csv(oc_oct_filename).drop(['dpt', 'wlv'], axis=1)
-    oc_nov = pd.read_csv(oc_nov_filename).drop(['dpt', 'wlv'], axis=1)
-    oc_dec = pd.read_csv(oc_dec_filename).drop(['dpt', 'wlv'], axis=1)
-    oc_jan = pd.read_csv(oc_jan_filename).drop(['dpt', 'wlv'], axis=1)
-    oc_feb = pd.read_csv(oc_feb_filename).drop(['dpt', 'wlv'], axis=1)
-    oc_mar = pd.read_csv(oc_mar_filename).drop(['dpt', 'wlv'], axis=1)
+    oc_oct = data_cache.cached_read_csv(oc_oct_filename, mmap_mode=mmap_mode, field_schema=schema.OCEAN_SCHEMA, usecols=OCEAN_FIELDS)
+    oc_nov = data_cache.cached_read_csv(oc_nov_filename, mmap_mode=mmap_mode, field_schema=schema.OCEAN_SCHEMA, usecols=OCEAN_FIELDS)
+    oc_dec = data_cache.cached_read_csv(oc_dec_filename, mmap_mode=mmap_mode, field_schema=schema.OCEAN_SCHEMA, usecols=OCEAN_FIELDS)
+    oc_jan = data_cache.cached_read_csv(oc_jan_filename, mmap_mode=mmap_mode, field_schema=schema.OCEAN_SCHEMA, usecols=OCEAN_FIELDS)
+    oc_feb = data_cache.cached_read_csv(oc_feb_filename, mmap_mode=mmap_mode, field_schema=schema.OCEAN_SCHEMA, usecols=OCEAN_FIELDS)
+    oc_mar = data_cache.cached_read_csv(oc_mar_filename, mmap_mode=mmap_mode, field_schema=schema.OCEAN_SCHEMA, usecols=OCEAN_FIELDS)
+
+    # record memory use, the fields being parsed in their compact types
+    oc_oct = schema.compact_stage(oc_oct, schema.OCEAN_SCHEMA, "load ocean (oct)", memory_report)
+    oc_nov = schema.compact_stage(oc_nov, schema.OCEAN_SCHEMA, "load ocean (nov)", memory_report)
+    oc_dec = schema.compact_stage(oc_dec, schema.OCEAN_SCHEMA, "load ocean (dec)", memory_report)
+    oc_jan = schema.compact_stage(oc_jan, schema.OCEAN_SCHEMA, "load ocean (jan)", memory_report)
+    oc_feb = schema.compact_stage(oc_feb, schema.OCEAN_SCHEMA, "load ocean (feb)", memory_report)
+    oc_mar = schema.compact_stage(oc_mar, schema.OCEAN_SCHEMA, "load ocean (mar)", memory_report)
 
     return oc_oct, oc_nov, oc_dec, oc_jan, oc_feb, oc_mar
 
 
 
-def load_weather_data(data_dir):
+def load_weather_data(data_dir, mmap_mode=None, memory_report=None):
     """
     0. Check terminal call usage and load dataset into pandas dataframe using
     arguments given from command line.
@@ -131,6 +215,10 @@ def load_weather_data(data_dir):
     Inputs:
 
             data_dir        directory of datasets used.
+            mmap_mode       memory-map mode for cached numeric fields (e.g.
+                            'r'), None to read them into memory.
+            memory_report   list to record memory before and after
+                            downcasting to the declared schema, or None.
 
     Outputs:
 
@@ -145,9 +233,12 @@ def load_weather_data(data_dir):
     weather_wind_direction_filename = data_dir + r'/table_windDirection.csv'
 
     # read datasets into dataframes
-    weather_observation = pd.read_csv(weather_observation_filename)
-    weather_stations = pd.read_csv(weather_stations_filename)
-    weather_wind_direction = pd.read_csv(weather_wind_direction_filename)
+    weather_observation = data_cache.cached_read_csv(weather_observation_filename, mmap_mode=mmap_mode, field_schema=schema.WEATHER_OBSERVATION_SCHEMA)
+    weather_stations = weather_data_cleaning.load_station_dimension(weather_stations_filename)
+    weather_wind_direction = data_cache.cached_read_csv(weather_wind_direction_filename, mmap_mode=mmap_mode)
+
+    # record memory use, the fields being parsed in their compact types
+    weather_observation = schema.compact_stage(weather_observation, schema.WEATHER_OBSERVATION_SCHEMA, "load weather", memory_report)
 
     return weather_observation, weather_stations, weather_wind_direction
 
@@ -155,71 +246,70 @@ def load_weather_data(data_dir):
 
 if __name__ == '__main__':
 
-    # 0. Import datasets
-    static_dataset, dynamic_dataset = load_AIS_data()
-    oc_oct, oc_nov, oc_dec, oc_jan, oc_feb, oc_mar = load_oceanic_data()
-    weather_observation, weather_stations, weather_wind_direction = load_weather_data() # weather_wind_direction not used
-
-    # 1. Data cleaning and generation of sample
-    dynamic_sample = AIS_data_cleaning(static_dataset, dynamic_dataset)
+    # 0. Import datasets (the dynamic AIS dataset is streamed in step 1),
+    # memory-mapped from the data cache, with each later stage checkpointed
+    # and skipped while its inputs are unchanged
+    data_dir = usage_check()
+    memory_report = []
+    profiling.enable_from_environment()
+    runner = pipeline.new_runner(data_dir + r'/.checkpoints')
+
+    static_dataset = pipeline.run_stage(runner, "load static", load_static_data, data_dir, mmap_mode=MMAP_MODE, checkpoint=False, depends_on=[data_cache, schema],
+                                        files=[data_dir + r'/nari_static.csv'], untracked={"memory_report": memory_report})
+    oc_months = pipeline.run_stage(runner, "load oceanic", load_oceanic_data, data_dir, mmap_mode=MMAP_MODE, checkpoint=False, depends_on=[data_cache, schema],
+                                   files=[data_dir + '/' + oc_filename for oc_filename in ocean_cube.OCEAN_FILENAMES], untracked={"memory_report": memory_report})
+    weather_observation, weather_stations, weather_wind_direction = pipeline.run_stage(runner, "load weather", load_weather_data, data_dir, mmap_mode=MMAP_MODE, checkpoint=False,
+                                   depends_on=[data_cache, schema, weather_data_cleaning],
+                                   files=[data_dir + r'/table_weather_observation.csv', data_dir + r'/table_weatherStation.csv', data_dir + r'/table_windDirection.csv'],
+                                   untracked={"memory_report": memory_report})
+
+    # 1. Data cleaning of streamed dynamic dataset and generation of sample
+    dynamic_sample = pipeline.run_stage(runner, "data cleaning", AIS_data_cleaning.data_cleaning_streaming, static_dataset, data_dir + r'/nari_dynamic.csv', min_SOG=MIN_SOG)
+    dynamic_sample = pipeline.run_stage(runner, "compact cleaning", schema.compact_stage, dynamic_sample, schema.AIS_DYNAMIC_SCHEMA, "data cleaning", untracked={"memory_report": memory_report})
 
     # 2. Addition of volume and draught features
-    dynamic_sample_full = feature_generation(dynamic_sample)
+    dynamic_sample_full = pipeline.run_stage(runner, "feature generation", feature_generation.feature_generation, dynamic_sample)
+    dynamic_sample_full = pipeline.run_stage(runner, "compact features", schema.compact_stage, dynamic_sample_full, schema.AIS_DYNAMIC_SCHEMA, "feature generation", untracked={"memory_report": memory_report})
 
-    # 3. Obtain timestamps for beginning and end of each month
-    month_ts_array = ts_by_month(oc_oct, oc_nov, oc_dec, oc_jan, oc_feb, oc_mar)
+    # 3. Combine monthly oceanic datasets into a single store
+    ocean_store = pipeline.run_stage(runner, "ocean store", oceanic_matching.build_ocean_store, list(oc_months), depends_on=[ts_by_month])
 
     # 4. Combine dynamic and static weather datasets (weather_obervation and weather_stations)
-    weather_final = add_weather_coordinates(weather_observation, weather_stations)
-
-    # 5. data_merging
-    ocean_lat, ocean_lon, ocean_ts = nearest_ocean_station(month_ts_array)
-
-    # 6. Genereate oceanic and weather parameter fields
-    ocean_hs = np.zeros(len(dynamic_sample_full))
-    ocean_dir = np.zeros(len(dynamic_sample_full))
-    ocean_lm = np.zeros(len(dynamic_sample_full))
-
-    weather_wind_ID = np.zeros(len(dynamic_sample_full))
-    weather_Ff = np.zeros(len(dynamic_sample_full))
-    weather_P = np.zeros(len(dynamic_sample_full))
-    weather_T = np.zeros(len(dynamic_sample_full))
+    weather_final = pipeline.run_stage(runner, "weather coordinates", weather_data_cleaning.add_weather_coordinates, weather_observation, weather_stations)
 
-    for dyn_idx in range(len(dynamic_sample_full)):
-
-        # get AIS coordintes and timestamp
-        AIS_lat = dynamic_sample_full["lat"].values[dyn_idx]
-        AIS_lon = dynamic_sample_full["lon"].values[dyn_idx]
-        AIS_ts  = dynamic_sample_full["t"].values[dyn_idx]
-
-        # obtain closest match of oceanic parameters (hs, dir, lm)
-        ocean_hs_idx, ocean_dir_idx, ocean_lm_idx = ocean_parameter_matching(AIS_lat, AIS_lon, AIS_ts)
-
-        # assign to arrays
-        ocean_hs[dyn_idx] = ocean_hs_idx
-        ocean_dir[dyn_idx] = ocean_dir_idx
-        ocean_lm[dyn_idx] = ocean_lm_idx
-
-
-        # obtain closest match of weather paramters (wind_ID, Ff, P, T)
-        weather_wind_ID_idx, weather_Ff_idx, weather_P_idx, weather_T_idx = weather_parameter_matching(AIS_lat, AIS_lon, AIS_ts)
-
-        # assign to arrays
-        weather_wind_ID[dyn_idx] = weather_wind_ID_idx
-        weather_Ff[dyn_idx] = weather_Ff_idx
-        weather_P[dyn_idx] = weather_P_idx
-        weather_T[dyn_idx] = weather_T_idx
-
-
-    # Add these additional oceanic variables to dynamic AIS dataset
-    dynamic_sample_full["ocean_hs"] = ocean_hs
-    dynamic_sample_full["ocean_dir"] = ocean_dir
-    dynamic_sample_full["ocean_lm"] = ocean_lm
-
-    dynamic_sample_full["weather_wind_ID"] = weather_wind_ID
-    dynamic_sample_full["weather_Ff"] = weather_Ff
-    dynamic_sample_full["weather_P"] = weather_P
-    dynamic_sample_full["weather_T"] = weather_T
+    # 5. Build the oceanic reference (hs, dir, lm) for the whole dataset at once
+    if OCEAN_METHOD == "linear":
+        ocean_reference = pipeline.run_stage(runner, "ocean cube", ocean_cube.cube_from_store, ocean_store, depends_on=[oceanic_matching])
+    else:
+        ocean_reference = pipeline.run_stage(runner, "ocean index", oceanic_matching.build_ocean_index, ocean_store, depends_on=[ts_by_month])
+
+    # 6. Build the weather station index (wind_ID, Ff, P, T)
+    station_index = pipeline.run_stage(runner, "station index", weather_matching.build_station_index, weather_final, weather_wind_direction)
+
+    # 7. Match oceanic and weather parameters by grid point, station(s) and
+    # time, in worker processes or in this one
+    if PARALLEL_ENRICHMENT:
+        enrichment = pipeline.run_stage(runner, "parallel enrichment", parallel_enrichment.enrich_with_references, dynamic_sample_full,
+                                        ocean_reference, station_index, data_dir + r'/.references', ENRICHMENT_WORKERS,
+                                        ocean_method=OCEAN_METHOD, weather_method=WEATHER_METHOD, interpolate=WEATHER_TIME_INTERPOLATION,
+                                        depends_on=[data_cache, oceanic_matching, ocean_cube, weather_matching])
+    else:
+        ocean_matches = pipeline.run_stage(runner, "ocean matching", parallel_enrichment.match_ocean_reference, dynamic_sample_full,
+                                           ocean_reference, ocean_method=OCEAN_METHOD, depends_on=[oceanic_matching, ocean_cube])
+        weather_matches = pipeline.run_stage(runner, "weather matching", parallel_enrichment.match_weather_reference, dynamic_sample_full,
+                                             station_index, weather_method=WEATHER_METHOD, interpolate=WEATHER_TIME_INTERPOLATION,
+                                             depends_on=[weather_matching, oceanic_matching])
+        enrichment = parallel_enrichment.combine_matches(ocean_matches, weather_matches)
+
+    # Add these additional oceanic and weather variables to dynamic AIS dataset
+    for field in parallel_enrichment.ENRICHMENT_FIELDS:
+        dynamic_sample_full[field] = enrichment[field].values
+    dynamic_sample_full = schema.compact_stage(dynamic_sample_full, schema.ENRICHED_SCHEMA, "matching", memory_report)
+    schema.print_memory_report(memory_report)
+    print("stages run: %s\nstages loaded from checkpoints: %s" % (runner["executed"], runner["skipped"]))
+
+    if profiling.PROFILING["enabled"]:
+        profiling.write_report()
 
 
     # clean and give option to save
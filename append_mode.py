@@ -0,0 +1,344 @@
+"""
+append_mode.py
+
+Script to clean, enrich and append a new batch of dynamic AIS messages (e.g.
+a daily drop) without rebuilding the full dynamic dataset. Steps include...
+
+        A.1     Build the cached references, keyed on the fingerprints of
+                their inputs: the containership index, the ocean reference
+                and the weather reference.
+        A.2     Clean the batch with the AIS_data_cleaning filters against the
+                cached containership index.
+        A.3     Add the volume and draught features and enrich the batch with
+                oceanic and weather parameters.
+        A.4     Append the enriched batch to an output partitioned by month.
+
+Usage...
+
+        python3 append_mode.py datasets new_batch.csv output_dir
+
+Only the first run after an input changes builds the references, after which
+the work done is proportional to the size of the batch: the references are
+memory-mapped and only the ocean points within reach of the batch's time
+span are indexed. The batch is matched
+with the same matchers, settings and field types as __main__.py.
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import os
+import sys
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+import data_cache
+import schema
+import pipeline
+import AIS_data_cleaning
+import feature_generation
+import ocean_cube
+import oceanic_matching
+import weather_data_cleaning
+import weather_matching
+import parallel_enrichment
+
+
+# reference directories created within the datasets directory
+CONTAINERSHIP_INDEX_DIRNAME = 'containership_index'
+OCEAN_REFERENCE_DIRNAME = 'ocean_reference'
+WEATHER_REFERENCE_DIRNAME = 'weather_reference'
+
+# fields removed from cleaned entries, as in AIS_data_cleaning 1.6
+UNUSED_DYNAMIC_FIELDS = ["navigationalstatus", "rateofturn", "trueheading"]
+
+# modules whose code writes the references, a change to which (e.g. of their
+# on-disk format) rebuilds them
+REFERENCE_MODULES = [data_cache, schema, AIS_data_cleaning, oceanic_matching, ocean_cube, weather_data_cleaning,
+                     weather_matching, parallel_enrichment]
+
+# matching settings, as in __main__.py
+OCEAN_METHOD = "nearest"
+WEATHER_METHOD = "nearest"
+WEATHER_TIME_INTERPOLATION = False
+
+
+
+def cached_reference(data_dir, reference_name, input_filenames, write_reference, settings=()):
+    """
+    A.1 Build a reference once per version of its inputs. The reference is
+    keyed on the fingerprints of its input files and the settings it was
+    built with, written to a temporary directory and then renamed into place,
+    and older versions of the same reference are removed.
+
+    Input:
+
+            data_dir            directory of datasets used.
+            reference_name      name of the reference.
+            input_filenames     list of files the reference is built from.
+            write_reference     function writing the reference to a given
+                                directory.
+            settings            settings the reference depends on.
+
+    Output:
+
+            reference_dir       directory of the current reference.
+
+    """
+
+    reference_key = hashlib.sha1(repr(([data_cache.file_fingerprint(input_filename) for input_filename in input_filenames],
+                                       settings)).encode()).hexdigest()[:16]
+    reference_prefix = reference_name + '-'
+    reference_dir = os.path.join(data_dir, reference_prefix + reference_key)
+
+    if os.path.exists(reference_dir):
+        return reference_dir
+
+    # write to a temporary directory first so partial references are never read
+    temp_dir = reference_dir + '.tmp%d' % os.getpid()
+    write_reference(temp_dir)
+    os.replace(temp_dir, reference_dir)
+
+    # other processes' temporary directories are left alone
+    for reference_entry in os.listdir(data_dir):
+        if reference_entry.startswith(reference_prefix) and reference_entry != os.path.basename(reference_dir) and '.tmp' not in reference_entry:
+            shutil.rmtree(os.path.join(data_dir, reference_entry), ignore_errors=True)
+
+    return reference_dir
+
+
+
+def write_containership_index(data_dir, index_dir):
+    """
+    A.1 Write the containership index of the static vessel dataset.
+
+    """
+
+    static_dataset = data_cache.cached_read_csv(data_dir + r'/nari_static.csv', field_schema=schema.AIS_STATIC_SCHEMA)
+    data_cache.write_table(AIS_data_cleaning.containerships_index(AIS_data_cleaning.remove_fields(static_dataset)), index_dir)
+
+
+
+def write_ocean_reference(data_dir, ocean_dir, ocean_method):
+    """
+    A.1 Write the ocean reference of the monthly oceanic datasets, loaded as
+    in __main__.py.
+
+    """
+
+    oc_months = [data_cache.cached_read_csv(data_dir + '/' + oc_filename, field_schema=schema.OCEAN_SCHEMA, usecols=list(schema.OCEAN_SCHEMA))
+                 for oc_filename in ocean_cube.OCEAN_FILENAMES]
+    ocean_store = oceanic_matching.build_ocean_store(oc_months)
+
+    if ocean_method == "linear":
+        ocean_reference = ocean_cube.cube_from_store(ocean_store)
+    else:
+        ocean_reference = oceanic_matching.build_ocean_index(ocean_store)
+
+    parallel_enrichment.write_ocean_reference(ocean_reference, ocean_dir, ocean_method)
+
+
+
+def write_weather_reference(data_dir, reference_dir):
+    """
+    A.1 Write the weather reference of the weather tables, loaded as in
+    __main__.py.
+
+    """
+
+    weather_observation = data_cache.cached_read_csv(data_dir + r'/table_weather_observation.csv', field_schema=schema.WEATHER_OBSERVATION_SCHEMA)
+    weather_stations = weather_data_cleaning.load_station_dimension(data_dir + r'/table_weatherStation.csv')
+    weather_final = weather_data_cleaning.add_weather_coordinates(weather_observation, weather_stations)
+    weather_wind_direction = data_cache.cached_read_csv(data_dir + r'/table_windDirection.csv')
+
+    parallel_enrichment.write_weather_reference(weather_matching.build_station_index(weather_final, weather_wind_direction), reference_dir)
+
+
+
+def prepare_references(data_dir, ocean_method=OCEAN_METHOD):
+    """
+    A.1 Build any reference whose inputs or writing code changed since it was
+    last built: the containership index from the static vessel dataset, the
+    ocean reference from the monthly oceanic datasets and the weather
+    reference from the weather tables.
+
+    Input:
+
+            data_dir            directory of datasets used.
+            ocean_method        "nearest" or "linear", as in __main__.py.
+
+    Output:
+
+            references          dictionary of the containership index and the
+                                ocean and weather reference directories.
+
+    """
+
+    code_key = hashlib.sha1("".join(pipeline.source_key(module) for module in REFERENCE_MODULES).encode()).hexdigest()
+
+    index_dir = cached_reference(data_dir, CONTAINERSHIP_INDEX_DIRNAME, [data_dir + r'/nari_static.csv'],
+                                 lambda reference_dir: write_containership_index(data_dir, reference_dir), (code_key,))
+
+    ocean_dir = cached_reference(data_dir, OCEAN_REFERENCE_DIRNAME, [data_dir + '/' + oc_filename for oc_filename in ocean_cube.OCEAN_FILENAMES],
+                                 lambda reference_dir: write_ocean_reference(data_dir, reference_dir, ocean_method), (ocean_method, code_key))
+
+    reference_dir = cached_reference(data_dir, WEATHER_REFERENCE_DIRNAME,
+                                     [data_dir + r'/table_weather_observation.csv', data_dir + r'/table_weatherStation.csv',
+                                      data_dir + r'/table_windDirection.csv'],
+                                     lambda reference_dir: write_weather_reference(data_dir, reference_dir), (code_key,))
+
+    references = {
+        "static_container": data_cache.read_table(index_dir),
+        "ocean_dir": ocean_dir,
+        "reference_dir": reference_dir,
+    }
+
+    return references
+
+
+
+def clean_batch(dynamic_batch, static_container, min_SOG=5.0):
+    """
+    A.2 Clean a batch of dynamic AIS messages with the same filters as the
+    full dataset.
+
+    Input:
+
+            dynamic_batch       new dynamic AIS messages.
+            static_container    database of container vessel mmsi's and type
+                                codes.
+            min_SOG             speed over ground threshold.
+
+    Output:
+
+            batch_cleaned       cleaned messages of the batch.
+
+    """
+
+    batch_cleaned = AIS_data_cleaning.clean_dynamic_chunk(dynamic_batch, static_container, min_SOG)
+    batch_cleaned = batch_cleaned.drop(UNUSED_DYNAMIC_FIELDS, axis=1, errors="ignore").reset_index(drop=True)
+    batch_cleaned = schema.apply_schema(batch_cleaned, schema.AIS_DYNAMIC_SCHEMA)
+
+    return batch_cleaned
+
+
+
+def enrich_batch(batch_cleaned, references, n_workers=1, ocean_method=OCEAN_METHOD,
+                 weather_method=WEATHER_METHOD, interpolate=WEATHER_TIME_INTERPOLATION):
+    """
+    A.3 Add the derived features and the oceanic and weather parameters to a
+    cleaned batch, matched as in __main__.py.
+
+    Input:
+
+            batch_cleaned       cleaned messages of the batch.
+            references          dictionary of the references.
+            n_workers           number of worker processes for matching.
+            ocean_method        "nearest" or "linear", as in __main__.py.
+            weather_method      "nearest" or "idw", as in __main__.py.
+            interpolate         interpolate weather observations in time.
+
+    Output:
+
+            batch_enriched      enriched messages of the batch.
+
+    """
+
+    batch_enriched = feature_generation.feature_generation(batch_cleaned)
+    batch_enriched = schema.apply_schema(batch_enriched, schema.AIS_DYNAMIC_SCHEMA)
+
+    if len(batch_enriched) == 0:
+        return batch_enriched.reindex(columns=list(batch_enriched.columns) + parallel_enrichment.ENRICHMENT_FIELDS)
+
+    enrichment = parallel_enrichment.enrich_parallel(batch_enriched, references["ocean_dir"], references["reference_dir"], n_workers,
+                                                     ocean_method=ocean_method, weather_method=weather_method, interpolate=interpolate)
+    batch_enriched = pd.concat([batch_enriched, enrichment], axis=1)
+    batch_enriched = schema.apply_schema(batch_enriched, schema.ENRICHED_SCHEMA)
+
+    return batch_enriched
+
+
+
+def append_batch(batch_enriched, output_dir, batch_name):
+    """
+    A.4 Append an enriched batch to the output, writing one file per month of
+    the batch. Appending the same batch again replaces its files rather than
+    duplicating them.
+
+    Input:
+
+            batch_enriched      enriched messages of the batch.
+            output_dir          directory of the partitioned output.
+            batch_name          name of the batch, used in its file names.
+
+    Output:
+
+            partition_files     list of files written.
+
+    """
+
+    month = batch_enriched["t"].values.astype('datetime64[s]').astype('datetime64[M]').astype(str)
+
+    partition_files = []
+    for partition_month in np.unique(month):
+        partition_dir = os.path.join(output_dir, 'month=' + partition_month)
+        os.makedirs(partition_dir, exist_ok=True)
+
+        partition_file = os.path.join(partition_dir, 'part-' + batch_name + '.csv')
+        batch_enriched[month == partition_month].to_csv(partition_file, index=False)
+        partition_files.append(partition_file)
+
+    return partition_files
+
+
+
+def append_mode(data_dir, batch_filename, output_dir, min_SOG=5.0, n_workers=1, ocean_method=OCEAN_METHOD,
+                weather_method=WEATHER_METHOD, interpolate=WEATHER_TIME_INTERPOLATION):
+    """
+    Compilation function.
+
+    Input:
+
+            data_dir            directory of datasets used.
+            batch_filename      new dynamic AIS messages (CSV).
+            output_dir          directory of the partitioned output.
+            min_SOG             speed over ground threshold.
+            n_workers           number of worker processes for matching.
+            ocean_method        "nearest" or "linear", as in __main__.py.
+            weather_method      "nearest" or "idw", as in __main__.py.
+            interpolate         interpolate weather observations in time.
+
+    Output:
+
+            partition_files     list of files written.
+
+    """
+
+    references = prepare_references(data_dir, ocean_method)
+
+    dynamic_batch = pd.read_csv(batch_filename)
+    batch_cleaned = clean_batch(dynamic_batch, references["static_container"], min_SOG)
+    batch_enriched = enrich_batch(batch_cleaned, references, n_workers, ocean_method, weather_method, interpolate)
+
+    batch_name = os.path.splitext(os.path.basename(batch_filename))[0]
+    partition_files = append_batch(batch_enriched, output_dir, batch_name)
+
+    return partition_files
+
+
+
+if __name__ == '__main__':
+
+    # usage check
+    if len(sys.argv) != 4:
+        print("Usage: python3 append_mode.py datasets new_batch.csv output_dir")
+        sys.exit(1)
+
+    partition_files = append_mode(sys.argv[1], sys.argv[2], sys.argv[3])
+
+    print("appended batch to %s" % ", ".join(partition_files))
@@ -0,0 +1,664 @@
+"""
+benchmarks.py
+
+Script to time pipeline steps against their previous implementations.
+Benchmarks include...
+
+        B.1     Containership filter: per-row dictionary loop against the
+                sorted-array membership filter (AIS_data_cleaning 1.3).
+        B.2     Pipeline stages on synthetic datasets (see synthetic_data.py)
+                of increasing size, cleaning every containership rather than
+                a sample, including in-memory against streamed cleaning and
+                serial against parallel enrichment, alongside one timed run of
+                the main pipeline (__main__.py) itself.
+        B.3     Per-entry oceanic and weather lookups with and without a
+                shared lookup cache (see lookup_cache.py).
+        B.4     Nearest oceanic matching against trilinear interpolation on
+                a smooth analytic wave field, for accuracy and throughput.
+        B.5     sklearn tree and forest predictions against the compiled
+                arrays of tree_arrays.py, for agreement, throughput, loading
+                time and size.
+
+Usage...
+
+        python3 benchmarks.py
+        python3 benchmarks.py pipeline bench_dir [n_ais ...]
+        python3 benchmarks.py lookup datasets
+        python3 benchmarks.py interpolation
+        python3 benchmarks.py trees tree_dir
+
+Pipeline timings are written to bench_dir/benchmark_report.json. Each scale
+is generated once in its own directory and reused by later runs.
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import resource
+import subprocess
+import numpy as np
+import pandas as pd
+
+# import machine learning libraries
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.ensemble import RandomForestRegressor
+
+### Import external functions ###
+import data_cache
+import schema
+import profiling
+import synthetic_data
+import lookup_cache
+import AIS_data_cleaning
+import feature_generation
+import ocean_cube
+import oceanic_matching
+import weather_data_cleaning
+import weather_matching
+import parallel_enrichment
+import tree_arrays
+
+
+# numbers of dynamic AIS messages benchmarked by default
+PIPELINE_SCALES = [10000, 100000, 1000000, 10000000, 100000000]
+
+# main pipeline script, run end to end by time_main_run
+MAIN_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), '__main__.py')
+
+# stages of the main pipeline run (__main__.py), summed into a "sum of stages"
+# record (excluding anything between the stages, see time_main_run for a run)
+END_TO_END_STAGES = ["load inputs", "data cleaning (streaming)",
+                     "feature generation", "ocean store", "weather coordinates", "ocean index",
+                     "ocean matching (index)", "station index", "weather matching"]
+
+
+
+def time_call(function, *args, repeats=3):
+    """
+    Time a function call, returning the best of a number of repeats.
+
+    Input:
+
+            function            function to time.
+            args                arguments passed to the function.
+            repeats             number of timed calls.
+
+    Output:
+
+            best_time           shortest wall time (s) of the calls.
+            result              result of the final call.
+
+    """
+
+    best_time = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        best_time = min(best_time, time.perf_counter() - start)
+
+    return best_time, result
+
+
+
+def filter_for_containerships_loop(dynamic_dataset, static_container):
+    """
+    B.1 Previous per-row dictionary implementation of the containership
+    filter, kept as the benchmark baseline.
+
+    """
+
+    # convert to dictionary for processing speed
+    containership_dictionary = {}
+    for vessel_row in range(len(static_container)):
+        containership_dictionary.update({int(static_container["mmsi"][vessel_row]): int(static_container["mmsi"][vessel_row])})
+
+    # establish a list of rows in the dynamic dataset to be deleted
+    dynamic_rows_to_delete = []
+
+    # run through dynamic dataset
+    for dynamic_row in range(len(dynamic_dataset)):
+        if dynamic_dataset["sourcemmsi"][dynamic_row] not in containership_dictionary.keys():
+            dynamic_rows_to_delete.append(dynamic_row)
+
+    dynamic_container = dynamic_dataset.drop(dynamic_rows_to_delete, axis=0)
+
+    return dynamic_container
+
+
+
+def benchmark_containership_filter(n_dynamic=200000, n_vessels=5000, n_containerships=500, seed=0):
+    """
+    B.1 Compare the loop and membership containership filters on random
+    mmsi's, checking both keep the same entries.
+
+    Input:
+
+            n_dynamic           number of dynamic AIS entries.
+            n_vessels           number of distinct vessels in the entries.
+            n_containerships    number of vessels in the static index.
+            seed                random seed.
+
+    Output:
+
+            results             dictionary of timings (s) and speedup.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    vessel_mmsi = rng.choice(np.arange(200000000, 800000000), size=n_vessels, replace=False)
+
+    dynamic_dataset = pd.DataFrame({"sourcemmsi": rng.choice(vessel_mmsi, size=n_dynamic)})
+    static_container = pd.DataFrame({"mmsi": np.sort(vessel_mmsi[:n_containerships]).astype(np.uint32)})
+
+    loop_time, loop_result = time_call(filter_for_containerships_loop, dynamic_dataset, static_container, repeats=1)
+    member_time, member_result = time_call(AIS_data_cleaning.filter_for_containerships, dynamic_dataset, static_container)
+
+    assert loop_result.index.equals(member_result.index)
+
+    results = {"n_dynamic": n_dynamic, "loop_s": loop_time, "membership_s": member_time, "speedup": loop_time / member_time}
+
+    return results
+
+
+
+def load_inputs(data_dir):
+    """
+    B.2 Load the static, oceanic and weather datasets as __main__.py does.
+
+    Input:
+
+            data_dir            directory of datasets used.
+
+    Output:
+
+            static_dataset      static vessel dataset.
+            oc_months           list of monthly oceanic datasets.
+            weather_observation dynamic weather observations.
+            weather_stations    static weather station dataset.
+            weather_wind_direction  wind direction codes.
+
+    """
+
+    static_dataset = data_cache.cached_read_csv(data_dir + r'/nari_static.csv', field_schema=schema.AIS_STATIC_SCHEMA)
+
+    oc_months = [data_cache.cached_read_csv(data_dir + '/' + oc_filename, field_schema=schema.OCEAN_SCHEMA, usecols=list(schema.OCEAN_SCHEMA))
+                 for oc_filename in ocean_cube.OCEAN_FILENAMES]
+
+    weather_observation = data_cache.cached_read_csv(data_dir + r'/table_weather_observation.csv', field_schema=schema.WEATHER_OBSERVATION_SCHEMA)
+    weather_stations = weather_data_cleaning.load_station_dimension(data_dir + r'/table_weatherStation.csv')
+    weather_wind_direction = data_cache.cached_read_csv(data_dir + r'/table_windDirection.csv')
+
+    return static_dataset, oc_months, weather_observation, weather_stations, weather_wind_direction
+
+
+
+def timed_stage(name, function, *args):
+    """
+    B.2 Run a stage under profiling, recording its timings (see profiling.py)
+    without keying or checkpointing its inputs.
+
+    """
+
+    stage_record = profiling.start_stage(name, args)
+    output = function(*args)
+    profiling.finish_stage(stage_record, output)
+
+    return output
+
+
+
+def clean_in_memory(static_dataset, dynamic_filename, min_SOG=5.0):
+    """
+    B.2 Load the whole dynamic AIS dataset and clean it in memory, as before
+    streaming (AIS_data_cleaning 1.7), keeping every containership.
+
+    """
+
+    dynamic_dataset = data_cache.cached_read_csv(dynamic_filename)
+
+    return AIS_data_cleaning.data_cleaning(static_dataset, dynamic_dataset, min_SOG, sub_sample=False)
+
+
+
+def clean_streaming(static_dataset, dynamic_filename, min_SOG=5.0):
+    """
+    B.2 Clean the dynamic AIS dataset in chunks as the main pipeline does,
+    keeping every containership.
+
+    """
+
+    return AIS_data_cleaning.data_cleaning_streaming(static_dataset, dynamic_filename, min_SOG, sub_sample=False)
+
+
+
+def time_main_run(data_dir, n_ais):
+    """
+    B.2 Time one run of the main pipeline, as run from the command line, on a
+    dataset. Its checkpoints are removed first so every stage runs, while
+    parsed CSVs stay cached as for the other stages. The run writes its
+    output to datasets/full_dynamic_set.csv within a run directory linking
+    datasets to data_dir, and its per-stage profile next to it. Unlike the
+    other stages, it cleans the 40 vessel sample of a normal run.
+
+    Input:
+
+            data_dir            directory of the synthetic datasets.
+            n_ais               number of dynamic AIS messages.
+
+    Output:
+
+            run_record          record of the run, in the form of a stage
+                                record (see profiling.py), with the summed
+                                wall time of the run's own stages.
+
+    """
+
+    run_dir = os.path.join(data_dir, 'main_run')
+    os.makedirs(run_dir, exist_ok=True)
+    if not os.path.exists(os.path.join(run_dir, 'datasets')):
+        os.symlink(os.path.abspath(data_dir), os.path.join(run_dir, 'datasets'))
+    shutil.rmtree(os.path.join(data_dir, '.checkpoints'), ignore_errors=True)
+
+    profile_filename = os.path.join(run_dir, 'main_profile.json')
+    run_environment = dict(os.environ, MARITIME_PROFILE=profile_filename)
+
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, MAIN_FILENAME, 'datasets'], cwd=run_dir, env=run_environment, check=True, stdout=subprocess.DEVNULL)
+    wall_s = time.perf_counter() - start
+    children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    with open(profile_filename) as profile_file:
+        run_stages = json.load(profile_file)["stages"]
+    with open(os.path.join(data_dir, 'full_dynamic_set.csv')) as output_file:
+        rows_out = sum(1 for _ in output_file) - 1
+
+    run_record = {"stage": "main pipeline run", "n_ais": n_ais, "wall_s": wall_s,
+                  "cpu_s": (children_after.ru_utime - children_before.ru_utime) + (children_after.ru_stime - children_before.ru_stime),
+                  "rows_in": n_ais, "rows_out": rows_out,
+                  "rss_start_mb": run_stages[0]["rss_start_mb"],
+                  "rss_delta_mb": sum(stage_record["rss_delta_mb"] for stage_record in run_stages),
+                  # ru_maxrss carries over from this process through exec, so
+                  # the run's peak is taken as its largest memory at a stage end
+                  "process_peak_rss_mb": max(stage_record["rss_start_mb"] + stage_record["rss_delta_mb"] for stage_record in run_stages),
+                  "stages_wall_s": sum(stage_record["wall_s"] for stage_record in run_stages)}
+
+    return run_record
+
+
+
+def benchmark_pipeline(data_dir, n_ais, n_workers=None, max_in_memory=10000000):
+    """
+    B.2 Time each pipeline stage on a synthetic dataset, generating the
+    dataset first if it does not exist. Stages run without checkpoints, while
+    parsed CSVs are cached as in a normal run (so the first run at each scale
+    includes CSV parsing). Cleaning keeps every containership rather than the
+    40 vessel sample of a normal run, so later stages scale with the dataset.
+    The main pipeline is then run once end to end (see time_main_run).
+
+    Input:
+
+            data_dir            directory of the synthetic datasets.
+            n_ais               number of dynamic AIS messages.
+            n_workers           number of worker processes for parallel
+                                enrichment, defaults to the number of CPUs.
+            max_in_memory       largest number of messages cleaned in memory,
+                                above which only streamed cleaning is timed.
+
+    Output:
+
+            results             list of stage records (see profiling.py) with
+                                the number of messages, plus records of the
+                                sum of the main pipeline's stages and of its
+                                timed run.
+
+    """
+
+    if not os.path.exists(data_dir + r'/nari_dynamic.csv'):
+        synthetic_data.generate_datasets(data_dir, n_ais)
+
+    n_workers = n_workers or os.cpu_count()
+    profiling.enable_profiling()
+
+    # loading and cleaning
+    static_dataset, oc_months, weather_observation, weather_stations, weather_wind_direction = timed_stage("load inputs", load_inputs, data_dir)
+    if n_ais <= max_in_memory:
+        timed_stage("data cleaning (in-memory)", clean_in_memory, static_dataset, data_dir + r'/nari_dynamic.csv')
+    dynamic_sample = timed_stage("data cleaning (streaming)", clean_streaming, static_dataset, data_dir + r'/nari_dynamic.csv')
+    dynamic_sample_full = timed_stage("feature generation", feature_generation.feature_generation, dynamic_sample)
+
+    # matching, as in the main pipeline
+    ocean_store = timed_stage("ocean store", oceanic_matching.build_ocean_store, oc_months)
+    weather_final = timed_stage("weather coordinates", weather_data_cleaning.add_weather_coordinates, weather_observation, weather_stations)
+    ocean_index = timed_stage("ocean index", oceanic_matching.build_ocean_index, ocean_store)
+    ocean_matches = timed_stage("ocean matching (index)", oceanic_matching.match_ocean_index, dynamic_sample_full, ocean_index)
+    station_index = timed_stage("station index", weather_matching.build_station_index, weather_final, weather_wind_direction)
+    weather_matches = timed_stage("weather matching", weather_matching.match_weather, dynamic_sample_full, station_index)
+    serial_enrichment = parallel_enrichment.combine_matches(ocean_matches, weather_matches)
+
+    # matching against the references written to disk, serially and in
+    # parallel, each checked against the serial pipeline's matches
+    ocean_dir, reference_dir = data_dir + r'/ocean_reference', data_dir + r'/weather_reference'
+    timed_stage("ocean reference", parallel_enrichment.write_ocean_reference, ocean_index, ocean_dir)
+    timed_stage("weather reference", parallel_enrichment.write_weather_reference, station_index, reference_dir)
+    for workers in sorted({1, n_workers}):
+        enrichment = timed_stage("enrichment (%d worker%s)" % (workers, "s" if workers > 1 else ""),
+                                 parallel_enrichment.enrich_parallel, dynamic_sample_full, ocean_dir, reference_dir, workers)
+        pd.testing.assert_frame_equal(enrichment, serial_enrichment)
+
+    profiling.disable_profiling()
+
+    results = [dict(stage_record, n_ais=n_ais) for stage_record in profiling.PROFILING["stages"]]
+    main_records = [stage_record for stage_record in results if stage_record["stage"] in END_TO_END_STAGES]
+    results.append({"stage": "sum of stages", "n_ais": n_ais,
+                    "wall_s": sum(stage_record["wall_s"] for stage_record in main_records),
+                    "cpu_s": sum(stage_record["cpu_s"] for stage_record in main_records),
+                    "rows_in": n_ais, "rows_out": len(dynamic_sample_full),
+                    "rss_start_mb": main_records[0]["rss_start_mb"],
+                    "rss_delta_mb": sum(stage_record["rss_delta_mb"] for stage_record in main_records),
+                    "process_peak_rss_mb": max(stage_record["process_peak_rss_mb"] for stage_record in results)})
+    results.append(time_main_run(data_dir, n_ais))
+
+    return results
+
+
+
+def benchmark_scales(bench_dir, scales=PIPELINE_SCALES, n_workers=None):
+    """
+    B.2 Benchmark the pipeline at each scale, printing a table of stage
+    timings and writing every record to a JSON report.
+
+    Input:
+
+            bench_dir           directory of the synthetic datasets (one
+                                subdirectory per scale) and the report.
+            scales              numbers of dynamic AIS messages.
+            n_workers           number of worker processes for parallel
+                                enrichment.
+
+    Output:
+
+            results             list of stage records at every scale.
+
+    """
+
+    results = []
+    for n_ais in scales:
+        scale_results = benchmark_pipeline(os.path.join(bench_dir, 'n%d' % n_ais), int(n_ais), n_workers)
+        results += scale_results
+
+        for stage_record in scale_results:
+            print("n=%-10d %-28s %9.3fs  cpu %9.3fs  rows %10d -> %-10d  rss %+8.1f MB  process peak %8.1f MB"
+                  % (n_ais, stage_record["stage"], stage_record["wall_s"], stage_record["cpu_s"],
+                     stage_record["rows_in"], stage_record["rows_out"], stage_record["rss_delta_mb"],
+                     stage_record["process_peak_rss_mb"]))
+
+    with open(os.path.join(bench_dir, 'benchmark_report.json'), 'w') as report_file:
+        json.dump(results, report_file, indent=2)
+
+    return results
+
+
+
+def match_rows(ais_df, ocean_store, weather_final, cache=None):
+    """
+    B.3 Match each AIS entry in turn with the per-entry oceanic and weather
+    lookups.
+
+    """
+
+    # the month catalogue is built, and observation times parsed, once for
+    # every entry
+    catalogue = oceanic_matching.ocean_catalogue(ocean_store)
+    weather_ts = weather_matching.observation_timestamps(weather_final)
+
+    matched = []
+    for AIS_lat, AIS_lon, AIS_ts in zip(ais_df["lat"].values, ais_df["lon"].values, ais_df["t"].values):
+        matched.append(oceanic_matching.ocean_parameter_matching(AIS_lat, AIS_lon, AIS_ts, ocean_store, cache=cache, catalogue=catalogue)
+                       + weather_matching.weather_parameter_matching(AIS_lat, AIS_lon, AIS_ts, weather_final, cache=cache, weather_ts=weather_ts))
+
+    return np.array(matched, dtype=np.float64)
+
+
+
+def benchmark_lookup_cache(data_dir, n_rows=2000, max_entries=lookup_cache.DEFAULT_MAX_ENTRIES):
+    """
+    B.3 Compare per-entry matching of cleaned AIS entries with and without a
+    lookup cache shared by the oceanic and weather matchers, checking the
+    matches agree.
+
+    Input:
+
+            data_dir            directory of datasets used.
+            n_rows              number of cleaned AIS entries matched, taken
+                                in vessel and time order as along tracks.
+            max_entries         largest number of cached lookups.
+
+    Output:
+
+            results             dictionary of timings (s), speedup and the
+                                cache's hits, misses and hit rate.
+
+    """
+
+    static_dataset, oc_months, weather_observation, weather_stations, _ = load_inputs(data_dir)
+    dynamic_sample = AIS_data_cleaning.data_cleaning_streaming(static_dataset, data_dir + r'/nari_dynamic.csv')
+    ais_df = dynamic_sample.sort_values(["sourcemmsi", "t"]).head(n_rows)
+
+    ocean_store = oceanic_matching.build_ocean_store(oc_months)
+    weather_final = weather_data_cleaning.add_weather_coordinates(weather_observation, weather_stations)
+
+    cache = lookup_cache.new_lookup_cache(max_entries)
+    search_time, search_result = time_call(match_rows, ais_df, ocean_store, weather_final, repeats=1)
+    cached_time, cached_result = time_call(match_rows, ais_df, ocean_store, weather_final, cache, repeats=1)
+
+    assert np.array_equal(search_result, cached_result, equal_nan=True)
+
+    results = dict(lookup_cache.cache_stats(cache), n_rows=len(ais_df), search_s=search_time, cached_s=cached_time,
+                   speedup=search_time / cached_time)
+
+    return results
+
+
+
+def analytic_ocean_field(ts, lat, lon):
+    """
+    B.4 Smooth wave field used as the ground truth of the interpolation
+    benchmark, returning hs, dir (wrapping through north) and lm.
+
+    """
+
+    hs = 1.5 + np.sin(np.radians(20.0 * lat)) + 0.5 * np.cos(np.radians(15.0 * lon)) + 0.5 * np.sin(ts / 40000.0)
+    direction = (350.0 + 30.0 * np.sin(ts / 30000.0) + 4.0 * lat) % 360.0
+    lm = 100.0 + 5.0 * lon + 3.0 * lat + 10.0 * np.cos(ts / 50000.0)
+
+    return np.column_stack([hs, direction, lm])
+
+
+
+def benchmark_ocean_interpolation(n_ais=1000000, grid_step=0.5, time_step=3 * 3600, n_days=30, seed=0):
+    """
+    B.4 Sample an analytic wave field on a grid, then match random AIS
+    entries by nearest node (store index, store and cube) and by trilinear
+    interpolation, comparing their errors against the field and their
+    timings.
+
+    Input:
+
+            n_ais               number of AIS entries matched.
+            grid_step           grid spacing (degrees).
+            time_step           time between fields (s).
+            n_days              number of days of fields.
+            seed                random seed.
+
+    Output:
+
+            results             dictionary of the mean absolute error of each
+                                parameter and the timing (s) of each method.
+
+    """
+
+    rng = np.random.default_rng(seed)
+    ts = np.arange(0, n_days * 86400, time_step)
+    lat = np.arange(synthetic_data.LAT_RANGE[0], synthetic_data.LAT_RANGE[1] + 1e-9, grid_step)
+    lon = np.arange(synthetic_data.LON_RANGE[0], synthetic_data.LON_RANGE[1] + 1e-9, grid_step)
+
+    ts_grid, lat_grid, lon_grid = [grid.ravel() for grid in np.meshgrid(ts, lat, lon, indexing='ij')]
+    oc_month = pd.DataFrame(analytic_ocean_field(ts_grid, lat_grid, lon_grid), columns=oceanic_matching.OCEAN_PARAMETERS)
+    oc_month["ts"], oc_month["lat"], oc_month["lon"] = ts_grid, lat_grid, lon_grid
+
+    ocean_store = oceanic_matching.build_ocean_store([oc_month])
+    ocean_index = oceanic_matching.build_ocean_index(ocean_store)
+    store_cube = ocean_cube.cube_from_store(ocean_store)
+
+    ais_df = pd.DataFrame({"t": rng.uniform(ts[0], ts[-1], n_ais).astype(np.int64),
+                           "lat": rng.uniform(lat[0], lat[-1], n_ais),
+                           "lon": rng.uniform(lon[0], lon[-1], n_ais)})
+    truth = analytic_ocean_field(ais_df["t"].values, ais_df["lat"].values, ais_df["lon"].values)
+
+    methods = {
+        "nearest (index)": lambda: oceanic_matching.match_ocean_index(ais_df, ocean_index),
+        "nearest (store)": lambda: oceanic_matching.match_ocean(ais_df, ocean_store),
+        "nearest (cube)": lambda: ocean_cube.match_ocean_cube(ais_df, store_cube),
+        "linear (cube)": lambda: ocean_cube.match_ocean_cube(ais_df, store_cube, method="linear"),
+    }
+
+    results = {"n_ais": n_ais}
+    for method_name, method in methods.items():
+        method_time, ocean_matches = time_call(method)
+
+        # directions differ by the shorter way around the circle
+        error = np.abs(ocean_matches[oceanic_matching.OCEAN_PARAMETERS].values - truth)
+        error[:, 1] = np.minimum(error[:, 1], 360.0 - error[:, 1])
+
+        results[method_name] = dict(zip(oceanic_matching.OCEAN_PARAMETERS, np.nanmean(error, axis=0)), time_s=method_time)
+
+    return results
+
+
+
+def benchmark_tree_inference(tree_dir, n_train=200000, n_predict=1000000, n_estimators=20, seed=0):
+    """
+    B.5 Fit a deep decision tree and a random forest on synthetic features,
+    then compare sklearn's predictions, loading time and size against those
+    of the trees compiled to arrays.
+
+    Input:
+
+            tree_dir            directory to save the estimators to.
+            n_train             number of training entries.
+            n_predict           number of entries predicted.
+            n_estimators        number of trees in the forest.
+            seed                random seed.
+
+    Output:
+
+            results             dictionary, per estimator, of the number of
+                                nodes, whether predictions are identical and
+                                the predict and load timings (s) and sizes
+                                (bytes) of each form.
+
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # mix of continuous, rounded and discrete features, as in the AIS features
+    def synthetic_features(n_rows):
+        return np.column_stack([rng.uniform(0, 360, n_rows), np.round(rng.normal(2, 0.8, n_rows), 2),
+                                rng.integers(1, 17, n_rows), np.round(rng.normal(10, 3, n_rows), 1)])
+
+    X_train, X_predict = synthetic_features(n_train), synthetic_features(n_predict)
+    y_train = 12 + np.sin(np.radians(X_train[:, 0])) - 0.5 * X_train[:, 1] + 0.05 * X_train[:, 3] + rng.normal(0, 1, n_train)
+
+    estimators = {
+        "tree": DecisionTreeRegressor(min_samples_split=4, min_samples_leaf=3, random_state=seed),
+        "forest": RandomForestRegressor(n_estimators=n_estimators, min_samples_leaf=3, max_samples=0.2, random_state=seed),
+    }
+
+    results = {"n_predict": n_predict}
+    for estimator_name, estimator in estimators.items():
+        estimator.fit(X_train, y_train)
+        compiled = tree_arrays.compile_trees(estimator)
+
+        # save both forms, then time loading them back
+        pickle_filename = os.path.join(tree_dir, estimator_name + '.pkl')
+        arrays_dir = os.path.join(tree_dir, estimator_name)
+        os.makedirs(tree_dir, exist_ok=True)
+        with open(pickle_filename, 'wb') as pickle_file:
+            pickle.dump(estimator, pickle_file, protocol=pickle.HIGHEST_PROTOCOL)
+        tree_arrays.save_tree_arrays(compiled, arrays_dir)
+
+        def load_pickle():
+            with open(pickle_filename, 'rb') as pickle_file:
+                return pickle.load(pickle_file)
+
+        pickle_load_time, _ = time_call(load_pickle)
+        arrays_load_time, loaded = time_call(tree_arrays.load_tree_arrays, arrays_dir)
+
+        sklearn_time, sklearn_predictions = time_call(estimator.predict, X_predict, repeats=1)
+        arrays_time, arrays_predictions = time_call(tree_arrays.predict_tree_arrays, loaded, X_predict, repeats=1)
+
+        results[estimator_name] = {
+            "nodes": len(compiled["value"]),
+            "identical": bool(np.array_equal(sklearn_predictions, arrays_predictions)),
+            "sklearn_predict_s": sklearn_time,
+            "arrays_predict_s": arrays_time,
+            "sklearn_load_s": pickle_load_time,
+            "arrays_load_s": arrays_load_time,
+            "sklearn_bytes": os.path.getsize(pickle_filename),
+            "arrays_bytes": sum(compiled[array_name].nbytes for array_name in tree_arrays.TREE_ARRAYS),
+        }
+
+    return results
+
+
+
+if __name__ == '__main__':
+
+    # sklearn against compiled tree predictions
+    if len(sys.argv) == 3 and sys.argv[1] == 'trees':
+        results = benchmark_tree_inference(sys.argv[2])
+        for estimator_name in ["tree", "forest"]:
+            estimator_results = results[estimator_name]
+            print("%-6s nodes %-8d n=%-8d identical %s  predict sklearn %7.3fs arrays %7.3fs  load sklearn %7.4fs arrays %7.4fs  size sklearn %9d arrays %9d"
+                  % (estimator_name, estimator_results["nodes"], results["n_predict"], estimator_results["identical"],
+                     estimator_results["sklearn_predict_s"], estimator_results["arrays_predict_s"],
+                     estimator_results["sklearn_load_s"], estimator_results["arrays_load_s"],
+                     estimator_results["sklearn_bytes"], estimator_results["arrays_bytes"]))
+        sys.exit(0)
+
+    # accuracy and throughput of nearest and interpolated oceanic matching
+    if len(sys.argv) == 2 and sys.argv[1] == 'interpolation':
+        results = benchmark_ocean_interpolation()
+        for method_name in ["nearest (index)", "nearest (store)", "nearest (cube)", "linear (cube)"]:
+            print("ocean %-16s n=%-8d %8.3fs  mean abs error hs %.4f  dir %.3f  lm %.4f"
+                  % (method_name, results["n_ais"], results[method_name]["time_s"], results[method_name]["hs"],
+                     results[method_name]["dir"], results[method_name]["lm"]))
+        sys.exit(0)
+
+    # per-entry lookups with and without the lookup cache
+    if len(sys.argv) == 3 and sys.argv[1] == 'lookup':
+        results = benchmark_lookup_cache(sys.argv[2])
+        print("lookup cache  n=%-6d search %8.3fs  cached %8.3fs  speedup %6.1fx  hits %d  misses %d  hit rate %.2f"
+              % (results["n_rows"], results["search_s"], results["cached_s"], results["speedup"],
+                 results["hits"], results["misses"], results["hit_rate"]))
+        sys.exit(0)
+
+    # pipeline benchmarks on synthetic datasets
+    if len(sys.argv) >= 3 and sys.argv[1] == 'pipeline':
+        scales = [int(float(n_ais)) for n_ais in sys.argv[3:]] or PIPELINE_SCALES
+        benchmark_scales(sys.argv[2], scales)
+        sys.exit(0)
+
+    for n_dynamic in [10000, 100000, 1000000]:
+        results = benchmark_containership_filter(n_dynamic=n_dynamic)
+        print("containership filter  n=%-8d loop %8.3fs  membership %8.4fs  speedup %8.0fx"
+              % (n_dynamic, results["loop_s"], results["membership_s"], results["speedup"]))
@@ -0,0 +1,242 @@
+"""
+data_cache.py
+
+Script to cache parsed CSV datasets on disk in a typed columnar format.
+Steps include...
+
+        C.1     Fingerprint a raw input file by path, size and modification
+                time (or content hash) together with the read options.
+        C.2     Write each parsed column as its own .npy file, so later loads
+                are near-instant and can be memory-mapped.
+        C.3     Load a cached table, parsing and caching the CSV on a miss and
+                removing stale entries of changed inputs. Given a schema (see
+                schema.py), fields are parsed and cached in their declared
+                types, so loads need no further downcasting.
+
+Cache entries live in a '.cache' directory next to each input by default.
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+import schema
+
+
+# name of the cache directory created next to each input
+CACHE_DIRNAME = '.cache'
+
+# number of cache hits and misses in this process
+CACHE_STATS = {"hits": 0, "misses": 0}
+
+
+
+def file_fingerprint(filename, read_options=None, content_hash=False):
+    """
+    C.1 Fingerprint a file by its absolute path, size and modification time,
+    or by a hash of its contents, together with the options used to parse it.
+
+    Input:
+
+            filename            input file.
+            read_options        dictionary of options passed to the reader.
+            content_hash        hash the file contents instead of using the
+                                modification time.
+
+    Output:
+
+            fingerprint         hexadecimal fingerprint string.
+
+    """
+
+    file_stat = os.stat(filename)
+    fingerprint = hashlib.sha1()
+
+    fingerprint.update(os.path.abspath(filename).encode())
+    fingerprint.update(str(file_stat.st_size).encode())
+
+    if content_hash:
+        with open(filename, 'rb') as raw_file:
+            for block in iter(lambda: raw_file.read(1 << 20), b''):
+                fingerprint.update(block)
+    else:
+        fingerprint.update(str(file_stat.st_mtime_ns).encode())
+
+    fingerprint.update(repr(sorted((read_options or {}).items())).encode())
+
+    return fingerprint.hexdigest()[:16]
+
+
+
+def write_table(table, entry_dir):
+    """
+    C.2 Write a dataframe as one .npy file per column plus a JSON description
+    of the columns. Numeric, boolean and date-time columns are stored as is,
+    categoricals as codes and categories, and anything else as fixed-width
+    text with a mask of missing values.
+
+    Input:
+
+            table               dataframe to cache.
+            entry_dir           directory of the cache entry.
+
+    Output:
+
+            None
+
+    """
+
+    os.makedirs(entry_dir)
+
+    # keep any non-default index as ordinary columns
+    index_names = [] if isinstance(table.index, pd.RangeIndex) else [str(name) for name in table.index.names]
+    if index_names:
+        table = table.reset_index()
+
+    columns = []
+    for column_idx, column_name in enumerate(table.columns):
+        column = table[column_name]
+        column_file = os.path.join(entry_dir, 'column_%d' % column_idx)
+
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            kind = 'category'
+            np.save(column_file + '.npy', column.cat.codes.values)
+            categories = column.cat.categories.to_numpy()
+            np.save(column_file + '_categories.npy', categories.astype(str) if categories.dtype == object else categories)
+
+        elif pd.api.types.is_bool_dtype(column.dtype) or pd.api.types.is_numeric_dtype(column.dtype) or pd.api.types.is_datetime64_dtype(column.dtype):
+            kind = 'array'
+            np.save(column_file + '.npy', column.to_numpy())
+
+        else:
+            kind = 'text'
+            missing = column.isna().values
+            np.save(column_file + '.npy', np.where(missing, '', column.astype(str).values).astype(str))
+            np.save(column_file + '_missing.npy', missing)
+
+        columns.append({"name": column_name, "kind": kind, "dtype": str(column.dtype)})
+
+    with open(os.path.join(entry_dir, 'table.json'), 'w') as table_file:
+        json.dump({"columns": columns, "index": index_names, "rows": len(table)}, table_file)
+
+
+
+def read_table(entry_dir, mmap_mode=None):
+    """
+    C.2 Read a dataframe written by write_table.
+
+    Input:
+
+            entry_dir           directory of the cache entry.
+            mmap_mode           numpy memory-map mode ('r' for read-only),
+                                None to read columns into memory.
+
+    Output:
+
+            table               cached dataframe.
+
+    """
+
+    with open(os.path.join(entry_dir, 'table.json')) as table_file:
+        description = json.load(table_file)
+
+    table_columns = {}
+    for column_idx, column in enumerate(description["columns"]):
+        column_file = os.path.join(entry_dir, 'column_%d' % column_idx)
+
+        if column["kind"] == 'category':
+            categories = np.load(column_file + '_categories.npy', allow_pickle=False)
+            codes = np.load(column_file + '.npy', allow_pickle=False)
+            table_columns[column["name"]] = pd.Categorical.from_codes(codes, categories=categories)
+
+        elif column["kind"] == 'array':
+            table_columns[column["name"]] = np.load(column_file + '.npy', mmap_mode=mmap_mode, allow_pickle=False)
+
+        else:
+            values = np.load(column_file + '.npy', allow_pickle=False).astype(object)
+            values[np.load(column_file + '_missing.npy', allow_pickle=False)] = np.nan
+
+            # text columns parsed as strings (rather than objects) are restored as such
+            text_dtype = column.get("dtype", "object")
+            table_columns[column["name"]] = values if text_dtype == "object" else pd.array(values, dtype=text_dtype)
+
+    table = pd.DataFrame(table_columns, copy=False)
+
+    if description["index"]:
+        table = table.set_index(description["index"])
+
+    return table
+
+
+
+def cached_read_csv(filename, cache_dir=None, mmap_mode=None, content_hash=False, field_schema=None, **read_options):
+    """
+    C.3 Read a CSV through the columnar cache. On a miss the CSV is parsed with
+    pd.read_csv, cached, and any older entries of the same file read with the
+    same options are removed, so changed inputs invalidate their cache
+    automatically.
+
+    Input:
+
+            filename            CSV file.
+            cache_dir           cache directory, defaults to '.cache' next to
+                                the CSV.
+            mmap_mode           numpy memory-map mode for cached columns.
+            content_hash        fingerprint the file contents rather than its
+                                modification time.
+            field_schema        dictionary of field name to declared type
+                                (see schema.py) the fields are parsed and
+                                cached in, None to keep the parsed types.
+            read_options        options passed to pd.read_csv.
+
+    Output:
+
+            table               parsed dataframe.
+
+    """
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(filename)), CACHE_DIRNAME)
+
+    # entries of the same file read with the same options and schema share a
+    # prefix, followed by the fingerprint of the file's current version
+    schema_key = sorted((field, np.dtype(field_type).str) for field, field_type in (field_schema or {}).items())
+    entry_family = hashlib.sha1(repr((os.path.abspath(filename), sorted(read_options.items()), content_hash, schema_key)).encode()).hexdigest()[:8]
+    entry_prefix = os.path.basename(filename) + '-' + entry_family + '-'
+    entry_name = entry_prefix + file_fingerprint(filename, read_options, content_hash)
+    entry_dir = os.path.join(cache_dir, entry_name)
+
+    # cache hit
+    if os.path.exists(os.path.join(entry_dir, 'table.json')):
+        CACHE_STATS["hits"] += 1
+        return read_table(entry_dir, mmap_mode)
+
+    # cache miss, parse and replace any stale entries for this file
+    CACHE_STATS["misses"] += 1
+    if field_schema is None:
+        table = pd.read_csv(filename, **read_options)
+    else:
+        read_dtypes = dict(schema.reader_dtypes(field_schema), **read_options.get("dtype", {}))
+        table = schema.apply_schema(pd.read_csv(filename, **dict(read_options, dtype=read_dtypes)), field_schema)
+
+    # other processes' temporary directories are left alone
+    os.makedirs(cache_dir, exist_ok=True)
+    for cached_name in os.listdir(cache_dir):
+        if cached_name.startswith(entry_prefix) and cached_name != entry_name and '.tmp' not in cached_name:
+            shutil.rmtree(os.path.join(cache_dir, cached_name), ignore_errors=True)
+
+    # write to a temporary directory first so partial entries are never read
+    temp_dir = entry_dir + '.tmp%d' % os.getpid()
+    write_table(table, temp_dir)
+    os.replace(temp_dir, entry_dir)
+
+    return table
@@ -41,7 +41,7 @@ def feature_generation(dynamic_sample):
     dynamic_sample_full["draught"] = draught
 
     # remove automatically generated fields
-    dynamic_sample_full.drop(["Unnamed: 0", "Unnamed: 0.1"], axis=1)
+    dynamic_sample_full.drop(["Unnamed: 0", "Unnamed: 0.1"], axis=1, errors="ignore")
 
     # option to save sampled dynamic dataset
     # dynamic_sample_full.to_csv("datasets/dynamic_sample_full.csv")
@@ -0,0 +1,252 @@
+"""
+lookup_cache.py
+
+Bounded memoization of per-entry environmental lookups, shared by the oceanic
+and weather matchers. Steps include...
+
+        L.1     Take the sorted axes of a source dataset: the distinct
+                latitudes, longitudes and timestamps its lookups snap to.
+        L.2     Find the nearest element of each axis to an AIS entry's
+                (lat, lon, ts), as the lookups do, to form the cache key of
+                the source point it resolves to.
+        L.3     Return a cached lookup result, or run the lookup and keep its
+                result, evicting the least recently used entry when full.
+
+Vessels on fixed routes report many messages nearest the same grid point (or
+station) and time, each of which then costs a few binary searches and a
+dictionary lookup rather than a search. As entries sharing a key resolve to
+the same source point, cached results equal uncached ones on irregular axes
+too. Hit and miss counters show how much repeated work is removed. Only the
+per-entry matchers use the cache, the batch matchers of __main__.py searching
+every entry at once, and it pays off only where hits are frequent (see
+benchmarks.py B.3).
+
+A cache keeps the reference (e.g. ocean store) it last searched for each
+source, so that no other object can take its id while its entries are kept.
+Searching a new reference evicts the previous one of the same source, with
+its axes and entries.
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import numpy as np
+from collections import OrderedDict
+
+### Import external functions ###
+import oceanic_matching
+
+
+# default largest number of cached lookups
+DEFAULT_MAX_ENTRIES = 100000
+
+
+
+def new_lookup_cache(max_entries=DEFAULT_MAX_ENTRIES):
+    """
+    L.3 Create an empty lookup cache.
+
+    Input:
+
+            max_entries         largest number of cached lookups.
+
+    Output:
+
+            cache               dictionary of the cached entries (least
+                                recently used first), the reference and axes
+                                of each source and the hit and miss counters.
+
+    """
+
+    cache = {
+        "max_entries": max_entries,
+        "entries": OrderedDict(),
+        "references": {},
+        "axes": {},
+        "hits": 0,
+        "misses": 0,
+    }
+
+    return cache
+
+
+
+def source_axes(lat, lon, ts):
+    """
+    L.1 Take the sorted distinct values of a source's coordinates.
+
+    Input:
+
+            lat                 latitudes of the source.
+            lon                 longitudes of the source.
+            ts                  timestamps of the source.
+
+    Output:
+
+            axes                dictionary of the sorted lat, lon and ts axes.
+
+    """
+
+    axes = {"lat": np.unique(lat), "lon": np.unique(lon), "ts": np.unique(ts)}
+
+    return axes
+
+
+
+def axis_key(axis, value):
+    """
+    L.2 Return the index of the axis element closest to a value, doubled,
+    plus one for a value exactly halfway between two elements, so that a tie
+    (which a lookup may resolve either way) never shares a key with a value
+    nearer the lower element.
+
+    """
+
+    index = int(oceanic_matching.nearest_axis_index(axis, value))
+
+    tie = 0 < index + 1 < len(axis) and value - axis[index] == axis[index + 1] - value
+
+    return 2 * index + int(tie)
+
+
+
+def cell_key(cache, source, reference, axes_function, partition, AIS_lat, AIS_lon, AIS_ts, *settings):
+    """
+    L.2 Form the cache key of the source point nearest an AIS entry, taking
+    the source's axes on first use.
+
+    Input:
+
+            cache               lookup cache.
+            source              name of the source (e.g. "ocean").
+            reference           source dataset the lookup searches.
+            axes_function       function returning the axes of each partition
+                                of the reference (see source_axes).
+            partition           index of the partition searched (e.g. the
+                                month of an ocean store), 0 if unpartitioned.
+            AIS_lat             latitude of AIS entry.
+            AIS_lon             longitude of AIS entry.
+            AIS_ts              timestamp of AIS entry.
+            settings            further lookup settings that change its
+                                result.
+
+    Output:
+
+            key                 hashable cache key.
+
+    """
+
+    # the reference is identified by its id, which stays unique while the
+    # cache holds it, a new reference of a source evicting the previous one
+    reference_key = (source, id(reference))
+
+    if cache["references"].get(source) is not reference:
+        evict_source(cache, source)
+        cache["references"][source] = reference
+        cache["axes"][reference_key] = axes_function(reference)
+    axes = cache["axes"][reference_key][partition]
+
+    key = reference_key + (partition,
+                           axis_key(axes["lat"], AIS_lat),
+                           axis_key(axes["lon"], AIS_lon),
+                           axis_key(axes["ts"], AIS_ts)) + settings
+
+    return key
+
+
+
+def evict_source(cache, source):
+    """
+    L.3 Remove the reference of a source from a cache, with its axes and
+    cached entries.
+
+    """
+
+    reference = cache["references"].pop(source, None)
+    if reference is None:
+        return
+
+    reference_key = (source, id(reference))
+    del cache["axes"][reference_key]
+    for key in [key for key in cache["entries"] if key[:2] == reference_key]:
+        del cache["entries"][key]
+
+
+
+def cached_lookup(cache, key, lookup, *args):
+    """
+    L.3 Return the cached result of a key, or run the lookup and cache its
+    result.
+
+    Input:
+
+            cache               lookup cache.
+            key                 cache key (see cell_key).
+            lookup              function run on a miss.
+            args                arguments passed to the lookup.
+
+    Output:
+
+            result              result of the lookup.
+
+    """
+
+    entries = cache["entries"]
+
+    if key in entries:
+        cache["hits"] += 1
+        entries.move_to_end(key)
+        return entries[key]
+
+    cache["misses"] += 1
+    result = lookup(*args)
+
+    entries[key] = result
+    if len(entries) > cache["max_entries"]:
+        entries.popitem(last=False)
+
+    return result
+
+
+
+def cache_stats(cache):
+    """
+    L.3 Summarise the use of a lookup cache.
+
+    Input:
+
+            cache               lookup cache.
+
+    Output:
+
+            stats               dictionary of hits, misses, hit rate and
+                                number of cached entries.
+
+    """
+
+    lookups = cache["hits"] + cache["misses"]
+
+    stats = {
+        "hits": cache["hits"],
+        "misses": cache["misses"],
+        "hit_rate": cache["hits"] / lookups if lookups else 0.0,
+        "entries": len(cache["entries"]),
+    }
+
+    return stats
+
+
+
+def clear_cache(cache):
+    """
+    L.3 Empty a lookup cache and reset its counters.
+
+    """
+
+    cache["entries"].clear()
+    cache["references"].clear()
+    cache["axes"].clear()
+    cache["hits"] = 0
+    cache["misses"] = 0
@@ -1,244 +1,856 @@
-###############################
-### DECISION TREE REGRESSOR ###
-###############################
-# associated literature
-# L. Breiman, J. Friedman, R. Olshen, and C. Stone, “Classification and Regression Trees”, Wadsworth, Belmont, CA, 1984.
-# T. Hastie, R. Tibshirani and J. Friedman. “Elements of Statistical Learning”, Springer, 2009.
-# L. Breiman, and A. Cutler, “Random Forests”, https://www.stat.berkeley.edu/~breiman/RandomForests/cc_home.htm
-
+"""
+model.py
+
+Script to model the speed over ground (SOG) of containerships from their
+enriched AIS entries with a decision tree regressor (DTR), and to project SOG
+under climate scenarios. Steps include...
+
+        M.1     Load the enriched AIS dataset and plot the spread of SOG.
+        M.2     Split the dataset 80:20 and train the DTR on every feature.
+        M.3     Predict SOG under a table of climate scenarios (per-feature
+                deltas and multipliers, e.g. the 2030 and 2050 projections or
+                Monte Carlo draws) in stacked batches, and the change in SOG
+                and CO2 (third-power relation) of each.
+        M.4     Sweep the features, fitting a DTR on each feature alone in
+                parallel, and chart their determination coefficients (R2).
+        M.5     Train the DTR and save it as a new version of a model
+                artifact: the DTR compiled to arrays (see tree_arrays.py),
+                its feature schema and the fingerprint of its training data.
+        M.6     Score an enriched AIS dataset with a saved artifact, reading,
+                predicting and writing it in chunks so memory stays bounded.
+        M.7     Bin the continuous environmental features once into uint8
+                bins with stored edges, train a random forest and a
+                histogram gradient boosting regressor on the binned features
+                on every core, and compare them with the single DTR by R2,
+                fit and predict times and the memory of their training
+                features.
+
+Usage...
+
+        python3 model.py datasets
+        python3 model.py train datasets model_dir
+        python3 model.py score model_dir enriched.csv scored.csv
+        python3 model.py ensemble datasets
+
+Scoring loads the latest artifact version in model_dir, so new months are
+scored without retraining or reading the training data.
+
+
+Associated literature...
+
+        L. Breiman, J. Friedman, R. Olshen, and C. Stone, "Classification and
+        Regression Trees", Wadsworth, Belmont, CA, 1984.
+        T. Hastie, R. Tibshirani and J. Friedman. "Elements of Statistical
+        Learning", Springer, 2009.
+        L. Breiman, and A. Cutler, "Random Forests",
+        https://www.stat.berkeley.edu/~breiman/RandomForests/cc_home.htm
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
 
 # import machine learning libraries
 from sklearn.model_selection import train_test_split
-from sklearn.datasets import load_iris
 from sklearn.tree import DecisionTreeRegressor
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
 from sklearn.metrics import r2_score
 
+### Import external functions ###
+import data_cache
+import schema
+import tree_arrays
+
+
+# modelled field and the features used to model it
+TARGET = "speedoverground"
+MODEL_FEATURES = ["courseoverground", "volume", "draught", "ocean_hs", "ocean_dir", "ocean_lm",
+                  "weather_wind_ID", "weather_Ff", "weather_P", "weather_T"]
+
+# chart labels of the features
+FEATURE_LABELS = {
+    "courseoverground": "Course over \nGround",
+    "volume": "Tonnage",
+    "draught": "Draught",
+    "ocean_hs": "Wave \nHeight",
+    "ocean_dir": "Wave \nDirection",
+    "ocean_lm": "Wave \nPeriod",
+    "weather_wind_ID": "Wind\nDirection",
+    "weather_Ff": "Wind\nSpeed",
+    "weather_P": "Air \nPressure",
+    "weather_T": "Temperature",
+}
+
+# decision tree regressor settings
+DTR_PARAMETERS = {"random_state": 0, "max_depth": None, "min_samples_split": 4, "min_samples_leaf": 3}
+
+# climate scenarios: changes added to features by 2030 and 2050
+CLIMATE_SCENARIOS = pd.DataFrame({
+    "scenario": ["2030"] * 3 + ["2050"] * 3,
+    "feature": ["ocean_hs", "weather_Ff", "weather_T"] * 2,
+    "delta": [0.035, 0.28, 0.364, 0.085, 0.68, 0.884],
+})
+
+# largest number of perturbed entries predicted per call
+SCENARIO_BATCH_ROWS = 2000000
+
+# directory of saved figures
+FIGURE_DIR = "Shipping"
+
+# format of saved model artifacts, raised when it changes incompatibly
+ARTIFACT_VERSION = 1
+
+# file of an artifact's description within its version directory
+ARTIFACT_FILENAME = 'model.json'
+
+# number of entries scored at a time
+SCORE_CHUNK_ROWS = 500000
+
+# continuous environmental features binned before ensemble training, and the
+# largest number of bins (so bin indices fit uint8)
+BINNED_FEATURES = ["ocean_hs", "ocean_lm", "weather_Ff", "weather_P", "weather_T"]
+FEATURE_BINS = 255
+
+# ensemble regressor settings, training on every core
+ENSEMBLE_MODELS = {
+    "random forest": (RandomForestRegressor, {"n_estimators": 100, "min_samples_leaf": 3, "max_features": 0.5,
+                                              "n_jobs": -1, "random_state": 0}),
+    "histogram gradient boosting": (HistGradientBoostingRegressor, {"max_iter": 300, "learning_rate": 0.1,
+                                                                    "max_bins": FEATURE_BINS, "random_state": 0}),
+}
+
+
+
+def load_model_data(data_dir):
+    """
+    M.1 Load the enriched AIS dataset, keeping entries with every feature.
+
+    Input:
+
+            data_dir            directory of datasets used.
+
+    Output:
+
+            full_dynamic_set    enriched AIS dataset.
+
+    """
+
+    # load in sampled dynamic dataset
+    full_dynamic_set = pd.read_csv(data_dir + r'/full_dynamic_set.csv')
+
+    # entries outside the oceanic or weather coverage cannot be modelled
+    full_dynamic_set = full_dynamic_set.dropna(subset=MODEL_FEATURES + [TARGET]).reset_index(drop=True)
+
+    return full_dynamic_set
+
+
+
+def plot_SOG_histogram(full_dynamic_set, figure_filename):
+    """
+    M.1 Plot a histogram of SOG.
+
+    """
+
+    # explore range of SOGs
+    SOG_plot = full_dynamic_set[TARGET].values
+
+    plt.figure()
+    plt.hist(x=SOG_plot, bins='auto', color='#0504aa', alpha=1.0, rwidth=0.85)
+    plt.grid(axis='y', alpha=0.75)
+    plt.xlabel('Speed over Ground')
+    plt.ylabel('Counts')
+    plt.savefig(figure_filename)
+    plt.close()
+
+
+
+def split_dataset(full_dynamic_set, test_size=0.2, random_state=1):
+    """
+    M.2 Get training and testing datasets using an 80:20 ratio.
+
+    Input:
+
+            full_dynamic_set    enriched AIS dataset.
+            test_size           share of entries held out for testing.
+            random_state        random seed of the split.
+
+    Output:
+
+            training_df         training entries.
+            testing_df          testing entries.
+
+    """
+
+    training_df, testing_df = train_test_split(full_dynamic_set, test_size=test_size, train_size=1.0 - test_size, random_state=random_state)
+
+    return training_df, testing_df
+
+
+
+def train_DTR(training_df, features=MODEL_FEATURES):
+    """
+    M.2 Train the decision tree regressor of SOG.
+
+    Input:
+
+            training_df         training entries.
+            features            features used.
+
+    Output:
+
+            DTR                 fitted decision tree regressor.
+
+    """
+
+    DTR = DecisionTreeRegressor(**DTR_PARAMETERS)
+    DTR.fit(training_df[features].values, training_df[TARGET].values)
+
+    return DTR
+
+
+
+def predict_SOG(DTR, X):
+    """
+    M.3 Predict SOG with a fitted DTR or with the DTR compiled to arrays,
+    which give the same predictions.
+
+    Input:
+
+            DTR                 fitted decision tree regressor, or compiled
+                                trees (see tree_arrays.compile_trees).
+            X                   entries (entries x features).
+
+    Output:
+
+            predictions         predicted SOG of each entry.
+
+    """
+
+    if isinstance(DTR, dict):
+        return tree_arrays.predict_tree_arrays(DTR, X)
+
+    return DTR.predict(X)
+
+
+
+def scenario_matrices(scenario_table, features=MODEL_FEATURES):
+    """
+    M.3 Arrange a table of scenarios as per-feature multipliers and deltas.
+
+    Input:
+
+            scenario_table      table of scenario, feature, delta (added,
+                                default 0) and multiplier (applied first,
+                                default 1), one row per changed feature of
+                                a scenario.
+            features            features used by the DTR.
+
+    Output:
+
+            scenarios           scenario names, in order of first appearance.
+            multipliers         array (scenarios x features) of multipliers.
+            deltas              array (scenarios x features) of deltas.
+
+    """
+
+    unknown = set(scenario_table["feature"]) - set(features)
+    if unknown:
+        raise ValueError("scenario features not used by the DTR: %s" % sorted(unknown))
+
+    scenarios = pd.unique(scenario_table["scenario"])
+    scenario_idx = pd.Index(scenarios).get_indexer(scenario_table["scenario"])
+    feature_idx = pd.Index(features).get_indexer(scenario_table["feature"])
+
+    multipliers = np.ones((len(scenarios), len(features)))
+    deltas = np.zeros((len(scenarios), len(features)))
+    # rows without a multiplier or delta (e.g. of concatenated tables) keep
+    # the defaults
+    if "multiplier" in scenario_table:
+        multipliers[scenario_idx, feature_idx] = scenario_table["multiplier"].fillna(1.0).values
+    if "delta" in scenario_table:
+        deltas[scenario_idx, feature_idx] = scenario_table["delta"].fillna(0.0).values
+
+    return list(scenarios), multipliers, deltas
+
+
+
+def monte_carlo_scenarios(deltas, relative_spread=0.25, n_draws=100, random_state=0):
+    """
+    M.3 Draw scenarios around a set of feature deltas.
+
+    Input:
+
+            deltas              dictionary of the central change added to
+                                each feature.
+            relative_spread     standard deviation of each draw, relative to
+                                its central change.
+            n_draws             number of scenarios drawn.
+            random_state        seed of the draws.
+
+    Output:
+
+            scenario_table      table of scenario, feature and delta (see
+                                scenario_matrices).
+
+    """
+
+    rng = np.random.default_rng(random_state)
+    features = list(deltas)
+    central = np.array([deltas[feature] for feature in features])
+    draws = rng.normal(central, np.abs(central) * relative_spread, size=(n_draws, len(features)))
+
+    scenario_table = pd.DataFrame({
+        "scenario": np.repeat(["draw_%d" % draw for draw in range(n_draws)], len(features)),
+        "feature": np.tile(features, n_draws),
+        "delta": draws.ravel(),
+    })
+
+    return scenario_table
+
+
+
+def project_scenarios(DTR, testing_df, scenario_table, features=MODEL_FEATURES, batch_rows=SCENARIO_BATCH_ROWS):
+    """
+    M.3 Predict SOG under every scenario of a table and summarise the change
+    in SOG and CO2 (third-power relation) from the baseline.
+
+    Input:
+
+            DTR                 fitted decision tree regressor, or the DTR
+                                compiled to arrays (see tree_arrays.py).
+            testing_df          testing entries.
+            scenario_table      table of scenarios (see scenario_matrices).
+            features            features used by the DTR.
+            batch_rows          largest number of perturbed entries predicted
+                                per call.
+
+    Output:
+
+            scenario_results    table of the mean SOG, SOG change, spread of
+                                the per-entry SOG change and CO2 change of
+                                each scenario.
+
+    """
+
+    scenarios, multipliers, deltas = scenario_matrices(scenario_table, features)
+    X = testing_df[features].values.astype(np.float64)
+    n_entries = len(X)
+
+    baseline_predictions = predict_SOG(DTR, X.astype(np.float32))
+    baseline_mean = np.average(baseline_predictions)
+
+    # perturbed entries of a batch of scenarios are stacked into one single
+    # precision array (as the DTR predicts in), one feature at a time
+    batch_scenarios = max(1, batch_rows // max(n_entries, 1))
+    mean_SOG = np.empty(len(scenarios))
+    change_std = np.empty(len(scenarios))
+
+    for batch_start in range(0, len(scenarios), batch_scenarios):
+        batch = slice(batch_start, min(batch_start + batch_scenarios, len(scenarios)))
+        n_batch = batch.stop - batch.start
+
+        stacked = np.empty((n_batch, n_entries, len(features)), dtype=np.float32)
+        for feature_idx in range(len(features)):
+            stacked[:, :, feature_idx] = (X[:, feature_idx] * multipliers[batch, feature_idx, None]
+                                          + deltas[batch, feature_idx, None])
+
+        scenario_predictions = predict_SOG(DTR, stacked.reshape(-1, len(features))).reshape(n_batch, n_entries)
+
+        mean_SOG[batch] = scenario_predictions.mean(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            entry_change = (baseline_predictions - scenario_predictions) / baseline_predictions
+        change_std[batch] = np.nanstd(np.where(np.isfinite(entry_change), entry_change, np.nan), axis=1)
+
+    SOG_change = (baseline_mean - mean_SOG) / baseline_mean
+
+    scenario_results = pd.DataFrame({
+        "scenario": scenarios,
+        "SOG_mean": mean_SOG,
+        "SOG_change": SOG_change,
+        "SOG_change_std": change_std,
+        "CO2_change": SOG_change ** 3,
+    })
+
+    return scenario_results
+
+
+
+def fit_single_feature(feature_task):
+    """
+    M.4 Fit and score a DTR on one feature.
+
+    Input:
+
+            feature_task        tuple of the feature name, its training and
+                                testing values and the training and testing
+                                SOG.
+
+    Output:
+
+            feature_result      dictionary of the feature, R2 on the testing
+                                entries and fit time (s).
+
+    """
+
+    feature, x_train, x_test, y_train, y_test = feature_task
+    start = time.perf_counter()
+
+    DTR_feature = DecisionTreeRegressor(**DTR_PARAMETERS)
+    DTR_feature.fit(x_train.reshape(-1, 1), y_train)
+    y_predicted = DTR_feature.predict(x_test.reshape(-1, 1))
+
+    feature_result = {"feature": feature, "r2": r2_score(y_test, y_predicted), "fit_s": time.perf_counter() - start}
+
+    return feature_result
+
+
+
+def feature_sweep(training_df, testing_df, features=MODEL_FEATURES, n_workers=None):
+    """
+    M.4 Fit a DTR on each feature alone, in a pool of worker processes, and
+    score each on the testing entries. Each feature's DTR is the one a serial
+    sweep fits, so the results do not depend on the number of workers. The
+    columns are not presorted: DecisionTreeRegressor sorts each node's
+    entries itself, so a sweep scales with the number of features through
+    the pool rather than through a shared sort.
+
+    Input:
+
+            training_df         training entries.
+            testing_df          testing entries.
+            features            any list of feature fields.
+            n_workers           number of worker processes, defaults to the
+                                number of CPUs; 1 runs in this process.
+
+    Output:
+
+            sweep_results       dataframe of feature, chart label, R2 and fit
+                                time (s), by decreasing R2.
+
+    """
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    y_train = training_df[TARGET].values.astype(np.float64)
+    y_test = testing_df[TARGET].values.astype(np.float64)
+    feature_tasks = [(feature, training_df[feature].values.astype(np.float64), testing_df[feature].values.astype(np.float64),
+                      y_train, y_test) for feature in features]
+
+    if n_workers == 1:
+        feature_results = [fit_single_feature(feature_task) for feature_task in feature_tasks]
+
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_workers, len(feature_tasks))) as pool:
+            feature_results = list(pool.map(fit_single_feature, feature_tasks))
+
+    sweep_results = pd.DataFrame(feature_results)
+    sweep_results.insert(1, "label", [FEATURE_LABELS.get(feature, feature) for feature in sweep_results["feature"]])
+    sweep_results = sweep_results.sort_values("r2", ascending=False, kind="stable").reset_index(drop=True)
+
+    return sweep_results
+
+
+
+def plot_feature_importance(sweep_results, figure_filename):
+    """
+    M.4 Chart the R2 of each single-feature DTR.
+
+    """
+
+    plt.figure()
+    plt.bar(sweep_results["label"], sweep_results["r2"], align='center')
+    plt.xlabel('Feature')
+    plt.ylabel('Determination Coefficient')
+    plt.xticks(fontsize=8, rotation=90)
+    plt.grid(axis='y', alpha=0.75)
+    plt.tight_layout()
+    plt.savefig(figure_filename)
+    plt.close()
+
+
+
+def model_versions(model_dir):
+    """
+    M.5 List the saved versions of a model artifact, oldest first.
+
+    """
+
+    if not os.path.isdir(model_dir):
+        return []
+
+    return sorted(version for version in os.listdir(model_dir)
+                  if os.path.exists(os.path.join(model_dir, version, ARTIFACT_FILENAME)))
+
+
+
+def feature_schema(training_df, features=MODEL_FEATURES):
+    """
+    M.5 Describe the features a DTR was trained on.
+
+    Input:
+
+            training_df         training entries.
+            features            features used by the DTR, in order.
+
+    Output:
+
+            features_schema     list of the name, declared type (see
+                                schema.py) and training range of each
+                                feature.
+
+    """
+
+    features_schema = [{"name": feature,
+                        "dtype": np.dtype(schema.ENRICHED_SCHEMA.get(feature, np.float64)).name,
+                        "min": float(training_df[feature].min()),
+                        "max": float(training_df[feature].max())}
+                       for feature in features]
+
+    return features_schema
 
-# load in sampled dynamic dataset
-full_dynamic_set = pd.read_csv("datasets/full_dynamic_set.csv")
 
 
-# explore range of SOGs
-SOG_plot = final_mmsi_short_clean["speedoverground"].values
-np.average(SOG_plot)
-max(SOG_plot)
+def train_model_artifact(data_dir, model_dir, features=MODEL_FEATURES):
+    """
+    M.5 Train the DTR on the enriched AIS dataset and save it as the next
+    version of a model artifact.
 
+    Input:
 
-# historgram
-n, bins, patches = plt.hist(x=SOG_plot, bins='auto', color='#0504aa', alpha=1.0, rwidth=0.85)
-plt.grid(axis='y', alpha=0.75)
-plt.xlabel('Speed over Ground')
-plt.ylabel('Counts')
-maxfreq = n.max()
-plt.savefig("Shipping/SOG_histogram.png")
+            data_dir            directory of datasets used.
+            model_dir           directory of the artifact's versions.
+            features            features used by the DTR.
 
+    Output:
 
+            version_dir         directory of the saved version.
 
+    """
 
-### MODEL TRAINING ###
-# get training and testing datasets using 80:20 ratio
-training_df, testing_df = train_test_split(final_mmsi_short_clean, test_size=0.2, train_size=0.8, random_state=1)
+    training_filename = data_dir + r'/full_dynamic_set.csv'
+    full_dynamic_set = load_model_data(data_dir)
+    training_df, testing_df = split_dataset(full_dynamic_set)
 
+    start = time.perf_counter()
+    DTR = train_DTR(training_df, features)
+    fit_time = time.perf_counter() - start
 
-# split training and testing sets into independent and dependent variables
-training_df_x = training_df.drop(["speedoverground"], axis=1)
-training_df_y = training_df["speedoverground"]
+    # compiled trees predict as the DTR does, without sklearn
+    compiled = tree_arrays.compile_trees(DTR)
+    test_r2 = r2_score(testing_df[TARGET].values, tree_arrays.predict_tree_arrays(compiled, testing_df[features].values))
 
-testing_df_x = testing_df.drop(["speedoverground"], axis=1)
-testing_df_y = testing_df["speedoverground"]
+    # versions are numbered in order of training
+    versions = model_versions(model_dir)
+    version = "v%04d" % (int(versions[-1][1:]) + 1 if versions else 1)
+    version_dir = os.path.join(model_dir, version)
+    tree_arrays.save_tree_arrays(compiled, version_dir)
 
+    description = {
+        "artifact_version": ARTIFACT_VERSION,
+        "model_version": version,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "estimator": "DecisionTreeRegressor",
+        "parameters": DTR_PARAMETERS,
+        "target": TARGET,
+        "features": feature_schema(training_df, features),
+        "training_data": {
+            "filename": os.path.abspath(training_filename),
+            "fingerprint": data_cache.file_fingerprint(training_filename, content_hash=True),
+            "rows": len(full_dynamic_set),
+        },
+        "metrics": {"n_train": len(training_df), "n_test": len(testing_df), "test_r2": test_r2,
+                    "fit_s": fit_time, "depth": int(DTR.get_depth()), "leaves": int(DTR.get_n_leaves())},
+    }
 
-# training the decision tree regressor (DTR)
-DTR = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR.fit(training_df_x, training_df_y)
+    with open(os.path.join(version_dir, ARTIFACT_FILENAME), 'w') as artifact_file:
+        json.dump(description, artifact_file, indent=2)
 
+    return version_dir
 
-# explore the DTR just built
-DTR.get_depth()
-DTR.get_n_leaves()
 
 
-# Baseline predicition performance
-baseline_predictions = DTR.predict(x_testing)
-DTR.score(baseline_predictions, y_testing)
+def load_model_artifact(model_dir, version=None):
+    """
+    M.6 Load a version of a model artifact, its trees as memory maps.
 
+    Input:
 
+            model_dir           directory of the artifact's versions.
+            version             version to load (e.g. "v0002"), None for the
+                                latest.
 
+    Output:
 
-### FORECASTING & SCENARIOS ###
-# Scenario 2030
-scenario_2030 = test.drop(["speedoverground"], axis=1)
-wave_height_2030 = x_testing["ocean_hs"] + 0.035
-wind_speed_2030 = x_testing["weather_Ff"] + 0.28
-air_temp_2030 = x_testing["weather_T"] + 0.364
+            artifact            dictionary of the artifact's description (see
+                                train_model_artifact) and compiled trees.
 
-scenario_2030["ocean_hs"] = wave_height_2030
-scenario_2030["weather_Ff"] = wind_speed_2030
-scenario_2030["weather_T"] = air_temp_2030
-scenario_2030_predictions = DTR.predict(scenario_2030)
+    """
 
+    versions = model_versions(model_dir)
+    if not versions:
+        raise FileNotFoundError("no model artifact in %s" % model_dir)
+    version_dir = os.path.join(model_dir, version or versions[-1])
 
-# Scenario 2050
-scenario_2050 = test.drop(["speedoverground"], axis=1)
-wave_height_2050 = x_testing["ocean_hs"] + 0.085
-wind_speed_2050 = x_testing["weather_Ff"] + 0.68
-air_temp_2050 = x_testing["weather_T"] + 0.884
+    with open(os.path.join(version_dir, ARTIFACT_FILENAME)) as artifact_file:
+        artifact = json.load(artifact_file)
 
-scenario_2050["ocean_hs"] = wave_height_2050
-scenario_2050["weather_Ff"] = wind_speed_2050
-scenario_2050["weather_T"] = air_temp_2050
-scenario_2050_predictions = DTR.predict(scenario_2050)
+    if artifact["artifact_version"] != ARTIFACT_VERSION:
+        raise ValueError("artifact format %s cannot be read, expected %s" % (artifact["artifact_version"], ARTIFACT_VERSION))
 
+    artifact["trees"] = tree_arrays.load_tree_arrays(version_dir)
 
-# Comparison of Scenarios
-np.average(baseline_predictions)
-np.average(scenario_2030_predictions)
-np.average(scenario_2050_predictions)
+    return artifact
 
-# change in SOG to 2030 & 2050
-(np.average(baseline_predictions) - np.average(scenario_2030_predictions)) / np.average(baseline_predictions)
-(np.average(baseline_predictions) - np.average(scenario_2050_predictions)) / np.average(baseline_predictions)
 
-# CO2 third-power relation
-((np.average(baseline_predictions) - np.average(scenario_2030_predictions)) / np.average(baseline_predictions)) ** (3)
-((np.average(baseline_predictions) - np.average(scenario_2050_predictions)) / np.average(baseline_predictions)) ** (3)
 
+def score_file(artifact, input_filename, output_filename, chunk_rows=SCORE_CHUNK_ROWS):
+    """
+    M.6 Predict SOG for every entry of an enriched AIS dataset, chunk by
+    chunk, writing the entries with their prediction. Entries missing a
+    feature are written without one.
 
+    Input:
 
+            artifact            loaded model artifact (see
+                                load_model_artifact).
+            input_filename      enriched AIS dataset.
+            output_filename     scored dataset written.
+            chunk_rows          number of entries scored at a time.
 
-### Comparison of R2 coefficients ###
-# COG R2
-x_train_COG = np.array(train["courseoverground"]).reshape(-1, 1)
-x_test_COG = np.array(test["courseoverground"]).reshape(-1, 1)
+    Output:
 
-DTR_COG = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR_COG.fit(x_train_COG, y_training)
+            score_summary       dictionary of the number of entries, entries
+                                scored, entries with a feature outside its
+                                training range and the time taken (s).
 
-y_test_COG = DTR_COG.predict(x_test_COG).reshape(-1, 1)
-r2_score(y_testing, y_test_COG)
+    """
 
+    features = [feature["name"] for feature in artifact["features"]]
+    feature_min = np.array([feature["min"] for feature in artifact["features"]])
+    feature_max = np.array([feature["max"] for feature in artifact["features"]])
+    prediction_column = "predicted_" + artifact["target"]
 
+    score_summary = {"entries": 0, "scored": 0, "out_of_range": 0}
+    start = time.perf_counter()
 
-# Volume
-x_train_vol = np.array(train["volume"]).reshape(-1, 1)
-x_test_vol = np.array(test["volume"]).reshape(-1, 1)
+    for chunk_idx, chunk in enumerate(pd.read_csv(input_filename, chunksize=chunk_rows)):
+        missing_features = [feature for feature in features if feature not in chunk.columns]
+        if missing_features:
+            raise ValueError("%s is missing features %s" % (input_filename, missing_features))
 
-DTR_vol = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR_vol.fit(x_train_vol, y_training)
+        X = chunk[features].values.astype(np.float32)
+        complete = ~np.isnan(X).any(axis=1)
 
-y_test_vol = DTR_vol.predict(x_test_vol).reshape(-1, 1)
-r2_score(y_testing, y_test_vol)
+        predictions = np.full(len(chunk), np.nan)
+        predictions[complete] = tree_arrays.predict_tree_arrays(artifact["trees"], X[complete])
+        chunk[prediction_column] = predictions
 
+        score_summary["entries"] += len(chunk)
+        score_summary["scored"] += int(complete.sum())
+        score_summary["out_of_range"] += int(((X[complete] < feature_min) | (X[complete] > feature_max)).any(axis=1).sum())
 
+        chunk.to_csv(output_filename, mode='w' if chunk_idx == 0 else 'a', header=chunk_idx == 0, index=False)
 
-# draught
-x_train_dra = np.array(train["draught"]).reshape(-1, 1)
-x_test_dra = np.array(test["draught"]).reshape(-1, 1)
+    score_summary["time_s"] = time.perf_counter() - start
 
-DTR_dra = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR_dra.fit(x_train_dra, y_training)
+    return score_summary
 
-y_test_dra = DTR_dra.predict(x_test_dra).reshape(-1, 1)
-r2_score(y_testing, y_test_dra)
 
 
+def fit_feature_bins(training_df, features=BINNED_FEATURES, n_bins=FEATURE_BINS):
+    """
+    M.7 Find the bin edges of each binned feature from the training entries:
+    between each distinct value if there are few enough, otherwise at
+    quantiles.
 
-# ocean_hs
-x_train_hs = np.array(train["ocean_hs"]).reshape(-1, 1)
-x_test_hs = np.array(test["ocean_hs"]).reshape(-1, 1)
+    Input:
 
-DTR_hs = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR_hs.fit(x_train_hs, y_training)
+            training_df         training entries.
+            features            features binned.
+            n_bins              largest number of bins (at most 256).
 
-y_test_hs = DTR_hs.predict(x_test_hs).reshape(-1, 1)
-r2_score(y_testing, y_test_hs)
+    Output:
 
+            bin_edges           dictionary of the increasing bin edges of each
+                                feature.
 
+    """
 
-# ocean_dir
-x_train_ocean_dir = np.array(train["ocean_dir"]).reshape(-1, 1)
-x_test_ocean_dir = np.array(test["ocean_dir"]).reshape(-1, 1)
+    bin_edges = {}
+    for feature in features:
+        values = np.unique(training_df[feature].values)
 
-DTR_ocean_dir = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR_ocean_dir.fit(x_train_ocean_dir, y_training)
+        if len(values) <= n_bins:
+            edges = (values[:-1] + values[1:]) / 2
+        else:
+            edges = np.unique(np.quantile(training_df[feature].values, np.linspace(0, 1, n_bins + 1)[1:-1]))
 
-y_test_ocean_dir = DTR_ocean_dir.predict(x_test_ocean_dir).reshape(-1, 1)
-r2_score(y_testing, y_test_ocean_dir)
+        bin_edges[feature] = edges
 
+    return bin_edges
 
 
-# ocean_lm
-x_train_lm = np.array(train["ocean_lm"]).reshape(-1, 1)
-x_test_lm = np.array(test["ocean_lm"]).reshape(-1, 1)
 
-DTR_lm = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR_lm.fit(x_train_lm, y_training)
+def bin_features(df, bin_edges, features=MODEL_FEATURES):
+    """
+    M.7 Replace binned features by their uint8 bin index, keeping the others
+    in single precision.
 
-y_test_lm = DTR_lm.predict(x_test_lm).reshape(-1, 1)
-r2_score(y_testing, y_test_lm)
+    Input:
 
+            df                  entries.
+            bin_edges           bin edges of the binned features (see
+                                fit_feature_bins).
+            features            features used, in order.
 
+    Output:
 
-# weather_wind_ID
-x_train_wind_id = np.array(train["weather_wind_ID"]).reshape(-1, 1)
-x_test_wind_id = np.array(test["weather_wind_ID"]).reshape(-1, 1)
+            binned_df           entries' features, binned features as uint8
+                                bin indices and the others as float32.
 
-DTR_wind_id = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR_wind_id.fit(x_train_wind_id, y_training)
+    """
 
-y_test_wind_id = DTR_wind_id.predict(x_test_wind_id).reshape(-1, 1)
-r2_score(y_testing, y_test_wind_id)
+    binned_df = pd.DataFrame({feature: np.searchsorted(bin_edges[feature], df[feature].values, side='right').astype(np.uint8)
+                              if feature in bin_edges else df[feature].values.astype(np.float32) for feature in features})
 
+    return binned_df
 
 
-# weather_Ff
-x_train_Ff = np.array(train["weather_Ff"]).reshape(-1, 1)
-x_test_Ff = np.array(test["weather_Ff"]).reshape(-1, 1)
 
-DTR_Ff = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR_Ff.fit(x_train_Ff, y_training)
+def compare_ensembles(training_df, testing_df, features=MODEL_FEATURES, ensemble_models=ENSEMBLE_MODELS):
+    """
+    M.7 Train the single DTR on the features in single precision and each
+    ensemble regressor on the binned features, and compare their R2, timings
+    and the memory of their training features. The features are binned once,
+    with edges from the training entries that are then applied to the
+    testing entries, and shared by every ensemble.
 
-y_test_Ff = DTR_Ff.predict(x_test_Ff).reshape(-1, 1)
-r2_score(y_testing, y_test_Ff)
+    Input:
 
+            training_df         training entries.
+            testing_df          testing entries.
+            features            features used.
+            ensemble_models     dictionary of the regressor class and
+                                settings of each ensemble.
 
+    Output:
 
-# weather_P
-x_train_P = np.array(train["weather_P"]).reshape(-1, 1)
-x_test_P = np.array(test["weather_P"]).reshape(-1, 1)
+            comparison          table of each model's training features
+                                (float32 or binned) and their size (MB), R2
+                                and fit and predict times (s), binning time
+                                included in both.
 
-DTR_P = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR_P.fit(x_train_P, y_training)
+    """
 
-y_test_P = DTR_P.predict(x_test_P).reshape(-1, 1)
-r2_score(y_testing, y_test_P)
+    y_train, y_test = training_df[TARGET].values, testing_df[TARGET].values
+    rows = []
 
+    # single tree baseline, on the single precision features it is fitted on
+    start = time.perf_counter()
+    DTR = train_DTR(training_df, features)
+    fit_time = time.perf_counter() - start
+    start = time.perf_counter()
+    DTR_predictions = DTR.predict(testing_df[features].values)
+    predict_time = time.perf_counter() - start
+    rows.append({"model": "decision tree", "features": "float32", "train_mb": len(training_df) * len(features) * 4 / 1e6,
+                 "r2": r2_score(y_test, DTR_predictions), "fit_s": fit_time, "predict_s": predict_time})
 
+    # features are binned once, then shared by every ensemble
+    start = time.perf_counter()
+    bin_edges = fit_feature_bins(training_df, [feature for feature in BINNED_FEATURES if feature in features])
+    binned_train = bin_features(training_df, bin_edges, features)
+    bin_time = time.perf_counter() - start
+    start = time.perf_counter()
+    binned_test = bin_features(testing_df, bin_edges, features)
+    bin_test_time = time.perf_counter() - start
 
-# weather_T
-x_train_T = np.array(train["weather_T"]).reshape(-1, 1)
-x_test_T = np.array(test["weather_T"]).reshape(-1, 1)
+    for model_name, (model_class, model_parameters) in ensemble_models.items():
+        start = time.perf_counter()
+        ensemble = model_class(**model_parameters).fit(binned_train, y_train)
+        fit_time = time.perf_counter() - start + bin_time
 
-DTR_T = DecisionTreeRegressor(random_state=0, max_depth=None, min_samples_split=4, min_samples_leaf=3)
-DTR_T.fit(x_train_T, y_training)
+        start = time.perf_counter()
+        ensemble_predictions = ensemble.predict(binned_test)
+        rows.append({"model": model_name, "features": "binned", "train_mb": binned_train.memory_usage(index=False).sum() / 1e6,
+                     "r2": r2_score(y_test, ensemble_predictions), "fit_s": fit_time, "predict_s": time.perf_counter() - start + bin_test_time})
 
-y_test_T = DTR_T.predict(x_test_T).reshape(-1, 1)
-r2_score(y_testing, y_test_T)
+    comparison = pd.DataFrame(rows)
 
+    return comparison
 
 
-# R2 visualisation
-r2s = [0.6104, 0.5006, 0.4588, 0.3698, 0.3537, 0.2281, 0.0925, 0.0719, 0.0429, 0.0238]
-features = ["Wave \nHeight", "Wave \nDirection", "Course over \nGround", "Wave \nPeriod", "Air \nPressure", "Temperature", "Wind\nDirection", "Wind\nSpeed", "Tonnage", "Draught"]
-bottoms = [2, 4, 6, 8, 10, 12, 14, 16, 18, 20]
 
-plt.bar(features, r2s, align='center')
-plt.xlabel('Feature')
-plt.ylabel('Determination Coefficient')
-plt.xticks(fontsize=8, rotation=90)
-plt.grid(axis='y', alpha=0.75)
-plt.savefig("Shipping/DoC Bar.png")
+if __name__ == '__main__':
 
-n, bins, patches = plt.hist(x=SOG_plot, bins='auto', color='#0504aa', alpha=1.0, rwidth=0.85)
-maxfreq = n.max()
-plt.savefig("Shipping/SOG_histogram.png")
+    # M.5 train and save a new artifact version
+    if len(sys.argv) == 4 and sys.argv[1] == 'train':
+        version_dir = train_model_artifact(sys.argv[2], sys.argv[3])
+        with open(os.path.join(version_dir, ARTIFACT_FILENAME)) as artifact_file:
+            metrics = json.load(artifact_file)["metrics"]
+        print("saved %s: %d training entries, test R2 %.4f, fit %.2fs"
+              % (version_dir, metrics["n_train"], metrics["test_r2"], metrics["fit_s"]))
+        sys.exit(0)
+
+    # M.6 score a dataset with the latest artifact version
+    if len(sys.argv) == 5 and sys.argv[1] == 'score':
+        artifact = load_model_artifact(sys.argv[2])
+        score_summary = score_file(artifact, sys.argv[3], sys.argv[4])
+        print("scored %d of %d entries with %s in %.2fs, %d with features outside the training range"
+              % (score_summary["scored"], score_summary["entries"], artifact["model_version"],
+                 score_summary["time_s"], score_summary["out_of_range"]))
+        sys.exit(0)
+
+    # M.7 ensemble regressors against the single DTR
+    if len(sys.argv) == 3 and sys.argv[1] == 'ensemble':
+        training_df, testing_df = split_dataset(load_model_data(sys.argv[2]))
+        comparison = compare_ensembles(training_df, testing_df)
+        print(comparison.to_string(index=False))
+        os.makedirs(FIGURE_DIR, exist_ok=True)
+        comparison.to_csv(FIGURE_DIR + "/model_comparison.csv", index=False)
+        sys.exit(0)
+
+    # usage check
+    if len(sys.argv) != 2:
+        print("Usage: python3 model.py datasets")
+        print("       python3 model.py train datasets model_dir")
+        print("       python3 model.py score model_dir enriched.csv scored.csv")
+        print("       python3 model.py ensemble datasets")
+        sys.exit(1)
+
+    data_dir = sys.argv[1]
+    os.makedirs(FIGURE_DIR, exist_ok=True)
+
+    # M.1 load in enriched dataset and explore range of SOGs
+    full_dynamic_set = load_model_data(data_dir)
+    plot_SOG_histogram(full_dynamic_set, FIGURE_DIR + "/SOG_histogram.png")
+    print("SOG mean %.2f, max %.2f" % (full_dynamic_set[TARGET].mean(), full_dynamic_set[TARGET].max()))
+
+    # M.2 model training
+    training_df, testing_df = split_dataset(full_dynamic_set)
+    DTR = train_DTR(training_df)
+    print("DTR depth %d, leaves %d" % (DTR.get_depth(), DTR.get_n_leaves()))
+
+    # baseline prediction performance
+    baseline_predictions = DTR.predict(testing_df[MODEL_FEATURES].values)
+    print("baseline R2 %.4f" % r2_score(testing_df[TARGET].values, baseline_predictions))
+
+    # M.3 forecasting & scenarios: change in SOG to 2030 & 2050 and CO2
+    # third-power relation
+    scenario_results = project_scenarios(tree_arrays.compile_trees(DTR), testing_df, CLIMATE_SCENARIOS)
+    print(scenario_results.to_string(index=False))
+
+    # M.4 comparison of R2 coefficients
+    sweep_results = feature_sweep(training_df, testing_df)
+    print(sweep_results.to_string(index=False))
+    plot_feature_importance(sweep_results, FIGURE_DIR + "/DoC Bar.png")
@@ -0,0 +1,514 @@
+"""
+ocean_cube.py
+
+Script to convert the monthly oceanic datasets into a single dense
+memory-mapped cube. Steps include...
+
+        X.1     Collect the sorted time, latitude and longitude axes across
+                all monthly oceanic datasets.
+        X.2     Scatter each month's hs, dir and lm values into a
+                (time x lat x lon x variable) .npy cube on disk.
+        X.3     Load the cube as a read-only memory map, shareable between
+                processes.
+        X.4     Match a whole AIS dataset with the cube using index
+                arithmetic on the axes.
+        X.5     Alternatively, interpolate hs, dir and lm trilinearly between
+                the grid nodes bracketing each AIS entry in time, latitude and
+                longitude, with wave direction interpolated on the circle and
+                land or missing nodes left out of the blend.
+
+Entries beyond the cells of the cube's edge nodes, or outside its axes when
+interpolating, are left unmatched (NaN) rather than given the values at the
+edge of the cube.
+
+The conversion only needs running once per set of oceanic datasets...
+
+        python3 ocean_cube.py datasets
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+from oceanic_matching import OCEAN_PARAMETERS, nearest_axis_index
+
+
+# monthly oceanic datasets in chronological order
+OCEAN_FILENAMES = ['oc_october.csv', 'oc_november.csv', 'oc_december.csv',
+                   'oc_january.csv', 'oc_february.csv', 'oc_march.csv']
+
+# file names of the cube and its axes within the cube directory
+CUBE_FILENAME = 'ocean_cube.npy'
+AXES_FILENAME = 'ocean_axes.npz'
+
+# order of the cube axes
+CUBE_AXES = ["ts", "lat", "lon"]
+
+# oceanic parameters holding directions (degrees), interpolated on the circle
+CIRCULAR_PARAMETERS = ["dir"]
+
+# number of AIS entries interpolated at a time, bounding the memory used by
+# the eight gathered corner values of each entry
+INTERPOLATION_CHUNK_ROWS = 100000
+
+
+
+def regular_step(axis):
+    """
+    X.1 Return the spacing of a regularly spaced axis, or 0 if irregular.
+
+    Input:
+
+            axis            sorted array of unique axis values.
+
+    Output:
+
+            step            spacing between consecutive axis values.
+
+    """
+
+    if len(axis) < 2:
+        return 0.0
+
+    steps = np.diff(axis)
+
+    if np.allclose(steps, steps[0]):
+        return float(steps[0])
+
+    return 0.0
+
+
+
+def collect_axes(oc_filenames):
+    """
+    X.1 Read only the coordinate fields of each monthly dataset and combine
+    them into sorted unique axes.
+
+    Input:
+
+            oc_filenames    list of monthly oceanic dataset filenames.
+
+    Output:
+
+            axes            dictionary of sorted ts, lat and lon axes.
+
+    """
+
+    axis_values = {axis_name: [] for axis_name in CUBE_AXES}
+
+    for oc_filename in oc_filenames:
+        oc_coords = pd.read_csv(oc_filename, usecols=CUBE_AXES)
+
+        for axis_name in CUBE_AXES:
+            axis_values[axis_name].append(np.unique(oc_coords[axis_name].values))
+
+    axes = {axis_name: np.unique(np.concatenate(values)) for axis_name, values in axis_values.items()}
+
+    return axes
+
+
+
+def build_ocean_cube(oc_filenames, cube_dir):
+    """
+    X.2 Convert monthly oceanic datasets into one dense memory-mapped cube of
+    shape (time, lat, lon, variable). Grid points and times missing from the
+    datasets (e.g. land) are left as NaN. Only one month is held in memory at
+    a time.
+
+    Input:
+
+            oc_filenames    list of monthly oceanic dataset filenames.
+            cube_dir        directory to write the cube and its axes to.
+
+    Output:
+
+            ocean_cube      dictionary of the cube and its axes (see
+                            load_ocean_cube).
+
+    """
+
+    os.makedirs(cube_dir, exist_ok=True)
+    axes = collect_axes(oc_filenames)
+
+    # allocate the cube directly on disk
+    shape = tuple(len(axes[axis_name]) for axis_name in CUBE_AXES) + (len(OCEAN_PARAMETERS),)
+    cube = np.lib.format.open_memmap(os.path.join(cube_dir, CUBE_FILENAME), mode='w+', dtype=np.float32, shape=shape)
+    cube[:] = np.nan
+
+    # scatter each month into the cube, with later months overwriting repeats
+    for oc_filename in oc_filenames:
+        oc_month = pd.read_csv(oc_filename, usecols=CUBE_AXES + OCEAN_PARAMETERS)
+        cube_idx = tuple(np.searchsorted(axes[axis_name], oc_month[axis_name].values) for axis_name in CUBE_AXES)
+        cube[cube_idx] = oc_month[OCEAN_PARAMETERS].values
+
+    cube.flush()
+    del cube
+
+    # save the axes and their spacing alongside the cube
+    np.savez(os.path.join(cube_dir, AXES_FILENAME),
+             variables=np.array(OCEAN_PARAMETERS),
+             **axes,
+             **{axis_name + "_step": regular_step(axes[axis_name]) for axis_name in CUBE_AXES})
+
+    return load_ocean_cube(cube_dir)
+
+
+
+def load_ocean_cube(cube_dir, mmap_mode='r'):
+    """
+    X.3 Load the cube as a memory map together with its axes. Pages are read
+    from disk on demand and shared between processes through the OS cache.
+
+    Input:
+
+            cube_dir        directory containing the cube and its axes.
+            mmap_mode       numpy memory-map mode ('r' for read-only).
+
+    Output:
+
+            ocean_cube      dictionary of the cube, the ts, lat and lon axes,
+                            their spacing (0 if irregular) and the variable
+                            names.
+
+    """
+
+    ocean_cube = dict(np.load(os.path.join(cube_dir, AXES_FILENAME)))
+    ocean_cube["variables"] = list(ocean_cube["variables"])
+    ocean_cube["cube"] = np.load(os.path.join(cube_dir, CUBE_FILENAME), mmap_mode=mmap_mode)
+
+    return ocean_cube
+
+
+
+def save_ocean_cube(ocean_cube, cube_dir):
+    """
+    X.3 Write an in-memory cube (see cube_from_store) and its axes in the
+    layout of build_ocean_cube, to be loaded with load_ocean_cube.
+
+    Input:
+
+            ocean_cube      dictionary of the cube and its axes.
+            cube_dir        directory to write the cube and its axes to.
+
+    Output:
+
+            None
+
+    """
+
+    os.makedirs(cube_dir, exist_ok=True)
+    np.save(os.path.join(cube_dir, CUBE_FILENAME), ocean_cube["cube"])
+    np.savez(os.path.join(cube_dir, AXES_FILENAME),
+             **{axis_name: np.asarray(axis) for axis_name, axis in ocean_cube.items() if axis_name != "cube"})
+
+
+
+def cube_axis_index(ocean_cube, axis_name, values):
+    """
+    X.4 Find the index of the nearest element on a cube axis. Regularly
+    spaced axes use arithmetic on the spacing, otherwise a binary search is
+    used. Ties resolve to the lower axis value and values beyond the axis are
+    clipped to its ends (see axis_coverage).
+
+    Input:
+
+            ocean_cube      dictionary of the cube and its axes.
+            axis_name       one of ts, lat, lon.
+            values          experimental values.
+
+    Output:
+
+            index           index of the nearest axis value(s).
+
+    """
+
+    axis = ocean_cube[axis_name]
+    step = float(ocean_cube[axis_name + "_step"])
+
+    if step == 0.0:
+        return nearest_axis_index(axis, values)
+
+    index = np.ceil((np.asarray(values, dtype=np.float64) - axis[0]) / step - 0.5)
+
+    return np.clip(index, 0, len(axis) - 1).astype(np.intp)
+
+
+
+def axis_coverage(ocean_cube, axis_name, values, margin=0.0):
+    """
+    X.4 Mark the experimental values within the span of a cube axis.
+
+    Input:
+
+            ocean_cube      dictionary of the cube and its axes.
+            axis_name       one of ts, lat, lon.
+            values          experimental values.
+            margin          share of the spacing at each end of the axis
+                            still covered beyond it, e.g. 0.5 for the cells of
+                            the nearest end nodes.
+
+    Output:
+
+            inside          boolean array, True where a value is covered.
+
+    """
+
+    axis = ocean_cube[axis_name]
+    values = np.asarray(values, dtype=np.float64)
+
+    # single-valued axes only cover their element
+    if len(axis) == 1:
+        return values == axis[0]
+
+    return (values >= axis[0] - margin * (axis[1] - axis[0])) & (values <= axis[-1] + margin * (axis[-1] - axis[-2]))
+
+
+
+def match_ocean_cube(ais_df, ocean_cube, method="nearest"):
+    """
+    X.4 Match every entry of an AIS dataset with the oceanic variables at the
+    nearest time, latitude and longitude of the cube.
+
+    Inputs:
+
+            ais_df          dynamic AIS dataset with lat, lon and t fields.
+            ocean_cube      dictionary of the cube and its axes.
+            method          "nearest" to take the nearest grid node, or
+                            "linear" to interpolate between the bracketing
+                            nodes (see interpolate_ocean_cube).
+
+    Outputs:
+
+            ocean_matches   dataframe of hs, dir and lm aligned with ais_df,
+                            with NaN where the cube holds no data or the
+                            entry lies beyond the cells of its edge nodes.
+
+    """
+
+    if method == "linear":
+        return interpolate_ocean_cube(ais_df, ocean_cube)
+
+    AIS_values = [ais_df["t"].values, ais_df["lat"].values, ais_df["lon"].values]
+
+    cube_idx = tuple(cube_axis_index(ocean_cube, axis_name, values) for axis_name, values in zip(CUBE_AXES, AIS_values))
+    matched = ocean_cube["cube"][cube_idx]
+
+    # entries beyond the edge cells are left unmatched
+    inside = np.logical_and.reduce([axis_coverage(ocean_cube, axis_name, values, margin=0.5)
+                                    for axis_name, values in zip(CUBE_AXES, AIS_values)])
+    matched[~inside] = np.nan
+
+    ocean_matches = pd.DataFrame(matched, columns=ocean_cube["variables"], index=ais_df.index)
+
+    return ocean_matches
+
+
+
+def cube_from_store(ocean_store):
+    """
+    X.2 Scatter an ocean store (see oceanic_matching.build_ocean_store) into
+    an in-memory cube with the same layout as build_ocean_cube, so the cube
+    matching and interpolation also apply to the store.
+
+    Input:
+
+            ocean_store     list of monthly partitions.
+
+    Output:
+
+            ocean_cube      dictionary of the cube and its axes.
+
+    """
+
+    axes = {axis_name: np.unique(np.concatenate([month[axis_name] for month in ocean_store])) for axis_name in CUBE_AXES}
+
+    shape = tuple(len(axes[axis_name]) for axis_name in CUBE_AXES) + (len(OCEAN_PARAMETERS),)
+    cube = np.full(shape, np.nan, dtype=np.float32)
+
+    # scatter each month into the cube, with later months overwriting repeats
+    for month in ocean_store:
+        table = month["table"]
+        cube_idx = tuple(np.searchsorted(axes[axis_name], table.index.get_level_values(axis_name).values) for axis_name in CUBE_AXES)
+        cube[cube_idx] = table[OCEAN_PARAMETERS].values
+
+    ocean_cube = dict(axes, variables=list(OCEAN_PARAMETERS), cube=cube,
+                      **{axis_name + "_step": regular_step(axes[axis_name]) for axis_name in CUBE_AXES})
+
+    return ocean_cube
+
+
+
+def cube_axis_bracket(ocean_cube, axis_name, values):
+    """
+    X.5 Find the pair of axis elements bracketing each experimental value and
+    the value's fractional position between them. Values beyond the axis are
+    clamped to its ends (see axis_coverage).
+
+    Input:
+
+            ocean_cube      dictionary of the cube and its axes.
+            axis_name       one of ts, lat, lon.
+            values          experimental values.
+
+    Output:
+
+            lower           index of the bracketing axis value below.
+            weight          weight (0 to 1) of the axis value above, at
+                            index lower + 1.
+
+    """
+
+    axis = ocean_cube[axis_name]
+    step = float(ocean_cube[axis_name + "_step"])
+    values = np.asarray(values, dtype=np.float64)
+
+    # single-valued axes give every value that element
+    if len(axis) == 1:
+        return np.zeros(values.shape, dtype=np.intp), np.zeros(values.shape)
+
+    # fractional axis position, by arithmetic on regular axes
+    if step != 0.0:
+        position = (values - axis[0]) / step
+    else:
+        upper = np.clip(np.searchsorted(axis, values), 1, len(axis) - 1)
+        position = upper - 1 + (values - axis[upper - 1]) / (axis[upper] - axis[upper - 1])
+
+    position = np.clip(position, 0, len(axis) - 1)
+    lower = np.minimum(position.astype(np.intp), len(axis) - 2)
+
+    return lower, position - lower
+
+
+
+def interpolate_cube_rows(ocean_cube, AIS_lat, AIS_lon, AIS_ts, circular):
+    """
+    X.5 Interpolate the cube trilinearly at each AIS entry, blending only the
+    valid corners and renormalising their weights. Circular parameters are
+    blended as unit vectors and converted back to degrees.
+
+    Input:
+
+            ocean_cube      dictionary of the cube and its axes.
+            AIS_lat         latitudes of AIS entries.
+            AIS_lon         longitudes of AIS entries.
+            AIS_ts          timestamps of AIS entries.
+            circular        boolean array marking circular parameters.
+
+    Output:
+
+            interpolated    array of interpolated parameters, one row per
+                            entry, NaN where every corner is missing or the
+                            entry lies outside the axes.
+
+    """
+
+    brackets = [cube_axis_bracket(ocean_cube, axis_name, values)
+                for axis_name, values in zip(CUBE_AXES, [AIS_ts, AIS_lat, AIS_lon])]
+
+    # gather corners from the cube viewed as (grid node, variable), the eight
+    # corners lying at fixed offsets from the lower node (none along
+    # single-valued axes)
+    cube = ocean_cube["cube"]
+    node_values = cube.reshape(-1, cube.shape[-1])
+    node_strides = np.array([cube.shape[1] * cube.shape[2], cube.shape[2], 1]) * (np.array(cube.shape[:3]) > 1)
+    lower_node = sum(lower * node_stride for (lower, _), node_stride in zip(brackets, node_strides))
+
+    # accumulate the weighted corners in the cube's single precision, with
+    # directions as (cos, sin) pairs
+    blended = np.zeros((len(AIS_ts), len(circular)), dtype=np.float32)
+    blended_sin = np.zeros((len(AIS_ts), int(circular.sum())), dtype=np.float32)
+    total_weight = np.zeros((len(AIS_ts), len(circular)), dtype=np.float32)
+
+    for corner in np.ndindex(2, 2, 2):
+        corner_weight = np.prod([weight if offset else 1.0 - weight for (_, weight), offset in zip(brackets, corner)], axis=0)
+        corner_values = node_values.take(lower_node + int(np.dot(corner, node_strides)), axis=0)
+
+        # missing corners carry no weight
+        missing = np.isnan(corner_values)
+        weight = np.broadcast_to(corner_weight[:, None], missing.shape).astype(np.float32)
+        weight[missing] = 0.0
+        corner_values[missing] = 0.0
+
+        radians = np.radians(corner_values[:, circular])
+        corner_values[:, circular] = np.cos(radians)
+        blended += weight * corner_values
+        blended_sin += weight[:, circular] * np.sin(radians)
+        total_weight += weight
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        interpolated = (blended / total_weight).astype(np.float64)
+
+    # directions back to degrees in [0, 360)
+    direction = np.degrees(np.arctan2(blended_sin, blended[:, circular]).astype(np.float64)) % 360.0
+    interpolated[:, circular] = np.where(direction >= 360.0, 0.0, direction)
+    interpolated[total_weight == 0] = np.nan
+
+    # entries outside the axes have no bracketing nodes
+    inside = np.logical_and.reduce([axis_coverage(ocean_cube, axis_name, values)
+                                    for axis_name, values in zip(CUBE_AXES, [AIS_ts, AIS_lat, AIS_lon])])
+    interpolated[~inside] = np.nan
+
+    return interpolated
+
+
+
+def interpolate_ocean_cube(ais_df, ocean_cube, chunk_rows=INTERPOLATION_CHUNK_ROWS):
+    """
+    X.5 Match every entry of an AIS dataset with oceanic variables
+    interpolated trilinearly between the eight grid nodes bracketing it in
+    time, latitude and longitude. Wave direction is interpolated on the
+    circle (so 350 and 10 degrees blend to 0, not 180) and land or missing
+    nodes are left out, the remaining weights being renormalised.
+
+    Inputs:
+
+            ais_df          dynamic AIS dataset with lat, lon and t fields.
+            ocean_cube      dictionary of the cube and its axes (see
+                            load_ocean_cube or cube_from_store).
+            chunk_rows      number of entries interpolated at a time.
+
+    Outputs:
+
+            ocean_matches   dataframe of hs, dir and lm aligned with ais_df,
+                            with NaN where every bracketing node is missing or
+                            the entry lies outside the axes.
+
+    """
+
+    AIS_lat = ais_df["lat"].values
+    AIS_lon = ais_df["lon"].values
+    AIS_ts = ais_df["t"].values
+    circular = np.isin(ocean_cube["variables"], CIRCULAR_PARAMETERS)
+
+    interpolated = np.empty((len(ais_df), len(ocean_cube["variables"])))
+    for chunk_start in range(0, len(ais_df), chunk_rows):
+        rows = slice(chunk_start, chunk_start + chunk_rows)
+        interpolated[rows] = interpolate_cube_rows(ocean_cube, AIS_lat[rows], AIS_lon[rows], AIS_ts[rows], circular)
+
+    ocean_matches = pd.DataFrame(interpolated, columns=ocean_cube["variables"], index=ais_df.index)
+
+    return ocean_matches
+
+
+
+if __name__ == '__main__':
+
+    # usage check
+    if len(sys.argv) != 2:
+        print("Usage: python3 ocean_cube.py datasets")
+        sys.exit(1)
+
+    data_dir = sys.argv[1]
+
+    # one-time conversion of the monthly datasets into the cube
+    oc_filenames = [data_dir + '/' + oc_filename for oc_filename in OCEAN_FILENAMES]
+    ocean_cube = build_ocean_cube(oc_filenames, data_dir + '/ocean_cube')
+
+    print("ocean cube of shape %s written to %s" % (ocean_cube["cube"].shape, data_dir + '/ocean_cube'))
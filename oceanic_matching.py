@@ -4,15 +4,206 @@ oceanic_matching.py
 Script to match dynamic AIS samples with closest matching oceanic variables.
 Steps include...
 
-        X.1
+        X.1     Build a store of monthly oceanic datasets with sorted
+                coordinate axes and keyed parameter tables.
+        X.2     Find the nearest latitude, longitude and timestamp on each
+                axis of a monthly dataset.
+        X.3     Match a single AIS entry with its oceanic parameters,
+                optionally through a lookup cache keyed on the nearest grid
+                point and forecast time (see lookup_cache.py).
+        X.4     Match a whole AIS dataset with its oceanic parameters in one
+                vectorised pass.
+        X.5     Build a spatial-temporal KD-tree index over all oceanic grid
+                points, and save it as memory-mappable .npy files from which
+                other processes rebuild the tree around the shared points.
+        X.6     Match a whole AIS dataset with the true nearest oceanic grid
+                point in (lat, lon, time) using the index, leaving entries
+                more than a grid cell and time step from every point
+                unmatched.
 
 
 A full description of the research and references used can be found in README.md
 """
 
-def ocean_parameter_matching(AIS_lat, AIS_lon, AIS_ts):
+
+### Import libraries ###
+import os
+import json
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+### Import external functions ###
+import ts_by_month
+import lookup_cache
+
+
+# oceanic parameters returned by the matching functions
+OCEAN_PARAMETERS = ["hs", "dir", "lm"]
+
+# mean radius of the Earth (km) used for the haversine metric
+EARTH_RADIUS_KM = 6371.0
+
+# file names of the index points, parameters and settings within a saved
+# ocean index directory
+INDEX_POINTS_FILENAME = 'ocean_index_points.npy'
+INDEX_PARAMETERS_FILENAME = 'ocean_index_parameters.npy'
+INDEX_SETTINGS_FILENAME = 'ocean_index.json'
+
+# default weight of one hour of time difference, in distance units of each
+# metric (degrees for euclidean, kilometres for haversine)
+OCEAN_TIME_SCALES = {"euclidean": 0.1, "haversine": 10.0}
+
+
+
+def build_ocean_store(oc_months):
+    """
+    X.1 Combine the monthly oceanic datasets into a single store. Each month
+    keeps its timestamp bounds, its sorted unique latitude, longitude and
+    timestamp axes, and a parameter table keyed on (lat, lon, ts).
+
+    Input:
+
+            oc_months       list of any number of monthly oceanic datasets
+                            (e.g. oc_oct ... oc_mar).
+
+    Output:
+
+            ocean_store     list of monthly partitions, one dictionary per
+                            month, in chronological order.
+
+    """
+
+    # catalogue the months so the store is held in chronological order
+    catalogue = ts_by_month.oc_data_cleaning(oc_months)
+
+    ocean_store = []
+
+    for month_idx in catalogue["partition"].values:
+        oc_month = oc_months[month_idx]
+
+        # keep the first entry where a grid point and time is repeated
+        oc_unique = oc_month.drop_duplicates(subset=["lat", "lon", "ts"])
+
+        ocean_store.append({
+            "ts_min": oc_month["ts"].min(),
+            "ts_max": oc_month["ts"].max(),
+            "lat": np.unique(oc_month["lat"].values),
+            "lon": np.unique(oc_month["lon"].values),
+            "ts": np.unique(oc_month["ts"].values),
+            "table": oc_unique.set_index(["lat", "lon", "ts"])[OCEAN_PARAMETERS],
+        })
+
+    return ocean_store
+
+
+
+def nearest_axis_index(axis, values):
     """
-    X. Use coordinates and timestamp from an AIS entry and return closest
+    X.2 Find the index of the element of a sorted axis closest to each of the
+    experimental values. Ties resolve to the lower axis value.
+
+    Input:
+
+            axis                sorted array of unique axis values.
+            values              experimental value(s).
+
+    Output:
+
+            index               index of the closest axis value(s).
+
+    """
+
+    values = np.asarray(values)
+
+    # single-valued axes map every value to that element
+    if len(axis) == 1:
+        return np.zeros(values.shape, dtype=np.intp)
+
+    # compare the neighbours either side of the insertion point
+    index = np.clip(np.searchsorted(axis, values), 1, len(axis) - 1)
+    left = axis[index - 1]
+    right = axis[index]
+    index = index - ((values - left) <= (right - values))
+
+    return index
+
+
+
+def nearest_on_axis(axis, values):
+    """
+    X.2 Find the element of a sorted axis closest to each of the experimental
+    values.
+
+    Input:
+
+            axis                sorted array of unique axis values.
+            values              experimental value(s).
+
+    Output:
+
+            nearest_elements    axis value(s) closest to the experimental
+                                value(s).
+
+    """
+
+    return axis[nearest_axis_index(axis, values)]
+
+
+
+def ocean_catalogue(ocean_store):
+    """
+    X.2 Build the partition catalogue of the months of an ocean store (see
+    ts_by_month.partition_catalogue).
+
+    """
+
+    return ts_by_month.partition_catalogue([(month["ts_min"], month["ts_max"]) for month in ocean_store])
+
+
+
+def find_month_partition(ocean_store, AIS_ts, tolerance=None, catalogue=None):
+    """
+    X.2 Assign AIS timestamp(s) to a monthly partition of the ocean store
+    through the partition catalogue (see ts_by_month.assign_partitions).
+
+    Input:
+
+            ocean_store     list of monthly partitions.
+            AIS_ts          timestamp(s) of AIS entries.
+            tolerance       largest distance (s) outside a month's bounds
+                            still assigned to it, None for no limit.
+            catalogue       partition catalogue of the store (see
+                            ocean_catalogue), built here if None.
+
+    Output:
+
+            partition       index of the monthly partition for each entry,
+                            -1 where unassigned.
+
+    """
+
+    if catalogue is None:
+        catalogue = ocean_catalogue(ocean_store)
+
+    return ts_by_month.assign_partitions(catalogue, AIS_ts, tolerance)
+
+
+
+def ocean_axes(ocean_store):
+    """
+    X.3 Return the grid and forecast time axes of each month of an ocean
+    store (see lookup_cache.source_axes).
+
+    """
+
+    return [lookup_cache.source_axes(month["lat"], month["lon"], month["ts"]) for month in ocean_store]
+
+
+
+def ocean_parameter_matching(AIS_lat, AIS_lon, AIS_ts, ocean_store, tolerance=None, cache=None, catalogue=None):
+    """
+    X.3 Use coordinates and timestamp from an AIS entry and return closest
     matching variables.
 
     Inputs:
@@ -20,6 +211,16 @@ def ocean_parameter_matching(AIS_lat, AIS_lon, AIS_ts):
             AIS_lat        latitude of AIS entry.
             AIS_lon        longitude of AIS entry.
             AIS_ts         timestamp of AIS entry.
+            ocean_store    list of monthly partitions.
+            tolerance      largest distance (s) outside a month's bounds
+                           still matched, None for no limit.
+            cache          lookup cache shared between entries, None to
+                           search for every entry. Entries nearest the same
+                           grid point and forecast time share one search.
+            catalogue      partition catalogue of the store (see
+                           ocean_catalogue), built here if None. Pass it
+                           when matching many entries so it is built once
+                           rather than for every entry.
 
     Outputs:
 
@@ -29,131 +230,341 @@ def ocean_parameter_matching(AIS_lat, AIS_lon, AIS_ts):
 
     """
 
-    # obtain oceanic parameters at closest point and time
+    # select the month the AIS entry falls within
+    month_idx = int(find_month_partition(ocean_store, AIS_ts, tolerance, catalogue))
+    if month_idx < 0:
+        return np.nan, np.nan, np.nan
+
+    # entries nearest the same grid point and time share a cached search
+    if cache is not None:
+        key = lookup_cache.cell_key(cache, "ocean", ocean_store, ocean_axes, month_idx, AIS_lat, AIS_lon, AIS_ts)
+        return lookup_cache.cached_lookup(cache, key, ocean_parameter_matching, AIS_lat, AIS_lon, AIS_ts, ocean_store, tolerance, None, catalogue)
+
+    month = ocean_store[month_idx]
+
+    # find closest measuring point and time
+    oceanic_lat = nearest_on_axis(month["lat"], AIS_lat)
+    oceanic_lon = nearest_on_axis(month["lon"], AIS_lon)
+    oceanic_ts = nearest_on_axis(month["ts"], AIS_ts)
+
+    # obtain oceanic data from this point and time
     try:
+        ocean_t_df = month["table"].loc[(oceanic_lat, oceanic_lon, oceanic_ts)]
+        ocean_hs, ocean_dir, ocean_lm = ocean_t_df.values
+
+    # if unknown
+    except KeyError:
+        ocean_hs, ocean_dir, ocean_lm = np.nan, np.nan, np.nan
 
-        # if in October
-        if AIS_ts > month_ts_array[0] & AIS < month_ts_array[1]:
+    return ocean_hs, ocean_dir, ocean_lm
 
-            # find closest measuring point and time
-            oceanic_lat, oceanic_lon, oceanic_ts = find_nearest_ocean_element(oc_oct, AIS_lat, AIS_lon, AIS_ts)
 
-            # obtain oceanic data from this point and time
-            ocean_lat_df = oc_october_final[oc_october_final["lat"] == ocean_lat]
-            ocean_lon_df = ocean_lat_df[ocean_lat_df["lon"] == ocean_lon]
-            ocean_t_df = ocean_lon_df[ocean_lon_df["ts"] == ocean_ts]
 
+def match_ocean(ais_df, ocean_store, tolerance=None):
+    """
+    X.4 Match every entry of an AIS dataset with its closest oceanic
+    variables. Gives the same results as calling ocean_parameter_matching on
+    each row, but each month is searched once for the whole dataset.
 
-        # if in November
-        elif AIS_ts > month_ts_array[2] & AIS < month_ts_array[3]:
+    Inputs:
 
-            # find closest measuring point and time
-            oceanic_lat, oceanic_lon, oceanic_ts = find_nearest_ocean_element(oc_nov, AIS_lat, AIS_lon, AIS_ts)
+            ais_df          dynamic AIS dataset with lat, lon and t fields.
+            ocean_store     list of monthly partitions.
+            tolerance       largest distance (s) outside a month's bounds
+                            still matched, None for no limit.
 
-            # obtain oceanic data from this point and time
-            ocean_lat_df = oc_november_final[oc_october_final["lat"] == ocean_lat]
-            ocean_lon_df = ocean_lat_df[ocean_lat_df["lon"] == ocean_lon]
-            ocean_t_df = ocean_lon_df[ocean_lon_df["ts"] == ocean_ts]
+    Outputs:
 
+            ocean_matches   dataframe of hs, dir and lm aligned with ais_df,
+                            with NaN where no oceanic data exists.
 
-        # if in December
-        elif AIS_ts > month_ts_array[4] & AIS < month_ts_array[5]:
+    """
 
-            # find closest measuring point and time
-            oceanic_lat, oceanic_lon, oceanic_ts = find_nearest_ocean_element(oc_dec, AIS_lat, AIS_lon, AIS_ts)
+    AIS_lat = ais_df["lat"].values
+    AIS_lon = ais_df["lon"].values
+    AIS_ts = ais_df["t"].values
 
-            # obtain oceanic data from this point and time
-            ocean_lat_df = oc_december_final[oc_october_final["lat"] == ocean_lat]
-            ocean_lon_df = ocean_lat_df[ocean_lat_df["lon"] == ocean_lon]
-            ocean_t_df = ocean_lon_df[ocean_lon_df["ts"] == ocean_ts]
+    matched = np.full((len(ais_df), len(OCEAN_PARAMETERS)), np.nan)
+    partition = find_month_partition(ocean_store, AIS_ts, tolerance)
 
+    for month_idx, month in enumerate(ocean_store):
 
-        # if in January
-        elif AIS_ts > month_ts_array[6] & AIS < month_ts_array[7]:
+        rows = np.flatnonzero(partition == month_idx)
+        if len(rows) == 0:
+            continue
 
-            # find closest measuring point and time
-            oceanic_lat, oceanic_lon, oceanic_ts = find_nearest_ocean_element(oc_jan, AIS_lat, AIS_lon, AIS_ts)
+        # find closest measuring points and times on each axis at once
+        keys = pd.MultiIndex.from_arrays([
+            nearest_on_axis(month["lat"], AIS_lat[rows]),
+            nearest_on_axis(month["lon"], AIS_lon[rows]),
+            nearest_on_axis(month["ts"], AIS_ts[rows]),
+        ])
 
-            # obtain oceanic data from this point and time
-            ocean_lat_df = oc_january_final[oc_october_final["lat"] == ocean_lat]
-            ocean_lon_df = ocean_lat_df[ocean_lat_df["lon"] == ocean_lon]
-            ocean_t_df = ocean_lon_df[ocean_lon_df["ts"] == ocean_ts]
+        # keyed lookup of the oceanic parameters, missing points become NaN
+        matched[rows] = month["table"].reindex(keys).values
 
+    ocean_matches = pd.DataFrame(matched, columns=OCEAN_PARAMETERS, index=ais_df.index)
 
-        # if in February
-        elif AIS_ts > month_ts_array[8] & AIS < month_ts_array[9]:
+    return ocean_matches
 
-            # find closest measuring point and time
-            oceanic_lat, oceanic_lon, oceanic_ts = find_nearest_ocean_element(oc_feb, AIS_lat, AIS_lon, AIS_ts)
 
-            # obtain oceanic data from this point and time
-            ocean_lat_df = oc_february_final[oc_october_final["lat"] == ocean_lat]
-            ocean_lon_df = ocean_lat_df[ocean_lat_df["lon"] == ocean_lon]
-            ocean_t_df = ocean_lon_df[ocean_lon_df["ts"] == ocean_ts]
 
+def index_coordinates(lat, lon, ts, time_scale, metric):
+    """
+    X.5 Convert coordinates and timestamps into the points of the ocean
+    index. The euclidean metric uses (lat, lon) in degrees directly, whereas
+    the haversine metric places points on a sphere of the Earth's radius so
+    that straight-line (chord) distances order points exactly as great-circle
+    distances do.
 
-        # if in March
-        else:
+    Input:
 
-            # find closest measuring point and time
-            oceanic_lat, oceanic_lon, oceanic_ts = find_nearest_ocean_element(oc_mar, AIS_lat, AIS_lon, AIS_ts)
+            lat             latitude(s) in degrees.
+            lon             longitude(s) in degrees.
+            ts              timestamp(s) in seconds.
+            time_scale      distance units equivalent to one hour.
+            metric          "euclidean" or "haversine".
 
-            # obtain oceanic data from this point and time
-            ocean_lat_df = oc_march_final[oc_october_final["lat"] == ocean_lat]
-            ocean_lon_df = ocean_lat_df[ocean_lat_df["lon"] == ocean_lon]
-            ocean_t_df = ocean_lon_df[ocean_lon_df["ts"] == ocean_ts]
+    Output:
 
+            points          array of index points, one row per entry.
 
-        # obtain significant height (hs), mean direction (dir) and mean
-        # wave length (lm) from that data point
-        ocean_hs[row] = ocean_t_df["hs"].values[0]
-        ocean_dir[row] = ocean_t_df["dir"].values[0]
-        ocean_lm[row] = ocean_t_df["lm"].values[0]
+    """
 
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    scaled_ts = np.asarray(ts, dtype=np.float64) * (time_scale / 3600.0)
 
-    # if unknown
-    except:
+    if metric == "euclidean":
+        return np.column_stack([lat, lon, scaled_ts])
 
-        ocean_hs[row] = None
-        ocean_dir[row] = None
-        ocean_lm[row] = None
+    elif metric == "haversine":
+        lat_rad, lon_rad = np.radians(lat), np.radians(lon)
+        return np.column_stack([
+            EARTH_RADIUS_KM * np.cos(lat_rad) * np.cos(lon_rad),
+            EARTH_RADIUS_KM * np.cos(lat_rad) * np.sin(lon_rad),
+            EARTH_RADIUS_KM * np.sin(lat_rad),
+            scaled_ts,
+        ])
 
-    return ocean_hs, ocean_dir, ocean_lm
+    else:
+        raise ValueError("metric must be 'euclidean' or 'haversine', got %r" % metric)
 
 
 
+def index_max_distance(ocean_store, time_scale, metric):
+    """
+    X.5 Find the distance spanned by one grid cell and one forecast time step
+    of the store, in index units: the largest step between consecutive values
+    of each axis, combined over the three axes. Entries farther than this from
+    every grid point lie outside the hindcast domain or its time span.
 
+    Input:
 
-"""
-###############################
-### FUTURE IMPROVED VERSION ###
-###############################
+            ocean_store     list of monthly partitions.
+            time_scale      distance units equivalent to one hour.
+            metric          "euclidean" or "haversine".
+
+    Output:
+
+            max_distance    distance of one grid cell and time step.
+
+    """
+
+    # largest step of each axis over the months, 0 for single-valued axes
+    lat_step, lon_step, ts_step = [max([np.diff(month[axis]).max(initial=0) for month in ocean_store], default=0)
+                                   for axis in ["lat", "lon", "ts"]]
+
+    # degrees for euclidean, kilometres along a meridian (or the equator) for haversine
+    if metric == "haversine":
+        lat_step, lon_step = EARTH_RADIUS_KM * np.radians(lat_step), EARTH_RADIUS_KM * np.radians(lon_step)
+
+    max_distance = float(np.sqrt(lat_step ** 2 + lon_step ** 2 + (ts_step * time_scale / 3600.0) ** 2))
+
+    return max_distance
 
-def find_nearest_ocean_element(oc_data_month, AIS_lat, AIS_lon, AIS_ts):
 
-    Find elements in dataset of oceanic variables closest to experimental values
-    and return them.
+
+def build_ocean_index(ocean_store, time_scale=None, metric="euclidean", max_distance=None):
+    """
+    X.5 Build a KD-tree over every oceanic grid point and time in the store,
+    to be built once per run and queried for whole AIS datasets.
 
     Input:
 
-            oc_data_month
-            AIS_lat
-            AIS_lon
-            AIS_ts
+            ocean_store     list of monthly partitions.
+            time_scale      distance units equivalent to one hour, defaults
+                            to OCEAN_TIME_SCALES[metric].
+            metric          "euclidean" on (lat, lon) degrees or "haversine"
+                            for great-circle distance in kilometres.
+            max_distance    largest distance in index units at which entries
+                            are matched, defaults to one grid cell and time
+                            step (see index_max_distance).
 
     Output:
 
-            oceanic_lat
-            oceanic_lon
-            oceanic_ts
+            ocean_index     dictionary of the KD-tree, its settings and the
+                            oceanic parameters of each indexed point.
+
+    """
 
+    if time_scale is None:
+        time_scale = OCEAN_TIME_SCALES[metric]
 
+    if max_distance is None:
+        max_distance = index_max_distance(ocean_store, time_scale, metric)
 
-    # find nearest elements in oceanic datasets
-    oceanic_lat = find_nearest_element(oc_data_month["lat"].values, AIS_lat)
-    oceanic_lon = find_nearest_element(oc_data_month["lon"].values, AIS_lon)
-    oceanic_ts  = find_nearest_element(oc_data_month["ts"].values, AIS_ts)
+    # flatten every month into one table of grid points in time order, so
+    # that the points of a time window are contiguous (see load_ocean_index)
+    oc_table = pd.concat([month["table"] for month in ocean_store]).reset_index().sort_values("ts", kind="stable")
 
-    return oceanic_lat, oceanic_lon, oceanic_ts
+    points = index_coordinates(oc_table["lat"].values, oc_table["lon"].values, oc_table["ts"].values, time_scale, metric)
 
-"""
+    ocean_index = {
+        "tree": cKDTree(points),
+        "time_scale": time_scale,
+        "metric": metric,
+        "max_distance": max_distance,
+        "parameters": oc_table[OCEAN_PARAMETERS].values,
+    }
+
+    return ocean_index
+
+
+
+def save_ocean_index(ocean_index, index_dir):
+    """
+    X.5 Write the points and parameters of an ocean index as .npy files and
+    its settings as JSON, to be loaded with load_ocean_index.
+
+    Input:
+
+            ocean_index     ocean KD-tree index.
+            index_dir       directory to write the index to.
+
+    Output:
+
+            None
+
+    """
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, INDEX_POINTS_FILENAME), ocean_index["tree"].data)
+    np.save(os.path.join(index_dir, INDEX_PARAMETERS_FILENAME), ocean_index["parameters"])
+
+    with open(os.path.join(index_dir, INDEX_SETTINGS_FILENAME), 'w') as settings_file:
+        json.dump({setting: ocean_index[setting] for setting in ["time_scale", "metric", "max_distance"]}, settings_file)
+
+
+
+def load_ocean_index(index_dir, mmap_mode='r', ts_range=None):
+    """
+    X.5 Load an ocean index written by save_ocean_index, memory-mapping its
+    points and parameters and rebuilding the KD-tree around the mapped points
+    (which the tree uses without copying). Pages are read from disk on demand
+    and shared between processes through the OS cache, only the tree's nodes
+    being built in each process.
+
+    Given the time range of the entries to match, only the points within the
+    index's max_distance of it in time are mapped and indexed, as no other
+    point can be matched. Since the points are stored in time order these are
+    a contiguous slice, so the cost of loading follows the time span matched
+    (e.g. of a daily batch) rather than the size of the index.
+
+    Input:
+
+            index_dir       directory of the saved index.
+            mmap_mode       numpy memory-map mode ('r' for read-only), None
+                            to read the arrays into memory.
+            ts_range        (earliest, latest) timestamps of the entries to
+                            match, None to index every point.
+
+    Output:
+
+            ocean_index     ocean KD-tree index, with the mapped points.
+
+    """
+
+    with open(os.path.join(index_dir, INDEX_SETTINGS_FILENAME)) as settings_file:
+        ocean_index = json.load(settings_file)
+
+    points = np.load(os.path.join(index_dir, INDEX_POINTS_FILENAME), mmap_mode=mmap_mode)
+    parameters = np.load(os.path.join(index_dir, INDEX_PARAMETERS_FILENAME), mmap_mode=mmap_mode)
+
+    # points beyond max_distance in (scaled) time cannot be matched
+    rows = slice(None)
+    if ts_range is not None and np.isfinite(ocean_index["max_distance"]):
+        scaled_range = np.asarray(ts_range, dtype=np.float64) * (ocean_index["time_scale"] / 3600.0)
+        rows = slice(np.searchsorted(points[:, -1], scaled_range[0] - ocean_index["max_distance"], side='left'),
+                     np.searchsorted(points[:, -1], scaled_range[1] + ocean_index["max_distance"], side='right'))
+
+    ocean_index["points"] = points[rows]
+    ocean_index["parameters"] = parameters[rows]
+    ocean_index["tree"] = cKDTree(ocean_index["points"])
+
+    return ocean_index
+
+
+
+def query_ocean_index(ocean_index, AIS_lat, AIS_lon, AIS_ts, k=1, max_distance=None):
+    """
+    X.6 Find the k nearest oceanic grid points for a batch of AIS entries.
+
+    Input:
+
+            ocean_index     ocean KD-tree index.
+            AIS_lat         latitude(s) of AIS entries.
+            AIS_lon         longitude(s) of AIS entries.
+            AIS_ts          timestamp(s) of AIS entries.
+            k               number of neighbours per entry.
+            max_distance    largest accepted distance in index units,
+                            defaults to the index's own.
+
+    Output:
+
+            distances       distance to each neighbour (inf if none found).
+            point_idx       row of each neighbour in the index (equal to the
+                            number of indexed points if none found).
+
+    """
+
+    if max_distance is None:
+        max_distance = ocean_index["max_distance"]
+
+    points = index_coordinates(AIS_lat, AIS_lon, AIS_ts, ocean_index["time_scale"], ocean_index["metric"])
+    distances, point_idx = ocean_index["tree"].query(points, k=k, distance_upper_bound=max_distance)
+
+    return distances, point_idx
+
+
+
+def match_ocean_index(ais_df, ocean_index, max_distance=None):
+    """
+    X.6 Match every entry of an AIS dataset with the oceanic variables of the
+    nearest existing grid point in (lat, lon, time).
+
+    Inputs:
+
+            ais_df          dynamic AIS dataset with lat, lon and t fields.
+            ocean_index     ocean KD-tree index.
+            max_distance    largest accepted distance in index units, beyond
+                            which no match is made, defaults to the index's
+                            own (one grid cell and time step).
+
+    Outputs:
+
+            ocean_matches   dataframe of hs, dir and lm aligned with ais_df,
+                            with NaN where no grid point is close enough.
+
+    """
+
+    distances, point_idx = query_ocean_index(ocean_index, ais_df["lat"].values, ais_df["lon"].values, ais_df["t"].values, max_distance=max_distance)
+
+    # unmatched queries point one past the end of the parameter array
+    found = np.isfinite(distances)
+    matched = np.full((len(ais_df), len(OCEAN_PARAMETERS)), np.nan)
+    matched[found] = ocean_index["parameters"][point_idx[found]]
+
+    ocean_matches = pd.DataFrame(matched, columns=OCEAN_PARAMETERS, index=ais_df.index)
+
+    return ocean_matches
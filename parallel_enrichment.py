@@ -0,0 +1,392 @@
+"""
+parallel_enrichment.py
+
+Script to enrich AIS data with oceanic and weather parameters in parallel.
+Steps include...
+
+        P.1     Write the references to disk as memory-mappable .npy files:
+                the weather tables as columns and the ocean reference used by
+                __main__.py (the points and parameters of the KD-tree index,
+                or the cube when interpolating).
+        P.2     Split the AIS dataset into (vessel, month) shards.
+        P.3     Match each shard against the shared references in a pool of
+                worker processes, each of which maps the references once
+                rather than receiving them with every shard, using the same
+                oceanic and weather matchers as the serial pipeline. The
+                mapped arrays are shared between workers through the OS page
+                cache; only the KD-trees' nodes are built in each worker.
+        P.4     Reassemble the matches in the original row order.
+
+Since every matcher treats entries independently, the parallel enrichment
+equals the serial one (see combine_matches) whatever the worker count.
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from scipy.spatial import cKDTree
+
+### Import external functions ###
+import data_cache
+import ocean_cube
+import oceanic_matching
+import weather_matching
+
+
+# references loaded once in each worker process
+WORKER_REFERENCES = {}
+
+# fields added to the AIS dataset by the enrichment
+ENRICHMENT_FIELDS = ["ocean_hs", "ocean_dir", "ocean_lm",
+                     "weather_wind_ID", "weather_Ff", "weather_P", "weather_T"]
+
+
+
+def write_weather_reference(station_index, reference_dir):
+    """
+    P.1 Write the station coordinates, time-sorted observations and wind
+    direction bearings of a station index to disk as columnar .npy files.
+
+    Input:
+
+            station_index       weather station index (see
+                                weather_matching.build_station_index).
+            reference_dir       directory to write the reference to.
+
+    Output:
+
+            None
+
+    """
+
+    stations = pd.DataFrame({"latitude": station_index["latitude"], "longitude": station_index["longitude"]})
+
+    # replace any previous reference
+    shutil.rmtree(reference_dir, ignore_errors=True)
+
+    data_cache.write_table(stations, os.path.join(reference_dir, 'stations'))
+    data_cache.write_table(station_index["observations"], os.path.join(reference_dir, 'observations'))
+    data_cache.write_table(pd.DataFrame({"bearing": station_index["wind_bearings"]}), os.path.join(reference_dir, 'wind_bearings'))
+
+
+
+def load_weather_reference(reference_dir):
+    """
+    P.1 Memory-map a weather reference written by write_weather_reference and
+    rebuild the station KD-tree (small) around it.
+
+    Input:
+
+            reference_dir       directory of the weather reference.
+
+    Output:
+
+            station_index       weather station index.
+
+    """
+
+    stations = data_cache.read_table(os.path.join(reference_dir, 'stations'))
+
+    station_index = {
+        "tree": cKDTree(weather_matching.station_points(stations["latitude"].values, stations["longitude"].values)),
+        "latitude": stations["latitude"].values,
+        "longitude": stations["longitude"].values,
+        "observations": data_cache.read_table(os.path.join(reference_dir, 'observations'), mmap_mode='r'),
+        "wind_bearings": data_cache.read_table(os.path.join(reference_dir, 'wind_bearings'))["bearing"].values,
+    }
+
+    return station_index
+
+
+
+def write_ocean_reference(ocean_reference, ocean_dir, ocean_method="nearest"):
+    """
+    P.1 Write the ocean reference matched against as memory-mappable .npy
+    files: the points and parameters of the KD-tree index (see
+    oceanic_matching.save_ocean_index), or for interpolation the cube (see
+    ocean_cube.save_ocean_cube).
+
+    Input:
+
+            ocean_reference     ocean KD-tree index or cube.
+            ocean_dir           directory to write the reference to.
+            ocean_method        "nearest" or "linear", as in __main__.py.
+
+    Output:
+
+            None
+
+    """
+
+    # replace any previous reference
+    shutil.rmtree(ocean_dir, ignore_errors=True)
+
+    if ocean_method == "linear":
+        ocean_cube.save_ocean_cube(ocean_reference, ocean_dir)
+    else:
+        oceanic_matching.save_ocean_index(ocean_reference, ocean_dir)
+
+
+
+def load_ocean_reference(ocean_dir, ocean_method="nearest", ts_range=None):
+    """
+    P.1 Memory-map an ocean reference written by write_ocean_reference,
+    rebuilding the KD-tree around the mapped points of an index (only those
+    that can be matched within ts_range, see
+    oceanic_matching.load_ocean_index).
+
+    Input:
+
+            ocean_dir           directory of the ocean reference.
+            ocean_method        "nearest" or "linear", as in __main__.py.
+            ts_range            (earliest, latest) timestamps of the entries
+                                to match, None for any.
+
+    Output:
+
+            ocean_reference     memory-mapped ocean KD-tree index or cube.
+
+    """
+
+    if ocean_method == "linear":
+        return ocean_cube.load_ocean_cube(ocean_dir)
+
+    return oceanic_matching.load_ocean_index(ocean_dir, ts_range=ts_range)
+
+
+
+def match_ocean_reference(ais_df, ocean_reference, ocean_method="nearest"):
+    """
+    P.3 Match oceanic parameters as __main__.py does: the nearest grid point
+    through the KD-tree index, or trilinear interpolation in the cube.
+
+    """
+
+    if ocean_method == "linear":
+        return ocean_cube.interpolate_ocean_cube(ais_df, ocean_reference)
+
+    return oceanic_matching.match_ocean_index(ais_df, ocean_reference)
+
+
+
+def match_weather_reference(ais_df, station_index, weather_method="nearest", interpolate=False, tolerance=3 * 3600):
+    """
+    P.3 Match weather parameters as __main__.py does: the nearest station or
+    an inverse distance blend of the nearest stations, optionally
+    interpolated in time.
+
+    """
+
+    if weather_method == "idw":
+        return weather_matching.match_weather_idw(ais_df, station_index, tolerance=tolerance, interpolate=interpolate)
+
+    return weather_matching.match_weather(ais_df, station_index, tolerance, interpolate=interpolate)
+
+
+
+def combine_matches(ocean_matches, weather_matches):
+    """
+    P.4 Combine oceanic and weather matches into the enrichment fields.
+
+    Input:
+
+            ocean_matches       dataframe of hs, dir and lm.
+            weather_matches     dataframe of id_windDirection, Ff, P and T.
+
+    Output:
+
+            enrichment          dataframe of the enrichment fields, aligned
+                                with the matches.
+
+    """
+
+    matched = np.column_stack([ocean_matches[oceanic_matching.OCEAN_PARAMETERS].values.astype(np.float64),
+                               weather_matches[weather_matching.WEATHER_PARAMETERS].values.astype(np.float64)])
+
+    enrichment = pd.DataFrame(matched, columns=ENRICHMENT_FIELDS, index=ocean_matches.index)
+
+    return enrichment
+
+
+
+def shard_ais(ais_df):
+    """
+    P.2 Split an AIS dataset into (vessel, month) shards.
+
+    Input:
+
+            ais_df              dynamic AIS dataset with sourcemmsi and t
+                                fields.
+
+    Output:
+
+            shards              list of arrays of row positions, one per
+                                shard, ordered by vessel then month.
+
+    """
+
+    month = ais_df["t"].values.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    vessel = ais_df["sourcemmsi"].values
+
+    # stable sort keeps rows within a shard in their original order
+    order = np.lexsort((month, vessel))
+    shard_key = np.column_stack([vessel[order].astype(np.int64), month[order]])
+    shard_start = np.flatnonzero(np.r_[True, (shard_key[1:] != shard_key[:-1]).any(axis=1)])
+
+    shards = np.split(order, shard_start[1:])
+
+    return shards
+
+
+
+def init_worker(ocean_dir, reference_dir, ocean_method="nearest", ts_range=None):
+    """
+    P.3 Map the shared references once in a worker process.
+
+    Input:
+
+            ocean_dir           directory of the ocean reference.
+            reference_dir       directory of the weather reference.
+            ocean_method        "nearest" or "linear", as in __main__.py.
+            ts_range            (earliest, latest) timestamps of the entries
+                                to match, None for any.
+
+    Output:
+
+            None
+
+    """
+
+    WORKER_REFERENCES["ocean"] = load_ocean_reference(ocean_dir, ocean_method, ts_range)
+    WORKER_REFERENCES["station_index"] = load_weather_reference(reference_dir)
+
+
+
+def enrich_shard(shard_task):
+    """
+    P.3 Match one shard of AIS entries against the worker's references.
+
+    Input:
+
+            shard_task          tuple of the shard's AIS lat, lon and t
+                                arrays and a dictionary of the matching
+                                settings.
+
+    Output:
+
+            shard_matches       array of matched fields, one row per entry.
+
+    """
+
+    AIS_lat, AIS_lon, AIS_ts, settings = shard_task
+    shard_df = pd.DataFrame({"lat": AIS_lat, "lon": AIS_lon, "t": AIS_ts})
+
+    ocean_matches = match_ocean_reference(shard_df, WORKER_REFERENCES["ocean"], settings["ocean_method"])
+    weather_matches = match_weather_reference(shard_df, WORKER_REFERENCES["station_index"], settings["weather_method"],
+                                              settings["interpolate"], settings["tolerance"])
+
+    shard_matches = combine_matches(ocean_matches, weather_matches).values
+
+    return shard_matches
+
+
+
+def enrich_parallel(ais_df, ocean_dir, reference_dir, n_workers=None, tolerance=3 * 3600,
+                    ocean_method="nearest", weather_method="nearest", interpolate=False):
+    """
+    P.4 Enrich an AIS dataset with oceanic and weather parameters, matching
+    its (vessel, month) shards in a pool of worker processes. Results are
+    returned in the original row order whatever the worker count.
+
+    Input:
+
+            ais_df              dynamic AIS dataset with sourcemmsi, lat, lon
+                                and t fields.
+            ocean_dir           directory of the ocean reference.
+            reference_dir       directory of the weather reference.
+            n_workers           number of worker processes, defaults to the
+                                number of CPUs; 1 runs in this process.
+            tolerance           largest time difference (s) between an AIS
+                                entry and a joined weather observation.
+            ocean_method        "nearest" or "linear", as in __main__.py.
+            weather_method      "nearest" or "idw", as in __main__.py.
+            interpolate         interpolate weather observations in time.
+
+    Output:
+
+            enrichment          dataframe of the enrichment fields aligned
+                                with ais_df.
+
+    """
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    settings = {"tolerance": tolerance, "ocean_method": ocean_method, "weather_method": weather_method, "interpolate": interpolate}
+
+    shards = shard_ais(ais_df)
+    AIS_lat, AIS_lon, AIS_ts = ais_df["lat"].values, ais_df["lon"].values, ais_df["t"].values
+    shard_tasks = [(AIS_lat[rows], AIS_lon[rows], AIS_ts[rows], settings) for rows in shards]
+
+    # workers only index the ocean points the dataset's time span can match
+    ts_range = (AIS_ts.min(), AIS_ts.max()) if len(ais_df) else None
+
+    if n_workers == 1:
+        init_worker(ocean_dir, reference_dir, ocean_method, ts_range)
+        shard_results = [enrich_shard(shard_task) for shard_task in shard_tasks]
+
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker, initargs=(ocean_dir, reference_dir, ocean_method, ts_range)) as pool:
+            shard_results = list(pool.map(enrich_shard, shard_tasks, chunksize=max(1, len(shard_tasks) // (4 * n_workers))))
+
+    # place each shard's matches back at its original rows
+    matched = np.full((len(ais_df), len(ENRICHMENT_FIELDS)), np.nan)
+    for rows, shard_matches in zip(shards, shard_results):
+        matched[rows] = shard_matches
+
+    enrichment = pd.DataFrame(matched, columns=ENRICHMENT_FIELDS, index=ais_df.index)
+
+    return enrichment
+
+
+
+def enrich_with_references(ais_df, ocean_reference, station_index, work_dir, n_workers=None,
+                           ocean_method="nearest", weather_method="nearest", interpolate=False):
+    """
+    Compilation function writing the references built by the serial pipeline
+    to disk and enriching an AIS dataset against them in parallel.
+
+    Input:
+
+            ais_df              dynamic AIS dataset with sourcemmsi, lat, lon
+                                and t fields.
+            ocean_reference     ocean KD-tree index, or cube for "linear".
+            station_index       weather station index.
+            work_dir            directory to write the references to.
+            n_workers           number of worker processes.
+            ocean_method        "nearest" or "linear", as in __main__.py.
+            weather_method      "nearest" or "idw", as in __main__.py.
+            interpolate         interpolate weather observations in time.
+
+    Output:
+
+            enrichment          dataframe of the enrichment fields aligned
+                                with ais_df.
+
+    """
+
+    ocean_dir, reference_dir = os.path.join(work_dir, 'ocean_reference'), os.path.join(work_dir, 'weather_reference')
+    write_ocean_reference(ocean_reference, ocean_dir, ocean_method)
+    write_weather_reference(station_index, reference_dir)
+
+    enrichment = enrich_parallel(ais_df, ocean_dir, reference_dir, n_workers,
+                                 ocean_method=ocean_method, weather_method=weather_method, interpolate=interpolate)
+
+    return enrichment
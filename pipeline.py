@@ -0,0 +1,255 @@
+"""
+pipeline.py
+
+Small runner to checkpoint pipeline stages and skip those whose inputs have
+not changed. Steps include...
+
+        R.1     Key every stage input: outputs of earlier stages by their
+                stage key, files by their fingerprint, dataframes and arrays
+                by their content and anything else by its repr.
+        R.2     Key a stage by its name, the source of its function's module
+                and of the modules it depends on, its inputs and its
+                parameters.
+        R.3     Load the stage output from a checkpoint with the same key, or
+                run the stage and checkpoint its output (removing the stage's
+                older checkpoints), recording the stage if profiling is on
+                (see profiling.py).
+
+Since a stage's key includes the keys of its inputs, changing a parameter
+(e.g. the SOG threshold) re-runs that stage and every stage downstream of it
+while unrelated stages (e.g. oceanic parsing) are loaded from checkpoints.
+Whole module sources are keyed, so editing any function or constant (e.g.
+DYNAMIC_FIELDS) of a module a stage depends on also re-runs it. Modules called
+from other modules than the stage function's own are listed in depends_on.
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import os
+import pickle
+import hashlib
+import inspect
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+import data_cache
+import profiling
+
+
+
+def new_runner(checkpoint_dir, enabled=True):
+    """
+    R.3 Create a pipeline runner.
+
+    Input:
+
+            checkpoint_dir      directory of stage checkpoints.
+            enabled             False to run every stage without
+                                checkpointing.
+
+    Output:
+
+            runner              dictionary of the runner's settings, the keys
+                                of stage outputs and the stages executed and
+                                skipped.
+
+    """
+
+    runner = {
+        "checkpoint_dir": checkpoint_dir,
+        "enabled": enabled,
+        "keys": {},
+        "outputs": [],
+        "executed": [],
+        "skipped": [],
+    }
+
+    return runner
+
+
+
+def value_key(runner, value):
+    """
+    R.1 Key a stage input.
+
+    Input:
+
+            runner              pipeline runner.
+            value               stage input.
+
+    Output:
+
+            key                 string identifying the input's content.
+
+    """
+
+    # outputs of earlier stages
+    if id(value) in runner["keys"]:
+        return runner["keys"][id(value)]
+
+    if isinstance(value, str) and os.path.isfile(value):
+        return "file:" + data_cache.file_fingerprint(value)
+
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        content = hashlib.sha1(pd.util.hash_pandas_object(value).values.tobytes())
+        content.update(repr(list(value.columns) if isinstance(value, pd.DataFrame) else value.name).encode())
+        return "frame:" + content.hexdigest()
+
+    if isinstance(value, np.ndarray):
+        return "array:" + hashlib.sha1(np.ascontiguousarray(value).tobytes() + str(value.dtype).encode()).hexdigest()
+
+    if isinstance(value, (list, tuple)):
+        return "(" + ",".join(value_key(runner, item) for item in value) + ")"
+
+    if isinstance(value, dict):
+        return "{" + ",".join(repr(item_name) + ":" + value_key(runner, item) for item_name, item in sorted(value.items(), key=repr)) + "}"
+
+    return repr(value)
+
+
+
+def source_key(code):
+    """
+    R.2 Return the source of a module or function, or its name when the
+    source is unavailable (e.g. compiled extensions).
+
+    Input:
+
+            code                module or function.
+
+    Output:
+
+            source              source text or qualified name.
+
+    """
+
+    try:
+        return inspect.getsource(code)
+    except (OSError, TypeError):
+        return getattr(code, "__module__", "") + "." + getattr(code, "__qualname__", code.__name__)
+
+
+
+def stage_key(runner, name, function, args, params, depends_on=()):
+    """
+    R.2 Key a stage by its name, the source of its function's module and of
+    the modules it depends on, its inputs and parameters.
+
+    Input:
+
+            runner              pipeline runner.
+            name                stage name.
+            function            stage function.
+            args                positional stage inputs.
+            params              keyword stage parameters.
+            depends_on          further modules (or functions) whose source
+                                the stage depends on.
+
+    Output:
+
+            key                 hexadecimal stage key.
+
+    """
+
+    function_module = inspect.getmodule(function)
+
+    key = hashlib.sha1()
+    key.update(name.encode())
+    key.update(source_key(function).encode())
+    for code in ([function_module] if function_module is not None else []) + list(depends_on):
+        key.update(source_key(code).encode())
+    key.update(value_key(runner, list(args)).encode())
+    key.update(value_key(runner, params).encode())
+
+    return key.hexdigest()[:16]
+
+
+
+def checkpoint_name(name):
+    """
+    R.3 Return the stage name used in its checkpoint file names, followed by
+    '-' and the stage key.
+
+    """
+
+    return name.replace(" ", "_")
+
+
+
+def run_stage(runner, name, function, *args, files=(), untracked=None, checkpoint=True, depends_on=(), **params):
+    """
+    R.3 Run a stage, or load its output if a checkpoint with the same key
+    exists. Stages that are not checkpointed (e.g. loads of inputs already
+    cached by data_cache) always run, their outputs still being keyed for
+    downstream stages.
+
+    Input:
+
+            runner              pipeline runner.
+            name                stage name.
+            function            stage function.
+            args                positional stage inputs.
+            files               files read by the stage that are not among
+                                its inputs, keyed by fingerprint.
+            untracked           dictionary of keyword arguments passed to the
+                                function but not keyed (e.g. reports).
+            checkpoint          False to run the stage without checkpointing
+                                its output.
+            depends_on          further modules (or functions) whose source
+                                is keyed, e.g. those called by the stage
+                                function's module.
+            params              keyword stage parameters.
+
+    Output:
+
+            output              stage output.
+
+    """
+
+    key = stage_key(runner, name, function, list(args) + [list(files)], params, depends_on)
+    checkpoint_filename = os.path.join(runner["checkpoint_dir"], "%s-%s.pkl" % (checkpoint_name(name), key))
+
+    stage_record = profiling.start_stage(name, args)
+    checkpoint = checkpoint and runner["enabled"]
+    checkpoint_hit = checkpoint and os.path.exists(checkpoint_filename)
+
+    if checkpoint_hit:
+        with open(checkpoint_filename, 'rb') as checkpoint_file:
+            output = pickle.load(checkpoint_file)
+        runner["skipped"].append(name)
+
+    else:
+        output = function(*args, **params, **(untracked or {}))
+        runner["executed"].append(name)
+
+        if checkpoint:
+            os.makedirs(runner["checkpoint_dir"], exist_ok=True)
+
+            # write to a temporary file first so partial checkpoints are never read
+            temp_filename = checkpoint_filename + '.tmp%d' % os.getpid()
+            with open(temp_filename, 'wb') as checkpoint_file:
+                pickle.dump(output, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_filename, checkpoint_filename)
+
+            # remove the stage's older checkpoints, leaving other processes'
+            # temporary files alone
+            for checkpoint_entry in os.listdir(runner["checkpoint_dir"]):
+                if (checkpoint_entry.endswith(".pkl") and checkpoint_entry.rsplit("-", 1)[0] == checkpoint_name(name)
+                        and checkpoint_entry != os.path.basename(checkpoint_filename)):
+                    os.remove(os.path.join(runner["checkpoint_dir"], checkpoint_entry))
+
+    profiling.finish_stage(stage_record, output, checkpoint_hit)
+
+    # key the output (and the items of tuple outputs) for downstream stages,
+    # keeping references so their ids are not reused
+    runner["keys"][id(output)] = key
+    runner["outputs"].append(output)
+    if isinstance(output, tuple):
+        for item_idx, item in enumerate(output):
+            runner["keys"][id(item)] = "%s:%d" % (key, item_idx)
+
+    return output
@@ -0,0 +1,269 @@
+"""
+profiling.py
+
+Optional per-stage instrumentation of the pipeline. Steps include...
+
+        I.1     Switch profiling on or off at runtime, either directly or from
+                the MARITIME_PROFILE (JSON report) and MARITIME_CPROFILE
+                (cProfile dump) environment variables.
+        I.2     Record the wall time, CPU time, rows in and out, change in
+                resident memory and cache hits of each stage, along with the
+                peak resident memory of the process so far.
+        I.3     Write the records to a JSON report and the cProfile statistics
+                of the slowest stage to a dump readable with pstats/snakeviz.
+
+When profiling is off each stage costs a single dictionary lookup.
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import os
+import json
+import time
+import cProfile
+import resource
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+import data_cache
+
+
+# profiling settings and the records of each profiled stage
+PROFILING = {
+    "enabled": False,
+    "report_filename": None,
+    "cprofile_filename": None,
+    "stages": [],
+    "hottest_profile": None,
+    "hottest_wall_s": -1.0,
+}
+
+
+
+def enable_profiling(report_filename=None, cprofile_filename=None):
+    """
+    I.1 Switch profiling on, clearing any earlier records.
+
+    Input:
+
+            report_filename     JSON report written by write_report, or None.
+            cprofile_filename   cProfile dump of the slowest stage, or None
+                                to skip cProfile.
+
+    Output:
+
+            None
+
+    """
+
+    PROFILING.update({
+        "enabled": True,
+        "report_filename": report_filename,
+        "cprofile_filename": cprofile_filename,
+        "stages": [],
+        "hottest_profile": None,
+        "hottest_wall_s": -1.0,
+    })
+
+
+
+def disable_profiling():
+    """
+    I.1 Switch profiling off.
+
+    """
+
+    PROFILING["enabled"] = False
+
+
+
+def enable_from_environment():
+    """
+    I.1 Switch profiling on if the MARITIME_PROFILE environment variable names
+    a report file, with MARITIME_CPROFILE optionally naming a cProfile dump.
+
+    Output:
+
+            enabled             True if profiling was switched on.
+
+    """
+
+    report_filename = os.environ.get("MARITIME_PROFILE")
+
+    if report_filename:
+        enable_profiling(report_filename, os.environ.get("MARITIME_CPROFILE"))
+
+    return bool(report_filename)
+
+
+
+def count_rows(value):
+    """
+    I.2 Count the dataframe and array rows in a stage input or output,
+    including those inside tuples, lists and dictionaries.
+
+    Input:
+
+            value               stage input or output.
+
+    Output:
+
+            rows                number of rows.
+
+    """
+
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value) if value.ndim else 0
+
+    if isinstance(value, (tuple, list)):
+        return sum(count_rows(item) for item in value)
+
+    if isinstance(value, dict):
+        return sum(count_rows(item) for item in value.values())
+
+    return 0
+
+
+
+def current_rss_mb():
+    """
+    I.2 Read the current resident memory of the process, from /proc on Linux.
+
+    Output:
+
+            rss_mb              resident memory (MB), or NaN where /proc is
+                                not available.
+
+    """
+
+    try:
+        with open('/proc/self/statm') as statm_file:
+            resident_pages = int(statm_file.read().split()[1])
+    except OSError:
+        return float('nan')
+
+    return resident_pages * resource.getpagesize() / 2.0 ** 20
+
+
+
+def start_stage(name, args):
+    """
+    I.2 Start recording a stage.
+
+    Input:
+
+            name                stage name.
+            args                stage inputs.
+
+    Output:
+
+            stage_record        record of the stage in progress, or None if
+                                profiling is off.
+
+    """
+
+    if not PROFILING["enabled"]:
+        return None
+
+    stage_record = {
+        "stage": name,
+        "rows_in": count_rows(list(args)),
+        "cache_hits_before": data_cache.CACHE_STATS["hits"],
+        "wall_start": time.perf_counter(),
+        "cpu_start": time.process_time(),
+        "rss_start_mb": current_rss_mb(),
+        "profile": None,
+    }
+
+    if PROFILING["cprofile_filename"]:
+        stage_record["profile"] = cProfile.Profile()
+        stage_record["profile"].enable()
+
+    return stage_record
+
+
+
+def finish_stage(stage_record, output, checkpoint_hit=False):
+    """
+    I.2 Finish recording a stage, keeping the cProfile statistics if it is
+    the slowest stage so far.
+
+    Input:
+
+            stage_record        record returned by start_stage.
+            output              stage output.
+            checkpoint_hit      True if the output was loaded from a
+                                checkpoint.
+
+    Output:
+
+            None
+
+    """
+
+    if stage_record is None:
+        return
+
+    wall_s = time.perf_counter() - stage_record["wall_start"]
+    cpu_s = time.process_time() - stage_record["cpu_start"]
+
+    if stage_record["profile"] is not None:
+        stage_record["profile"].disable()
+        if wall_s > PROFILING["hottest_wall_s"]:
+            PROFILING["hottest_profile"] = (stage_record["stage"], stage_record["profile"])
+            PROFILING["hottest_wall_s"] = wall_s
+
+    PROFILING["stages"].append({
+        "stage": stage_record["stage"],
+        "wall_s": wall_s,
+        "cpu_s": cpu_s,
+        "rows_in": stage_record["rows_in"],
+        "rows_out": count_rows(output),
+        # resident memory at the stage's finish less that at its start
+        "rss_start_mb": stage_record["rss_start_mb"],
+        "rss_delta_mb": current_rss_mb() - stage_record["rss_start_mb"],
+        # peak of the whole process so far rather than of the stage, as
+        # ru_maxrss never decreases (reported in kilobytes on Linux)
+        "process_peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+        "checkpoint_hit": checkpoint_hit,
+        "cache_hits": data_cache.CACHE_STATS["hits"] - stage_record["cache_hits_before"],
+    })
+
+
+
+def write_report(report_filename=None):
+    """
+    I.3 Write the stage records to a JSON report and dump the cProfile
+    statistics of the slowest stage.
+
+    Input:
+
+            report_filename     JSON report, defaults to the file given when
+                                profiling was switched on.
+
+    Output:
+
+            report              dictionary of the stage records and totals.
+
+    """
+
+    report = {
+        "stages": PROFILING["stages"],
+        "total_wall_s": sum(stage["wall_s"] for stage in PROFILING["stages"]),
+        "total_cpu_s": sum(stage["cpu_s"] for stage in PROFILING["stages"]),
+        "hottest_stage": PROFILING["hottest_profile"][0] if PROFILING["hottest_profile"] else None,
+    }
+
+    report_filename = report_filename or PROFILING["report_filename"]
+    if report_filename:
+        with open(report_filename, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+    if PROFILING["hottest_profile"] and PROFILING["cprofile_filename"]:
+        PROFILING["hottest_profile"][1].dump_stats(PROFILING["cprofile_filename"])
+
+    return report
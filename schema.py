@@ -0,0 +1,265 @@
+"""
+schema.py
+
+Declared compact field types for each data source and functions to apply
+them. Steps include...
+
+        S.1     Declare the field types of the AIS, oceanic and weather
+                datasets and of the enriched dynamic dataset.
+        S.2     Parse floating point fields straight to their declared types
+                when reading, and downcast the remaining fields to theirs,
+                checking for loss of precision.
+        S.3     Report memory use before and after downcasting at each
+                pipeline stage.
+
+Integer fields holding missing values cannot be stored as numpy integers and
+are kept as float32 instead. Timestamps stay int64.
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import warnings
+import numpy as np
+import pandas as pd
+
+
+# S.1 declared field types
+AIS_STATIC_SCHEMA = {
+    "sourcemmsi": np.uint32,
+    "shiptype": np.uint8,
+    "tobow": np.float32,
+    "tostern": np.float32,
+    "tostarboard": np.float32,
+    "toport": np.float32,
+    "draught": np.float32,
+}
+
+AIS_DYNAMIC_SCHEMA = {
+    "sourcemmsi": np.uint32,
+    "navigationalstatus": np.uint8,
+    "rateofturn": np.float32,
+    "speedoverground": np.float32,
+    "courseoverground": np.float32,
+    "trueheading": np.uint16,
+    "lon": np.float32,
+    "lat": np.float32,
+    "t": np.int64,
+    "tobow": np.float32,
+    "tostern": np.float32,
+    "tostarboard": np.float32,
+    "toport": np.float32,
+    "draught": np.float32,
+    "volume": np.float32,
+}
+
+OCEAN_SCHEMA = {
+    "lon": np.float32,
+    "lat": np.float32,
+    "hs": np.float32,
+    "dir": np.float32,
+    "lm": np.float32,
+    "ts": np.int64,
+}
+
+WEATHER_OBSERVATION_SCHEMA = {
+    "id_windDirection": np.uint8,
+    "Ff": np.float32,
+    "P": np.float32,
+    "T": np.float32,
+    "latitude": np.float32,
+    "longitude": np.float32,
+}
+
+ENRICHED_SCHEMA = dict(AIS_DYNAMIC_SCHEMA, **{
+    "ocean_hs": np.float32,
+    "ocean_dir": np.float32,
+    "ocean_lm": np.float32,
+    "weather_wind_ID": np.uint8,
+    "weather_Ff": np.float32,
+    "weather_P": np.float32,
+    "weather_T": np.float32,
+})
+
+# largest relative change accepted when downcasting floating point fields
+FLOAT_TOLERANCE = 1e-6
+
+
+
+def downcast_field(values, field_type, tolerance=FLOAT_TOLERANCE):
+    """
+    S.2 Downcast an array of values to a declared type if no precision is
+    lost.
+
+    Input:
+
+            values          array of field values.
+            field_type      declared numpy type.
+            tolerance       largest relative change accepted for floating
+                            point types.
+
+    Output:
+
+            downcast        downcast array, or None if the values do not fit
+                            the declared type.
+
+    """
+
+    values = np.asarray(values)
+    field_type = np.dtype(field_type)
+
+    if values.dtype == field_type:
+        return values
+
+    if not (np.issubdtype(values.dtype, np.number) or values.dtype == bool):
+        return None
+
+    if np.issubdtype(field_type, np.integer):
+
+        # integer types hold neither missing nor fractional values
+        field_range = np.iinfo(field_type)
+        if len(values) and (not np.isfinite(values).all() or (values != np.round(values)).any()
+                            or values.min() < field_range.min or values.max() > field_range.max):
+            return None
+
+        return values.astype(field_type)
+
+    downcast = values.astype(field_type)
+
+    if not np.allclose(downcast, values, rtol=tolerance, atol=0, equal_nan=True):
+        return None
+
+    return downcast
+
+
+
+def reader_dtypes(field_schema):
+    """
+    S.2 Return the types the CSV reader can parse fields to directly: the
+    floating point fields of a schema. Integer fields may hold missing values,
+    which the reader cannot parse to integers, so they are parsed as is and
+    downcast by apply_schema.
+
+    Input:
+
+            field_schema    dictionary of field name to declared type.
+
+    Output:
+
+            dtypes          dictionary of field name to type, for the dtype
+                            option of pd.read_csv.
+
+    """
+
+    dtypes = {field: field_type for field, field_type in field_schema.items() if np.issubdtype(np.dtype(field_type), np.floating)}
+
+    return dtypes
+
+
+
+def apply_schema(table, field_schema, tolerance=FLOAT_TOLERANCE):
+    """
+    S.2 Downcast the fields of a dataframe to their declared types. Integer
+    fields with missing values fall back to float32 and fields that would
+    lose precision keep their type with a warning. Fields missing from the
+    schema are left unchanged, and fields of an empty dataframe take their
+    declared types.
+
+    Input:
+
+            table           dataframe to downcast.
+            field_schema    dictionary of field name to declared type.
+            tolerance       largest relative change accepted for floating
+                            point types.
+
+    Output:
+
+            compact_table   dataframe with downcast fields.
+
+    """
+
+    # fields already in their declared types (e.g. memory-mapped from the
+    # data cache) are shared rather than copied
+    compact_table = table.copy(deep=False)
+
+    for field, field_type in field_schema.items():
+        # fields already in their declared types are left as they are
+        if field not in compact_table.columns or compact_table[field].dtype == np.dtype(field_type):
+            continue
+
+        values = compact_table[field].values
+
+        # empty fields (e.g. of an empty batch) hold nothing to check
+        if len(values) == 0:
+            compact_table[field] = values.astype(field_type)
+            continue
+
+        downcast = downcast_field(values, field_type, tolerance)
+
+        # integer fields with missing values
+        if downcast is None and np.issubdtype(np.dtype(field_type), np.integer):
+            downcast = downcast_field(values, np.float32, 0)
+
+        if downcast is None:
+            warnings.warn("field %s kept as %s, values do not fit %s" % (field, values.dtype, np.dtype(field_type)))
+            continue
+
+        compact_table[field] = downcast
+
+    return compact_table
+
+
+
+def compact_stage(table, field_schema, stage, memory_report=None):
+    """
+    S.3 Apply a schema to the output of a pipeline stage, recording its
+    memory use before and after.
+
+    Input:
+
+            table           dataframe output by the stage.
+            field_schema    dictionary of field name to declared type.
+            stage           name of the pipeline stage.
+            memory_report   list of report entries to append to, or None.
+
+    Output:
+
+            compact_table   dataframe with downcast fields.
+
+    """
+
+    compact_table = apply_schema(table, field_schema)
+
+    if memory_report is not None:
+        memory_report.append({
+            "stage": stage,
+            "rows": len(table),
+            "before_mb": table.memory_usage(deep=True).sum() / 1e6,
+            "after_mb": compact_table.memory_usage(deep=True).sum() / 1e6,
+        })
+
+    return compact_table
+
+
+
+def print_memory_report(memory_report):
+    """
+    S.3 Print the memory used at each pipeline stage before and after
+    downcasting.
+
+    Input:
+
+            memory_report   list of report entries.
+
+    Output:
+
+            None
+
+    """
+
+    report_df = pd.DataFrame(memory_report, columns=["stage", "rows", "before_mb", "after_mb"])
+    report_df["saving"] = 1 - report_df["after_mb"] / report_df["before_mb"]
+
+    print(report_df.to_string(index=False, float_format=lambda value: "%.2f" % value))
@@ -0,0 +1,304 @@
+"""
+synthetic_data.py
+
+Script to generate synthetic datasets with the same files and fields as the
+NARI AIS, oceanic and weather datasets, so the pipeline can be run and
+benchmarked without the original data. Steps include...
+
+        G.1     Generate static vessel information, with a share of
+                containerships (type 7x).
+        G.2     Generate dynamic AIS messages along vessel tracks, written in
+                bounded chunks so any number of rows can be produced.
+        G.3     Generate six monthly oceanic datasets on a regular grid with
+                land points missing.
+        G.4     Generate weather stations, observations and wind directions.
+
+Usage...
+
+        python3 synthetic_data.py datasets 1e6
+
+
+A full description of the research and references used can be found in README.md
+"""
+
+
+### Import libraries ###
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+from ocean_cube import OCEAN_FILENAMES
+from weather_matching import STATION_TIMEZONE
+
+
+# area covered by the synthetic data (Bay of Biscay and Celtic Sea)
+LAT_RANGE = (45.0, 51.0)
+LON_RANGE = (-10.0, 0.0)
+
+# first day of the six months covered (October 2015 to March 2016)
+MONTH_STARTS = pd.date_range("2015-10-01", periods=7, freq="MS")
+
+# navigational status codes and their relative frequencies
+NAVIGATION_CODES = [0, 1, 3, 4, 5, 7, 8, 15]
+NAVIGATION_WEIGHTS = [0.6, 0.1, 0.02, 0.02, 0.15, 0.04, 0.02, 0.05]
+
+
+
+def epoch_seconds(timestamps):
+    """
+    Convert pandas timestamps to integer seconds since 1970.
+
+    """
+
+    return np.asarray(timestamps, dtype='datetime64[s]').astype(np.int64)
+
+
+
+def generate_static(n_vessels, rng, containership_share=0.3):
+    """
+    G.1 Generate static vessel information.
+
+    Input:
+
+            n_vessels           number of vessels.
+            rng                 numpy random generator.
+            containership_share share of vessels with a type code of 7x.
+
+    Output:
+
+            static_dataset      static vessel dataset.
+
+    """
+
+    mmsi = 200000000 + rng.choice(700000000, size=n_vessels, replace=False)
+    shiptype = np.where(rng.random(n_vessels) < containership_share,
+                        rng.integers(70, 80, n_vessels), rng.choice([30, 31, 36, 37, 52, 60, 80, 89, 90], n_vessels))
+
+    static_dataset = pd.DataFrame({
+        "sourcemmsi": mmsi,
+        "imonumber": rng.integers(9000000, 9999999, n_vessels),
+        "callsign": ["C%06d" % vessel for vessel in range(n_vessels)],
+        "shipname": ["VESSEL %d" % vessel for vessel in range(n_vessels)],
+        "shiptype": shiptype,
+        "tobow": rng.integers(20, 300, n_vessels),
+        "tostern": rng.integers(10, 100, n_vessels),
+        "tostarboard": rng.integers(5, 25, n_vessels),
+        "toport": rng.integers(5, 25, n_vessels),
+        "eta": "01-01 00:00",
+        "draught": np.round(rng.uniform(4.0, 15.0, n_vessels), 1),
+        "destination": "BREST",
+        "mothershipmmsi": 0,
+        "t": epoch_seconds([MONTH_STARTS[0]])[0],
+    })
+
+    return static_dataset
+
+
+
+def generate_dynamic_chunk(n_rows, static_dataset, rng):
+    """
+    G.2 Generate dynamic AIS messages for random vessels and times, each
+    vessel moving along its own straight track across the area.
+
+    Input:
+
+            n_rows              number of messages.
+            static_dataset      static vessel dataset.
+            rng                 numpy random generator.
+
+    Output:
+
+            dynamic_chunk       dynamic AIS messages.
+
+    """
+
+    vessel = rng.integers(0, len(static_dataset), n_rows)
+    t_start, t_end = epoch_seconds([MONTH_STARTS[0], MONTH_STARTS[-1]])
+    t = rng.integers(t_start, t_end, n_rows)
+
+    # tracks bounce back and forth across the area at a per-vessel speed
+    track_rng = np.random.default_rng(static_dataset["sourcemmsi"].values % 1000003)
+    phase = ((t - t_start) / 86400.0)[:, None] * track_rng.uniform(0.05, 0.5, (len(static_dataset), 2))[vessel] + track_rng.random((len(static_dataset), 2))[vessel]
+    position = np.abs((phase % 2.0) - 1.0)
+
+    dynamic_chunk = pd.DataFrame({
+        "sourcemmsi": static_dataset["sourcemmsi"].values[vessel],
+        "navigationalstatus": rng.choice(NAVIGATION_CODES, n_rows, p=NAVIGATION_WEIGHTS),
+        "rateofturn": np.round(rng.normal(0.0, 5.0, n_rows), 1),
+        "speedoverground": np.round(np.clip(rng.normal(12.0, 5.0, n_rows), 0.0, 30.0), 1),
+        "courseoverground": np.round(rng.uniform(0.0, 360.0, n_rows), 1),
+        "trueheading": rng.integers(0, 360, n_rows),
+        "lon": np.round(LON_RANGE[0] + position[:, 1] * (LON_RANGE[1] - LON_RANGE[0]), 5),
+        "lat": np.round(LAT_RANGE[0] + position[:, 0] * (LAT_RANGE[1] - LAT_RANGE[0]), 5),
+        "t": t,
+        "tobow": static_dataset["tobow"].values[vessel],
+        "tostern": static_dataset["tostern"].values[vessel],
+        "tostarboard": static_dataset["tostarboard"].values[vessel],
+        "toport": static_dataset["toport"].values[vessel],
+        "draught": static_dataset["draught"].values[vessel],
+    })
+
+    return dynamic_chunk
+
+
+
+def generate_ocean_month(month_idx, rng, grid_step=0.5, time_step=3 * 3600, land_share=0.1):
+    """
+    G.3 Generate one month of oceanic data on a regular grid, with a fixed
+    share of grid points treated as land and left out.
+
+    Input:
+
+            month_idx           index of the month in MONTH_STARTS.
+            rng                 numpy random generator.
+            grid_step           grid spacing (degrees).
+            time_step           time between fields (s).
+            land_share          share of grid points left out as land.
+
+    Output:
+
+            oc_month            monthly oceanic dataset.
+
+    """
+
+    lat = np.round(np.arange(LAT_RANGE[0], LAT_RANGE[1] + 1e-9, grid_step), 4)
+    lon = np.round(np.arange(LON_RANGE[0], LON_RANGE[1] + 1e-9, grid_step), 4)
+    ts = np.arange(*epoch_seconds(MONTH_STARTS[month_idx:month_idx + 2]), time_step)
+
+    # the same points are land in every month
+    sea = np.random.default_rng(0).random((len(lat), len(lon))) >= land_share
+    lat_grid, lon_grid = np.meshgrid(lat, lon, indexing='ij')
+    lat_sea, lon_sea = lat_grid[sea], lon_grid[sea]
+
+    n_rows = len(ts) * len(lat_sea)
+    oc_month = pd.DataFrame({
+        "lon": np.tile(lon_sea, len(ts)),
+        "lat": np.tile(lat_sea, len(ts)),
+        "dpt": np.round(np.tile(rng.uniform(20.0, 4000.0, len(lat_sea)), len(ts)), 1),
+        "wlv": np.round(rng.normal(0.0, 1.0, n_rows), 2),
+        "hs": np.round(rng.gamma(2.0, 1.0, n_rows), 2),
+        "lm": np.round(rng.uniform(20.0, 200.0, n_rows), 1),
+        "dir": np.round(rng.uniform(0.0, 360.0, n_rows), 1),
+        "ts": np.repeat(ts, len(lat_sea)),
+    })
+
+    return oc_month
+
+
+
+def generate_weather(n_stations, rng, time_step=3 * 3600):
+    """
+    G.4 Generate weather stations, their observations over the six months and
+    the wind direction table.
+
+    Input:
+
+            n_stations          number of weather stations.
+            rng                 numpy random generator.
+            time_step           time between observations (s).
+
+    Output:
+
+            weather_observation dynamic weather observations.
+            weather_stations    static weather station dataset.
+            weather_wind_direction  wind direction table.
+
+    """
+
+    weather_stations = pd.DataFrame({
+        "id_station": np.arange(1, n_stations + 1),
+        "name": ["STATION %d" % station for station in range(n_stations)],
+        "latitude": np.round(rng.uniform(*LAT_RANGE, n_stations), 4),
+        "longitude": np.round(rng.uniform(*LON_RANGE, n_stations), 4),
+    })
+
+    ts = np.arange(*epoch_seconds([MONTH_STARTS[0], MONTH_STARTS[-1]]), time_step)
+    n_rows = len(ts) * n_stations
+
+    weather_observation = pd.DataFrame({
+        "id": np.arange(n_rows),
+        "id_station": np.tile(weather_stations["id_station"].values, len(ts)),
+        "local_time": pd.to_datetime(np.repeat(ts, n_stations), unit='s', utc=True).tz_convert(STATION_TIMEZONE).strftime("%Y-%m-%d %H:%M:%S"),
+        "T": np.round(rng.normal(10.0, 4.0, n_rows), 1),
+        "Tn": np.round(rng.normal(6.0, 4.0, n_rows), 1),
+        "Tx": np.round(rng.normal(14.0, 4.0, n_rows), 1),
+        "P": np.round(rng.normal(1013.0, 10.0, n_rows), 1),
+        "U": rng.integers(40, 100, n_rows),
+        "id_windDirection": rng.integers(1, 17, n_rows),
+        "Ff": np.round(rng.gamma(2.0, 3.0, n_rows), 1),
+        "ff10": np.round(rng.gamma(2.0, 4.0, n_rows), 1),
+        "ff3": np.round(rng.gamma(2.0, 4.0, n_rows), 1),
+        "VV": np.round(rng.uniform(1.0, 50.0, n_rows), 1),
+        "Td": np.round(rng.normal(6.0, 3.0, n_rows), 1),
+        "RRR": np.round(rng.exponential(0.5, n_rows), 1),
+        "tR": 3,
+    })
+
+    directions = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE", "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
+    weather_wind_direction = pd.DataFrame({"id_windDirection": np.arange(1, 17), "direction": directions,
+                                           "degrees": np.arange(16) * 22.5})
+
+    return weather_observation, weather_stations, weather_wind_direction
+
+
+
+def generate_datasets(data_dir, n_ais, n_vessels=None, n_stations=50, grid_step=0.5, chunk_rows=1000000, seed=0):
+    """
+    Compilation function. Write every input file of the pipeline to a
+    directory.
+
+    Input:
+
+            data_dir            directory to write the datasets to.
+            n_ais               number of dynamic AIS messages.
+            n_vessels           number of vessels, defaults to scale with the
+                                number of messages.
+            n_stations          number of weather stations.
+            grid_step           oceanic grid spacing (degrees).
+            chunk_rows          number of AIS messages generated at a time.
+            seed                random seed.
+
+    Output:
+
+            None
+
+    """
+
+    os.makedirs(data_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n_ais = int(n_ais)
+
+    if n_vessels is None:
+        n_vessels = int(min(max(n_ais // 2000, 50), 20000))
+
+    static_dataset = generate_static(n_vessels, rng)
+    static_dataset.to_csv(data_dir + r'/nari_static.csv', index=False)
+
+    # dynamic messages written chunk by chunk with a running index, as the
+    # original dataset carries an 'Unnamed: 0' index field
+    dynamic_filename = data_dir + r'/nari_dynamic.csv'
+    for chunk_start in range(0, n_ais, chunk_rows):
+        dynamic_chunk = generate_dynamic_chunk(min(chunk_rows, n_ais - chunk_start), static_dataset, rng)
+        dynamic_chunk.index += chunk_start
+        dynamic_chunk.to_csv(dynamic_filename, mode='w' if chunk_start == 0 else 'a', header=(chunk_start == 0))
+
+    for month_idx, oc_filename in enumerate(OCEAN_FILENAMES):
+        generate_ocean_month(month_idx, rng, grid_step).to_csv(data_dir + '/' + oc_filename, index=False)
+
+    weather_observation, weather_stations, weather_wind_direction = generate_weather(n_stations, rng)
+    weather_observation.to_csv(data_dir + r'/table_weather_observation.csv', index=False)
+    weather_stations.to_csv(data_dir + r'/table_weatherStation.csv', index=False)
+    weather_wind_direction.to_csv(data_dir + r'/table_windDirection.csv', index=False)
+
+
+
+if __name__ == '__main__':
+
+    # usage check
+    if len(sys.argv) != 3:
+        print("Usage: python3 synthetic_data.py datasets n_ais_rows")
+        sys.exit(1)
+
+    generate_datasets(sys.argv[1], float(sys.argv[2]))
@@ -0,0 +1,11 @@
+"""
+Put the repository's top-level modules on the import path of the tests.
+"""
+
+
+### Import libraries ###
+import os
+import sys
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,105 @@
+"""
+Tests of the AIS data cleaning filters.
+"""
+
+
+### Import libraries ###
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+import AIS_data_cleaning
+import synthetic_data
+
+
+
+def test_streaming_cleaning_matches_in_memory(tmp_path):
+    rng = np.random.default_rng(0)
+    static_dataset = synthetic_data.generate_static(100, rng)
+    dynamic_dataset = synthetic_data.generate_dynamic_chunk(5000, static_dataset, rng)
+
+    dynamic_filename = tmp_path / "nari_dynamic.csv"
+    dynamic_dataset.to_csv(dynamic_filename)
+
+    in_memory = AIS_data_cleaning.data_cleaning(static_dataset, dynamic_dataset)
+    streamed = AIS_data_cleaning.data_cleaning_streaming(static_dataset, dynamic_filename, chunksize=700)
+
+    # only the fields the pipeline uses are read
+    assert list(streamed.columns) == [field for field in AIS_data_cleaning.DYNAMIC_FIELDS if field != "navigationalstatus"]
+    pd.testing.assert_frame_equal(streamed, in_memory[streamed.columns], check_dtype=False)
+
+
+
+def test_streaming_cleaning_skips_blank_mmsi(tmp_path):
+    rng = np.random.default_rng(1)
+    static_dataset = synthetic_data.generate_static(50, rng, containership_share=1.0)
+    dynamic_dataset = synthetic_data.generate_dynamic_chunk(200, static_dataset, rng)
+    dynamic_dataset["navigationalstatus"] = 0
+    dynamic_dataset["speedoverground"] = 10.0
+    dynamic_dataset["sourcemmsi"] = dynamic_dataset["sourcemmsi"].astype(object)
+    dynamic_dataset.loc[:9, "sourcemmsi"] = None
+
+    dynamic_filename = tmp_path / "nari_dynamic.csv"
+    dynamic_dataset.to_csv(dynamic_filename)
+
+    streamed = AIS_data_cleaning.data_cleaning_streaming(static_dataset, dynamic_filename)
+
+    assert streamed["sourcemmsi"].dtype == np.int64
+    assert streamed["sourcemmsi"].isin(static_dataset["sourcemmsi"]).all()
+    assert len(streamed) == dynamic_dataset["sourcemmsi"].iloc[10:].isin(dynamic_dataset["sourcemmsi"].iloc[10:].unique()[:40]).sum()
+
+
+
+def test_cleaning_without_sub_sample_keeps_every_containership(tmp_path):
+    rng = np.random.default_rng(2)
+    static_dataset = synthetic_data.generate_static(200, rng, containership_share=1.0)
+    dynamic_dataset = synthetic_data.generate_dynamic_chunk(5000, static_dataset, rng)
+
+    dynamic_filename = tmp_path / "nari_dynamic.csv"
+    dynamic_dataset.to_csv(dynamic_filename)
+
+    sampled = AIS_data_cleaning.data_cleaning_streaming(static_dataset, dynamic_filename)
+    streamed = AIS_data_cleaning.data_cleaning_streaming(static_dataset, dynamic_filename, sub_sample=False)
+    in_memory = AIS_data_cleaning.data_cleaning(static_dataset, dynamic_dataset, sub_sample=False)
+
+    assert sampled["sourcemmsi"].nunique() == 40
+    assert streamed["sourcemmsi"].nunique() > 40
+    assert list(streamed.columns) == list(sampled.columns)
+    pd.testing.assert_frame_equal(streamed, in_memory[streamed.columns], check_dtype=False)
+
+
+
+def test_containerships_index_resolves_types_per_vessel():
+    static_data_rm = pd.DataFrame({
+        "sourcemmsi": [300, 100, 100, 100, 200, 200, 300, 400, 500, 600, 700, 0, None, 800],
+        "shiptype": [30, 71, 72, 71, 75, 74, 70, 79, 80, 69, "7x", 70, 70, 70.5],
+    })
+
+    static_container = AIS_data_cleaning.containerships_index(static_data_rm)
+
+    # most frequent type, ties to the lowest code, out of range and invalid
+    # types or mmsi's left out, one row per vessel sorted by mmsi
+    assert static_container["mmsi"].tolist() == [100, 200, 300, 400]
+    assert static_container["shiptype"].tolist() == [71, 74, 70, 79]
+    assert (static_container["mmsi"].dtype, static_container["shiptype"].dtype) == (np.uint32, np.uint8)
+
+    # other type code ranges, both ends inclusive
+    other_types = AIS_data_cleaning.containerships_index(static_data_rm, type_ranges=[(30, 31), (80, 80)])
+    assert other_types["mmsi"].tolist() == [300, 500]
+    assert other_types["shiptype"].tolist() == [30, 80]
+
+
+
+def test_is_member_at_the_array_edges():
+    sorted_set = np.array([10, 20, 30], dtype=np.int64)
+    values = np.array([5, 10, 15, 20, 30, 35, 10])
+
+    # values below, between and above the members, and the first and last
+    np.testing.assert_array_equal(AIS_data_cleaning.is_member(values, sorted_set),
+                                  [False, True, False, True, True, False, True])
+    np.testing.assert_array_equal(AIS_data_cleaning.is_member(values, sorted_set), np.isin(values, sorted_set))
+
+    # single-member and empty sets, and float values with blank mmsi's
+    np.testing.assert_array_equal(AIS_data_cleaning.is_member(np.array([9, 10, 11]), np.array([10])), [False, True, False])
+    assert not AIS_data_cleaning.is_member(values, np.array([], dtype=np.int64)).any()
+    np.testing.assert_array_equal(AIS_data_cleaning.is_member(np.array([np.nan, 10.0, 30.0]), sorted_set), [False, True, True])
@@ -0,0 +1,78 @@
+"""
+Tests of the append mode's cached references and enriched batches.
+"""
+
+
+### Import libraries ###
+import os
+import sys
+import subprocess
+import pandas as pd
+
+### Import external functions ###
+import append_mode
+import synthetic_data
+
+
+# repository directory, holding __main__.py
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+
+def write_marker(reference_dir):
+    os.makedirs(reference_dir)
+    open(os.path.join(reference_dir, 'marker'), 'w').close()
+
+
+
+def test_cached_reference_rebuilds_when_inputs_change(tmp_path):
+    input_filename = tmp_path / "input.csv"
+    input_filename.write_text("a\n1\n")
+    builds = []
+
+    def write_reference(reference_dir):
+        builds.append(reference_dir)
+        write_marker(reference_dir)
+
+    first_dir = append_mode.cached_reference(str(tmp_path), "reference", [input_filename], write_reference)
+    assert append_mode.cached_reference(str(tmp_path), "reference", [input_filename], write_reference) == first_dir
+    assert len(builds) == 1
+
+    # a changed input (here its size) builds a new reference and removes the old one
+    input_filename.write_text("a\n1\n2\n")
+    second_dir = append_mode.cached_reference(str(tmp_path), "reference", [input_filename], write_reference)
+
+    assert second_dir != first_dir and len(builds) == 2
+    assert os.path.exists(os.path.join(second_dir, 'marker')) and not os.path.exists(first_dir)
+    assert not any('.tmp' in entry for entry in os.listdir(tmp_path))
+
+    # other settings build their own reference
+    third_dir = append_mode.cached_reference(str(tmp_path), "reference", [input_filename], write_reference, ("linear",))
+    assert third_dir != second_dir and len(builds) == 3
+
+
+
+def test_appended_batch_equals_full_run_rows(tmp_path):
+    data_dir = tmp_path / "datasets"
+    synthetic_data.generate_datasets(str(data_dir), 20000, n_stations=20, grid_step=1.0)
+
+    # the full pipeline writes datasets/full_dynamic_set.csv relative to its working directory
+    subprocess.run([sys.executable, os.path.join(REPO_DIR, "__main__.py"), "datasets"], cwd=tmp_path, check=True, capture_output=True)
+    full_dynamic_set = pd.read_csv(data_dir / "full_dynamic_set.csv", index_col=0)
+
+    # a batch of the messages of a week of the full dataset
+    dynamic_dataset = pd.read_csv(data_dir / "nari_dynamic.csv", index_col=0)
+    week_start = dynamic_dataset["t"].min() + 30 * 86400
+    dynamic_batch = dynamic_dataset[(dynamic_dataset["t"] >= week_start) & (dynamic_dataset["t"] < week_start + 7 * 86400)]
+    dynamic_batch.to_csv(tmp_path / "batch.csv")
+
+    partition_files = append_mode.append_mode(str(data_dir), str(tmp_path / "batch.csv"), str(tmp_path / "output"))
+    batch_enriched = pd.concat([pd.read_csv(partition_file) for partition_file in partition_files])
+
+    full_rows = full_dynamic_set[(full_dynamic_set["t"] >= week_start) & (full_dynamic_set["t"] < week_start + 7 * 86400)]
+    assert len(batch_enriched) == len(full_rows) > 0
+
+    key_fields = ["sourcemmsi", "t"]
+    batch_enriched = batch_enriched.sort_values(key_fields).reset_index(drop=True)
+    full_rows = full_rows.sort_values(key_fields).reset_index(drop=True)[batch_enriched.columns]
+    pd.testing.assert_frame_equal(batch_enriched, full_rows, check_dtype=False)
@@ -0,0 +1,75 @@
+"""
+Tests of the columnar CSV cache.
+"""
+
+
+### Import libraries ###
+import os
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+import data_cache
+import schema
+
+
+
+def write_csv(filename, n_rows=20):
+    pd.DataFrame({"id": np.arange(n_rows), "value": np.linspace(0, 1, n_rows),
+                  "name": ["row %d" % row if row % 3 else None for row in range(n_rows)]}).to_csv(filename, index=False)
+
+
+
+def test_cache_hit_matches_miss(tmp_path):
+    filename = str(tmp_path / "table.csv")
+    write_csv(filename)
+
+    missed = data_cache.cached_read_csv(filename)
+    hit = data_cache.cached_read_csv(filename)
+
+    pd.testing.assert_frame_equal(hit, missed)
+    pd.testing.assert_frame_equal(hit, pd.read_csv(filename))
+
+
+
+def test_stale_entries_removed_per_read_options(tmp_path):
+    filename = str(tmp_path / "table.csv")
+    cache_dir = tmp_path / data_cache.CACHE_DIRNAME
+    write_csv(filename)
+
+    data_cache.cached_read_csv(filename)
+    entry_name, = os.listdir(cache_dir)
+    data_cache.cached_read_csv(filename, usecols=["id"])
+
+    # another process's entry in progress for the same file and options
+    temp_dir = cache_dir / (entry_name[:-4] + "0000.tmp1")
+    os.makedirs(temp_dir)
+
+    assert len(os.listdir(cache_dir)) == 3
+
+    # changing the file replaces the entries read with the same options only
+    write_csv(filename, n_rows=30)
+    os.utime(filename, ns=(0, 10 ** 9))
+    table = data_cache.cached_read_csv(filename)
+
+    assert len(table) == 30
+    assert len(os.listdir(cache_dir)) == 3
+    assert temp_dir.exists()
+    assert len(data_cache.cached_read_csv(filename, usecols=["id"])) == 30
+
+
+
+def test_schema_typed_fields_memory_mapped_without_copy(tmp_path):
+    filename = str(tmp_path / "ocean.csv")
+    pd.DataFrame({"lon": [-8.0, -7.5], "lat": [45.0, 45.5], "dpt": [1.0, 1.0], "hs": [0.5, 1.0], "ts": [0, 10800]}).to_csv(filename, index=False)
+    fields = ["lon", "lat", "hs", "ts"]
+
+    data_cache.cached_read_csv(filename, field_schema=schema.OCEAN_SCHEMA, usecols=fields)
+    mapped = data_cache.cached_read_csv(filename, mmap_mode='r', field_schema=schema.OCEAN_SCHEMA, usecols=fields)
+    compact = schema.apply_schema(mapped, schema.OCEAN_SCHEMA)
+
+    # the cached fields are already typed, so applying the schema keeps the maps
+    assert list(compact.columns) == fields
+    for field in fields:
+        assert isinstance(mapped[field].values, np.memmap)
+        assert np.shares_memory(compact[field].values, mapped[field].values)
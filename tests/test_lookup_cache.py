@@ -0,0 +1,71 @@
+"""
+Tests of the lookup cache against uncached per-entry lookups.
+"""
+
+
+### Import libraries ###
+import numpy as np
+
+### Import external functions ###
+import lookup_cache
+import oceanic_matching
+import synthetic_data
+import weather_data_cleaning
+import weather_matching
+
+
+
+def test_cached_lookups_match_uncached_on_irregular_axes():
+    rng = np.random.default_rng(0)
+
+    # an irregular grid, with rows and columns of the regular one left out
+    oc_month = synthetic_data.generate_ocean_month(0, rng, grid_step=0.5).drop(['dpt', 'wlv'], axis=1)
+    oc_month = oc_month[~oc_month["lat"].isin([46.0, 46.5, 48.5]) & ~oc_month["lon"].isin([-9.5, -7.0, -6.5, -6.0])]
+    ocean_store = oceanic_matching.build_ocean_store([oc_month])
+
+    weather_observation, weather_stations, _ = synthetic_data.generate_weather(5, rng)
+    weather_final = weather_data_cleaning.add_weather_coordinates(weather_observation, weather_stations)
+    weather_ts = weather_matching.observation_timestamps(weather_final)
+
+    # entries clustered around a few points, so that many share a key
+    n_rows = 300
+    centre = rng.integers(0, 10, n_rows)
+    AIS_lat = rng.uniform(*synthetic_data.LAT_RANGE, 10)[centre] + rng.normal(0.0, 0.3, n_rows)
+    AIS_lon = rng.uniform(*synthetic_data.LON_RANGE, 10)[centre] + rng.normal(0.0, 0.3, n_rows)
+    AIS_ts = ocean_store[0]["ts_min"] + rng.integers(0, 20 * 86400, 10)[centre] + rng.integers(0, 6 * 3600, n_rows)
+
+    # values halfway between grid points, which the lookups resolve downwards
+    AIS_lat[:5], AIS_lon[:5] = 47.25, -6.75
+
+    cache = lookup_cache.new_lookup_cache()
+    for entry in zip(AIS_lat, AIS_lon, AIS_ts):
+        uncached = (oceanic_matching.ocean_parameter_matching(*entry, ocean_store)
+                    + weather_matching.weather_parameter_matching(*entry, weather_final, weather_ts=weather_ts))
+        cached = (oceanic_matching.ocean_parameter_matching(*entry, ocean_store, cache=cache)
+                  + weather_matching.weather_parameter_matching(*entry, weather_final, cache=cache, weather_ts=weather_ts))
+
+        np.testing.assert_array_equal(np.array(cached, dtype=np.float64), np.array(uncached, dtype=np.float64))
+
+    assert lookup_cache.cache_stats(cache)["hits"] > n_rows // 2
+
+
+
+def test_new_reference_evicts_previous_one():
+    rng = np.random.default_rng(1)
+    cache = lookup_cache.new_lookup_cache()
+    AIS_lat, AIS_lon = rng.uniform(*synthetic_data.LAT_RANGE, 50), rng.uniform(*synthetic_data.LON_RANGE, 50)
+
+    # stores built and dropped in turn, so that a later store may take the id
+    # of an earlier one were the cache not holding it
+    for month_idx in range(3):
+        ocean_store = oceanic_matching.build_ocean_store([synthetic_data.generate_ocean_month(month_idx, rng, grid_step=1.0 + 0.5 * month_idx).drop(['dpt', 'wlv'], axis=1)])
+        AIS_ts = rng.integers(ocean_store[0]["ts_min"], ocean_store[0]["ts_max"], 50)
+
+        for entry in zip(AIS_lat, AIS_lon, AIS_ts):
+            np.testing.assert_array_equal(np.array(oceanic_matching.ocean_parameter_matching(*entry, ocean_store, cache=cache), dtype=np.float64),
+                                          np.array(oceanic_matching.ocean_parameter_matching(*entry, ocean_store), dtype=np.float64))
+
+        # only the current store, its axes and its entries are kept
+        assert list(cache["references"]) == ["ocean"] and cache["references"]["ocean"] is ocean_store and list(cache["axes"]) == [("ocean", id(ocean_store))]
+        assert all(key[:2] == ("ocean", id(ocean_store)) for key in cache["entries"])
+        del ocean_store
@@ -0,0 +1,140 @@
+"""
+Tests of the SOG model functions.
+"""
+
+
+### Import libraries ###
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.metrics import r2_score
+
+### Import external functions ###
+import model
+import tree_arrays
+
+
+
+def model_entries(n_rows, rng):
+    # discrete and tied feature values, as in the enriched dataset
+    entries = pd.DataFrame({
+        "ocean_dir": np.round(rng.uniform(0.0, 360.0, n_rows), 1),
+        "weather_wind_ID": rng.integers(1, 17, n_rows).astype(np.float64),
+        "ocean_hs": np.round(rng.gamma(2.0, 1.0, n_rows), 2),
+    })
+    entries[model.TARGET] = np.round(10.0 + np.sin(np.radians(entries["ocean_dir"])) + 0.3 * entries["ocean_hs"]
+                                     + rng.normal(0.0, 1.0, n_rows), 1)
+
+    return entries
+
+
+
+def test_feature_sweep_matches_serial_sklearn():
+    rng = np.random.default_rng(0)
+    training_df, testing_df = model_entries(2726, rng), model_entries(700, rng)
+    features = ["ocean_dir", "weather_wind_ID", "ocean_hs"]
+
+    expected = {}
+    for feature in features:
+        DTR = DecisionTreeRegressor(**model.DTR_PARAMETERS).fit(training_df[[feature]].values, training_df[model.TARGET].values)
+        expected[feature] = r2_score(testing_df[model.TARGET].values, DTR.predict(testing_df[[feature]].values))
+
+    for n_workers in [1, 2]:
+        sweep_results = model.feature_sweep(training_df, testing_df, features, n_workers)
+
+        assert list(sweep_results["r2"]) == sorted(expected.values(), reverse=True)
+        assert dict(zip(sweep_results["feature"], sweep_results["r2"])) == expected
+
+
+
+def test_chunked_scoring_matches_single_chunk(tmp_path):
+    rng = np.random.default_rng(1)
+    n_rows = 3000
+
+    full_dynamic_set = pd.DataFrame({feature: np.round(rng.normal(10.0, 3.0, n_rows), 1) for feature in model.MODEL_FEATURES})
+    full_dynamic_set[model.TARGET] = np.round(full_dynamic_set["ocean_hs"] + rng.normal(0.0, 1.0, n_rows), 1)
+    full_dynamic_set.to_csv(tmp_path / "full_dynamic_set.csv", index=False)
+
+    model.train_model_artifact(str(tmp_path), str(tmp_path / "model"))
+    artifact = model.load_model_artifact(str(tmp_path / "model"))
+
+    # entries missing a feature are written without a prediction
+    full_dynamic_set.loc[::97, "weather_P"] = np.nan
+    full_dynamic_set.to_csv(tmp_path / "enriched.csv", index=False)
+
+    single_summary = model.score_file(artifact, tmp_path / "enriched.csv", tmp_path / "single.csv", chunk_rows=n_rows)
+    chunked_summary = model.score_file(artifact, tmp_path / "enriched.csv", tmp_path / "chunked.csv", chunk_rows=251)
+
+    single_summary.pop("time_s"), chunked_summary.pop("time_s")
+    assert chunked_summary == single_summary
+    assert (tmp_path / "chunked.csv").read_bytes() == (tmp_path / "single.csv").read_bytes()
+
+    # predictions are those of the compiled trees on the whole dataset
+    scored = pd.read_csv(tmp_path / "single.csv", float_precision="round_trip")
+    complete = full_dynamic_set[model.MODEL_FEATURES].notna().all(axis=1).values
+    np.testing.assert_array_equal(scored["predicted_" + model.TARGET].values[complete],
+                                  tree_arrays.predict_tree_arrays(artifact["trees"], full_dynamic_set[model.MODEL_FEATURES].values[complete]))
+    assert scored["predicted_" + model.TARGET].isna().sum() == (~complete).sum()
+
+
+
+def test_batched_scenarios_match_per_scenario_predictions():
+    rng = np.random.default_rng(2)
+    n_rows = 500
+    entries = pd.DataFrame({feature: np.round(rng.normal(10.0, 3.0, n_rows), 1) for feature in model.MODEL_FEATURES})
+    entries[model.TARGET] = np.round(entries["ocean_hs"] - 0.2 * entries["weather_Ff"] + rng.normal(0.0, 1.0, n_rows), 1)
+    DTR = DecisionTreeRegressor(**model.DTR_PARAMETERS).fit(entries[model.MODEL_FEATURES].values.astype(np.float32), entries[model.TARGET].values)
+
+    scenario_table = pd.concat([model.CLIMATE_SCENARIOS,
+                                pd.DataFrame({"scenario": ["storm"] * 2, "feature": ["ocean_hs", "weather_Ff"], "multiplier": [1.5, 1.2]}),
+                                model.monte_carlo_scenarios({"ocean_hs": 0.5, "weather_T": 1.0}, n_draws=5)], ignore_index=True)
+
+    # batches of two scenarios
+    scenario_results = model.project_scenarios(DTR, entries, scenario_table, batch_rows=2 * n_rows)
+    assert list(scenario_results["scenario"]) == ["2030", "2050", "storm"] + ["draw_%d" % draw for draw in range(5)]
+
+    baseline_mean = model.predict_SOG(DTR, entries[model.MODEL_FEATURES].values.astype(np.float32)).mean()
+    for scenario_result in scenario_results.itertuples():
+        # a copy of the entries with the scenario's changes applied
+        changes = scenario_table[scenario_table["scenario"] == scenario_result.scenario]
+        perturbed = entries[model.MODEL_FEATURES].copy()
+        for feature, multiplier, delta in zip(changes["feature"], changes["multiplier"].fillna(1.0), changes["delta"].fillna(0.0)):
+            perturbed[feature] = perturbed[feature] * multiplier + delta
+
+        mean_SOG = model.predict_SOG(DTR, perturbed.values.astype(np.float32)).mean()
+        SOG_change = (baseline_mean - mean_SOG) / baseline_mean
+
+        assert scenario_result.SOG_mean == pytest.approx(mean_SOG, rel=1e-12)
+        assert scenario_result.SOG_change == pytest.approx(SOG_change, rel=1e-9, abs=1e-15)
+        assert scenario_result.CO2_change == pytest.approx(SOG_change ** 3, rel=1e-9, abs=1e-15)
+
+    assert scenario_results["SOG_change"].abs().max() > 0
+
+
+
+def test_ensembles_trained_on_stored_uint8_bins():
+    rng = np.random.default_rng(3)
+    training_df, testing_df = [pd.DataFrame({feature: np.round(rng.normal(10.0, 3.0, n_rows), 2) for feature in model.MODEL_FEATURES})
+                               for n_rows in [2000, 500]]
+    for entries in [training_df, testing_df]:
+        entries["weather_P"] = rng.integers(0, 20, len(entries)).astype(np.float64)
+        entries[model.TARGET] = np.round(entries["ocean_hs"] + rng.normal(0.0, 1.0, len(entries)), 1)
+
+    # quantile bins above FEATURE_BINS distinct values, one per value below
+    bin_edges = model.fit_feature_bins(training_df)
+    assert len(bin_edges["ocean_hs"]) == model.FEATURE_BINS - 1 and len(bin_edges["weather_P"]) == 19
+
+    binned_test = model.bin_features(testing_df, bin_edges)
+    assert all(binned_test[feature].dtype == (np.uint8 if feature in model.BINNED_FEATURES else np.float32) for feature in model.MODEL_FEATURES)
+    np.testing.assert_array_equal(binned_test["weather_P"], testing_df["weather_P"].values)
+    assert (np.diff(binned_test["ocean_hs"].values[np.argsort(testing_df["ocean_hs"].values)].astype(np.int64)) >= 0).all()
+
+    ensemble_models = {model_name: (model_class, dict(model_parameters, **({"n_estimators": 10} if "n_estimators" in model_parameters else {"max_iter": 20})))
+                       for model_name, (model_class, model_parameters) in model.ENSEMBLE_MODELS.items()}
+    comparison = model.compare_ensembles(training_df, testing_df, ensemble_models=ensemble_models).set_index("model")
+
+    # 5 binned features of one byte and 5 others of four, against 10 of four
+    assert list(comparison["features"]) == ["float32", "binned", "binned"]
+    assert comparison["train_mb"].tolist() == [2000 * 10 * 4 / 1e6] + [2000 * (5 + 5 * 4) / 1e6] * 2
+    assert (comparison["r2"] > 0.5).all()
@@ -0,0 +1,158 @@
+"""
+Tests of the ocean cube and its matching and interpolation.
+"""
+
+
+### Import libraries ###
+import numpy as np
+import pandas as pd
+import pytest
+
+### Import external functions ###
+import ocean_cube
+import oceanic_matching
+import synthetic_data
+
+
+# first forecast time and forecast time step of the hand-made months
+START_TS = 1443657600
+TIME_STEP = 3 * 3600
+
+
+
+def grid_month(lat, lon, ts, parameters, land=()):
+    """
+    One month of oceanic data on a regular grid, with the parameters of each
+    point given by a function of its lat, lon and ts, and the (lat, lon)
+    points in land left out.
+
+    """
+
+    grid = pd.MultiIndex.from_product([lat, lon, ts], names=["lat", "lon", "ts"]).to_frame(index=False)
+    grid = grid[[(point_lat, point_lon) not in land for point_lat, point_lon in zip(grid["lat"], grid["lon"])]].reset_index(drop=True)
+
+    hs, direction, lm = parameters(grid["lat"].values, grid["lon"].values, grid["ts"].values)
+
+    return grid.assign(hs=hs, dir=direction, lm=lm)
+
+
+
+def linear_parameters(lat, lon, ts):
+    return 1.0 + 0.5 * lat - 0.25 * lon + (ts - START_TS) / 86400.0, np.full(len(lat), 90.0), 2.0 * lat + lon
+
+
+
+@pytest.fixture(scope="module")
+def synthetic_months():
+    rng = np.random.default_rng(0)
+
+    return [synthetic_data.generate_ocean_month(month_idx, rng, grid_step=1.0).drop(['dpt', 'wlv'], axis=1)
+            for month_idx in range(3)]
+
+
+
+def test_built_cube_round_trips_and_equals_store_cube(synthetic_months, tmp_path):
+    oc_filenames = []
+    for month_idx, oc_month in enumerate(synthetic_months):
+        oc_filenames.append(str(tmp_path / ("month_%d.csv" % month_idx)))
+        oc_month.to_csv(oc_filenames[-1], index=False)
+
+    built_cube = ocean_cube.build_ocean_cube(oc_filenames, str(tmp_path / "cube"))
+    store_cube = ocean_cube.cube_from_store(oceanic_matching.build_ocean_store(synthetic_months))
+
+    assert isinstance(built_cube["cube"], np.memmap)
+    np.testing.assert_array_equal(built_cube["cube"], store_cube["cube"])
+    for axis_name in ocean_cube.CUBE_AXES:
+        np.testing.assert_array_equal(built_cube[axis_name], store_cube[axis_name])
+        assert built_cube[axis_name + "_step"] == store_cube[axis_name + "_step"]
+
+    # an in-memory cube saved and loaded again
+    ocean_cube.save_ocean_cube(store_cube, str(tmp_path / "saved"))
+    saved_cube = ocean_cube.load_ocean_cube(str(tmp_path / "saved"))
+    np.testing.assert_array_equal(saved_cube["cube"], store_cube["cube"])
+    assert saved_cube["variables"] == oceanic_matching.OCEAN_PARAMETERS
+
+
+
+def test_nearest_cube_matches_equal_store_matches(synthetic_months):
+    ocean_store = oceanic_matching.build_ocean_store(synthetic_months)
+    store_cube = ocean_cube.cube_from_store(ocean_store)
+
+    rng = np.random.default_rng(1)
+    n_rows = 1000
+    ais_df = pd.DataFrame({
+        "lat": rng.uniform(*synthetic_data.LAT_RANGE, n_rows),
+        "lon": rng.uniform(*synthetic_data.LON_RANGE, n_rows),
+        "t": rng.integers(ocean_store[0]["ts_min"], ocean_store[-1]["ts_max"], n_rows),
+    })
+
+    cube_matches = ocean_cube.match_ocean_cube(ais_df, store_cube)
+    store_matches = oceanic_matching.match_ocean(ais_df, ocean_store)
+
+    # the cube holds the parameters in single precision
+    np.testing.assert_array_equal(cube_matches.values, store_matches.values.astype(np.float32))
+    assert cube_matches["hs"].isna().any()
+
+
+
+def test_linear_interpolation_recovers_linear_fields():
+    ts = START_TS + TIME_STEP * np.arange(3)
+    oc_month = grid_month([45.0, 46.0, 47.0], [-5.0, -4.0, -3.0, -2.0], ts, linear_parameters)
+    store_cube = ocean_cube.cube_from_store(oceanic_matching.build_ocean_store([oc_month]))
+
+    rng = np.random.default_rng(2)
+    ais_df = pd.DataFrame({"lat": rng.uniform(45.0, 47.0, 200), "lon": rng.uniform(-5.0, -2.0, 200),
+                           "t": rng.integers(ts[0], ts[-1], 200)})
+
+    interpolated = ocean_cube.match_ocean_cube(ais_df, store_cube, method="linear")
+    expected = np.column_stack(linear_parameters(ais_df["lat"].values, ais_df["lon"].values, ais_df["t"].values))
+
+    np.testing.assert_allclose(interpolated.values, expected, rtol=1e-5)
+
+
+
+def test_linear_interpolation_wraps_direction_and_masks_land():
+    ts = START_TS + TIME_STEP * np.arange(2)
+
+    def parameters(lat, lon, ts):
+        return lat - 44.0, np.where(lon < -4.5, 350.0, 10.0), np.ones(len(lat))
+
+    # the land point leaves one of the four corners of the first cell missing
+    oc_month = grid_month([45.0, 46.0, 47.0], [-5.0, -4.0], ts, parameters, land=[(47.0, -5.0)])
+    store_cube = ocean_cube.cube_from_store(oceanic_matching.build_ocean_store([oc_month]))
+
+    ais_df = pd.DataFrame({"lat": [45.5, 46.5, 46.5], "lon": [-4.5, -5.0, -4.0], "t": [ts[0]] * 3})
+    interpolated = ocean_cube.match_ocean_cube(ais_df, store_cube, method="linear")
+
+    # 350 and 10 degrees blend to 0, not 180
+    direction = interpolated["dir"].values[0]
+    assert min(direction, 360.0 - direction) == pytest.approx(0.0, abs=1e-4)
+    assert interpolated["hs"].values[0] == pytest.approx(1.5)
+
+    # next to the land point only the sea node is blended
+    assert interpolated["hs"].values[1] == pytest.approx(2.0)
+    assert interpolated["hs"].values[2] == pytest.approx(2.5)
+
+
+
+@pytest.mark.parametrize("method", ["nearest", "linear"])
+def test_cube_matches_outside_axes_are_nan(method):
+    ts = START_TS + TIME_STEP * np.arange(3)
+    oc_month = grid_month([45.0, 46.0], [-5.0, -4.0], ts, linear_parameters)
+    store_cube = ocean_cube.cube_from_store(oceanic_matching.build_ocean_store([oc_month]))
+
+    ais_df = pd.DataFrame({
+        "lat": [45.5, 40.0, 45.5, 45.5, 45.5, 46.0],
+        "lon": [-4.5, -4.5, -9.0, -4.5, -4.5, -4.0],
+        "t": [ts[1], ts[1], ts[1], ts[0] - 5 * TIME_STEP, ts[-1] + 5 * TIME_STEP, ts[-1]],
+    })
+
+    ocean_matches = ocean_cube.match_ocean_cube(ais_df, store_cube, method=method)
+
+    # entries inside the axes, up to their ends, are matched
+    assert not ocean_matches.iloc[[0, 5]].isna().any().any()
+    assert ocean_matches.iloc[1:5].isna().all().all()
+
+    # the nearest node's cell extends half a step beyond the end nodes
+    nearest_edge = ocean_cube.match_ocean_cube(pd.DataFrame({"lat": [46.4, 46.6], "lon": [-4.0, -4.0], "t": [ts[0]] * 2}), store_cube)
+    assert list(nearest_edge["hs"].isna()) == [False, True]
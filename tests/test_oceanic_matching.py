@@ -0,0 +1,130 @@
+"""
+Tests of the oceanic matching functions.
+"""
+
+
+### Import libraries ###
+import numpy as np
+import pandas as pd
+import pytest
+
+### Import external functions ###
+import oceanic_matching
+import synthetic_data
+
+
+
+@pytest.fixture(scope="module")
+def ocean_store():
+    rng = np.random.default_rng(0)
+    oc_months = [synthetic_data.generate_ocean_month(month_idx, rng, grid_step=1.0).drop(['dpt', 'wlv'], axis=1)
+                 for month_idx in range(len(synthetic_data.MONTH_STARTS) - 1)]
+
+    return oceanic_matching.build_ocean_store(oc_months)
+
+
+
+@pytest.mark.parametrize("tolerance", [None, 3600])
+def test_match_ocean_equals_per_row_matching(ocean_store, tolerance):
+    rng = np.random.default_rng(1)
+    n_rows = 500
+    ais_df = pd.DataFrame({
+        "lat": rng.uniform(*synthetic_data.LAT_RANGE, n_rows),
+        "lon": rng.uniform(*synthetic_data.LON_RANGE, n_rows),
+        "t": rng.integers(ocean_store[0]["ts_min"], ocean_store[-1]["ts_max"], n_rows),
+    }, index=np.arange(n_rows) * 2)
+
+    # entries before every month, matched to the first only without a tolerance
+    ais_df.iloc[:5, 2] = ocean_store[0]["ts_min"] - 40 * 86400
+
+    ocean_matches = oceanic_matching.match_ocean(ais_df, ocean_store, tolerance)
+    per_row = [oceanic_matching.ocean_parameter_matching(lat, lon, ts, ocean_store, tolerance)
+               for lat, lon, ts in zip(ais_df["lat"].values, ais_df["lon"].values, ais_df["t"].values)]
+
+    np.testing.assert_array_equal(ocean_matches.values, np.array(per_row, dtype=np.float64))
+    assert list(ocean_matches.index) == list(ais_df.index)
+
+    # land points are left unmatched
+    assert ocean_matches["hs"].iloc[5:].isna().any()
+    assert ocean_matches["hs"].iloc[:5].isna().all() == (tolerance is not None)
+
+
+
+def grid_month(lat, lon, ts, land=()):
+    """
+    One month of oceanic data on a regular grid, with hs numbering the points
+    and the (lat, lon) points in land left out.
+
+    """
+
+    grid = pd.MultiIndex.from_product([lat, lon, ts], names=["lat", "lon", "ts"]).to_frame(index=False)
+    grid = grid[[(point_lat, point_lon) not in land for point_lat, point_lon in zip(grid["lat"], grid["lon"])]]
+
+    return grid.assign(hs=np.arange(len(grid), dtype=np.float64), dir=0.0, lm=1.0).reset_index(drop=True)
+
+
+
+def test_ocean_index_metrics_differ_at_high_latitude():
+    ts = np.array([0, 3 * 3600, 6 * 3600]) + 1443657600
+    oc_month = grid_month([60.0, 61.0], [0.0, 1.0, 2.0], ts, land=[(60.0, 1.0)])
+    ocean_store = oceanic_matching.build_ocean_store([oc_month])
+    ais_df = pd.DataFrame({"lat": [60.3], "lon": [0.9], "t": [ts[1]]})
+
+    def matched_point(metric):
+        hs = oceanic_matching.match_ocean_index(ais_df, oceanic_matching.build_ocean_index(ocean_store, metric=metric))["hs"].iloc[0]
+        return tuple(oc_month.loc[oc_month["hs"] == hs, ["lat", "lon"]].iloc[0])
+
+    # a degree of longitude is half a degree of latitude at 60N, so the
+    # great-circle nearest point is across the land point in longitude
+    assert matched_point("euclidean") == (61.0, 1.0)
+    assert matched_point("haversine") == (60.0, 0.0)
+
+
+
+@pytest.mark.parametrize("metric", ["euclidean", "haversine"])
+def test_ocean_index_max_distance_and_k(ocean_store, metric):
+    ocean_index = oceanic_matching.build_ocean_index(ocean_store, metric=metric)
+    month = ocean_store[1]
+    time_step = np.diff(month["ts"]).max()
+    inside = month["table"].dropna().index[:3].to_frame(index=False)
+
+    ais_df = pd.DataFrame({
+        "lat": np.r_[inside["lat"].values, 10.0, inside["lat"].iloc[0]],
+        "lon": np.r_[inside["lon"].values, -40.0, inside["lon"].iloc[0]],
+        "t": np.r_[inside["ts"].values, inside["ts"].iloc[0], ocean_store[-1]["ts_max"] + 10 * time_step],
+    })
+
+    # grid points match themselves, entries far outside the domain or its
+    # time span are left unmatched unless any distance is accepted
+    ocean_matches = oceanic_matching.match_ocean_index(ais_df, ocean_index)
+    np.testing.assert_array_equal(ocean_matches.values[:3], month["table"].loc[list(inside.itertuples(index=False))].values)
+    assert ocean_matches.iloc[3:].isna().all().all()
+    assert not oceanic_matching.match_ocean_index(ais_df, ocean_index, max_distance=np.inf).isna().any().any()
+
+    # neighbours are ordered by distance, the first being the nearest point
+    distances, point_idx = oceanic_matching.query_ocean_index(ocean_index, ais_df["lat"], ais_df["lon"], ais_df["t"], k=3)
+    nearest_distances, nearest_idx = oceanic_matching.query_ocean_index(ocean_index, ais_df["lat"], ais_df["lon"], ais_df["t"])
+    assert distances.shape == (len(ais_df), 3)
+    np.testing.assert_array_equal(point_idx[:, 0], nearest_idx)
+    assert (np.diff(distances[:3], axis=1) >= 0).all() and (distances[:3, 0] == 0).all()
+
+
+
+def test_ocean_index_loaded_for_time_window_matches_full_index(ocean_store, tmp_path):
+    ocean_index = oceanic_matching.build_ocean_index(ocean_store)
+    oceanic_matching.save_ocean_index(ocean_index, str(tmp_path))
+
+    rng = np.random.default_rng(2)
+    month = ocean_store[2]
+    ais_df = pd.DataFrame({
+        "lat": rng.uniform(*synthetic_data.LAT_RANGE, 200),
+        "lon": rng.uniform(*synthetic_data.LON_RANGE, 200),
+        "t": rng.integers(month["ts_min"], month["ts_min"] + 86400, 200),
+    })
+
+    window_index = oceanic_matching.load_ocean_index(str(tmp_path), ts_range=(ais_df["t"].min(), ais_df["t"].max()))
+
+    # only a slice of the mapped points is indexed, with the same matches
+    assert isinstance(window_index["points"], np.memmap) and len(window_index["points"]) < len(ocean_index["tree"].data) / 10
+    pd.testing.assert_frame_equal(oceanic_matching.match_ocean_index(ais_df, window_index),
+                                  oceanic_matching.match_ocean_index(ais_df, ocean_index))
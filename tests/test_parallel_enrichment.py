@@ -0,0 +1,95 @@
+"""
+Tests of the parallel enrichment against the serial matchers.
+"""
+
+
+### Import libraries ###
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from concurrent.futures import ProcessPoolExecutor
+
+### Import external functions ###
+import oceanic_matching
+import ocean_cube
+import parallel_enrichment
+import synthetic_data
+import weather_data_cleaning
+import weather_matching
+
+
+
+@pytest.fixture(scope="module")
+def references():
+    rng = np.random.default_rng(0)
+    static_dataset = synthetic_data.generate_static(20, rng, containership_share=1.0)
+    ais_df = synthetic_data.generate_dynamic_chunk(2000, static_dataset, rng).reset_index(drop=True)
+
+    oc_months = [synthetic_data.generate_ocean_month(month_idx, rng, grid_step=1.0).drop(['dpt', 'wlv'], axis=1)
+                 for month_idx in range(len(synthetic_data.MONTH_STARTS) - 1)]
+    ocean_store = oceanic_matching.build_ocean_store(oc_months)
+
+    weather_observation, weather_stations, _ = synthetic_data.generate_weather(10, rng)
+    weather_final = weather_data_cleaning.add_weather_coordinates(weather_observation, weather_stations)
+
+    return ais_df, ocean_store, weather_matching.build_station_index(weather_final)
+
+
+
+@pytest.mark.parametrize("ocean_method", ["nearest", "linear"])
+@pytest.mark.parametrize("weather_method", ["nearest", "idw"])
+def test_parallel_enrichment_matches_serial(references, tmp_path, ocean_method, weather_method):
+    ais_df, ocean_store, station_index = references
+    if ocean_method == "linear":
+        ocean_reference = ocean_cube.cube_from_store(ocean_store)
+    else:
+        ocean_reference = oceanic_matching.build_ocean_index(ocean_store)
+
+    serial = parallel_enrichment.combine_matches(
+        parallel_enrichment.match_ocean_reference(ais_df, ocean_reference, ocean_method),
+        parallel_enrichment.match_weather_reference(ais_df, station_index, weather_method))
+
+    for n_workers in [1, 2]:
+        enrichment = parallel_enrichment.enrich_with_references(ais_df, ocean_reference, station_index, tmp_path, n_workers,
+                                                                ocean_method=ocean_method, weather_method=weather_method)
+        pd.testing.assert_frame_equal(enrichment, serial)
+
+
+
+def worker_reference_maps(_):
+    """
+    Report how a worker holds its references: which arrays are memory-mapped,
+    whether its KD-tree uses the mapped points and its process id.
+
+    """
+
+    ocean_index = parallel_enrichment.WORKER_REFERENCES["ocean"]
+    observations = parallel_enrichment.WORKER_REFERENCES["station_index"]["observations"]
+
+    return (isinstance(ocean_index["points"], np.memmap), isinstance(ocean_index["parameters"], np.memmap),
+            np.shares_memory(ocean_index["tree"].data, ocean_index["points"]),
+            all(isinstance(observations[field].values, np.memmap) for field in observations.columns if observations[field].dtype.kind in "fiu"),
+            os.getpid())
+
+
+
+def test_workers_map_references_rather_than_copy(references, tmp_path):
+    ais_df, ocean_store, station_index = references
+    ocean_index = oceanic_matching.build_ocean_index(ocean_store)
+    ocean_dir, reference_dir = str(tmp_path / "ocean"), str(tmp_path / "weather")
+    parallel_enrichment.write_ocean_reference(ocean_index, ocean_dir)
+    parallel_enrichment.write_weather_reference(station_index, reference_dir)
+
+    # only .npy files and the index settings are written, nothing pickled
+    assert all(filename.endswith((".npy", ".json")) for filename in os.listdir(ocean_dir))
+
+    with ProcessPoolExecutor(max_workers=2, initializer=parallel_enrichment.init_worker, initargs=(ocean_dir, reference_dir)) as pool:
+        worker_maps = list(pool.map(worker_reference_maps, range(4)))
+
+    assert all(worker_map[:4] == (True, True, True, True) for worker_map in worker_maps)
+    assert os.getpid() not in [worker_map[4] for worker_map in worker_maps]
+
+    # the mapped index matches as the one it was saved from
+    mapped_index = parallel_enrichment.load_ocean_reference(ocean_dir)
+    pd.testing.assert_frame_equal(oceanic_matching.match_ocean_index(ais_df, mapped_index), oceanic_matching.match_ocean_index(ais_df, ocean_index))
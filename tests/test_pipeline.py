@@ -0,0 +1,107 @@
+"""
+Tests of the checkpointing pipeline runner.
+"""
+
+
+### Import libraries ###
+import os
+import sys
+import importlib
+import pandas as pd
+import pytest
+
+### Import external functions ###
+import pipeline
+
+
+# names of the stages run, in order
+CALLS = []
+
+
+
+def scale(table, factor=2):
+    CALLS.append("scale")
+    return table * factor
+
+
+
+def add_one(table):
+    CALLS.append("add one")
+    return table + 1
+
+
+
+def fail(table):
+    raise RuntimeError("stage failed")
+
+
+
+def run_stages(checkpoint_dir, factor=2, last_stage=add_one):
+    runner = pipeline.new_runner(str(checkpoint_dir))
+    table = pd.DataFrame({"value": [1.0, 2.0, 3.0]})
+
+    scaled = pipeline.run_stage(runner, "scale", scale, table, factor=factor)
+    unrelated = pipeline.run_stage(runner, "unrelated", add_one, table)
+    output = pipeline.run_stage(runner, "last", last_stage, scaled)
+
+    return runner, unrelated, output
+
+
+
+def test_unchanged_stages_loaded_from_checkpoints(tmp_path):
+    CALLS.clear()
+    _, _, first_output = run_stages(tmp_path)
+    runner, _, output = run_stages(tmp_path)
+
+    assert runner["executed"] == [] and runner["skipped"] == ["scale", "unrelated", "last"]
+    assert CALLS == ["scale", "add one", "add one"]
+    pd.testing.assert_frame_equal(output, first_output)
+
+
+
+def test_parameter_change_reruns_stage_and_downstream(tmp_path):
+    run_stages(tmp_path)
+    CALLS.clear()
+    runner, _, output = run_stages(tmp_path, factor=3)
+
+    assert runner["executed"] == ["scale", "last"] and runner["skipped"] == ["unrelated"]
+    assert output["value"].tolist() == [4.0, 7.0, 10.0]
+
+    # each stage keeps only its latest checkpoint
+    assert sorted(checkpoint.rsplit("-", 1)[0] for checkpoint in os.listdir(tmp_path)) == ["last", "scale", "unrelated"]
+
+
+
+def test_failed_run_resumes_from_completed_stages(tmp_path):
+    with pytest.raises(RuntimeError):
+        run_stages(tmp_path, last_stage=fail)
+
+    runner, _, output = run_stages(tmp_path)
+
+    assert runner["executed"] == ["last"] and runner["skipped"] == ["scale", "unrelated"]
+    assert output["value"].tolist() == [3.0, 5.0, 7.0]
+
+
+
+def test_module_edits_rerun_dependent_stages(tmp_path, monkeypatch):
+    module_dir = tmp_path / "modules"
+    module_dir.mkdir()
+    (module_dir / "stage_module.py").write_text("OFFSET = 1\n\ndef offset(table):\n    return table + OFFSET\n")
+    monkeypatch.syspath_prepend(str(module_dir))
+    stage_module = importlib.import_module("stage_module")
+
+    def run(checkpoint_dir):
+        runner = pipeline.new_runner(str(checkpoint_dir))
+        table = pd.DataFrame({"value": [1.0]})
+        pipeline.run_stage(runner, "offset", stage_module.offset, table)
+        pipeline.run_stage(runner, "scale", scale, table, depends_on=[stage_module])
+        return runner
+
+    assert run(tmp_path / "checkpoints")["executed"] == ["offset", "scale"]
+    assert run(tmp_path / "checkpoints")["executed"] == []
+
+    # a changed module constant re-runs the stages of and depending on it
+    (module_dir / "stage_module.py").write_text("OFFSET = 10\n\ndef offset(table):\n    return table + OFFSET\n")
+    assert run(tmp_path / "checkpoints")["executed"] == ["offset", "scale"]
+
+    sys.modules.pop("stage_module")
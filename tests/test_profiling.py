@@ -0,0 +1,31 @@
+"""
+Tests of the per-stage profiling records.
+"""
+
+
+### Import libraries ###
+import numpy as np
+
+### Import external functions ###
+import profiling
+
+
+
+def test_stage_records_resident_memory_change():
+    profiling.enable_profiling()
+
+    stage_record = profiling.start_stage("allocate", ())
+    allocated = np.ones(2 ** 25)
+    profiling.finish_stage(stage_record, allocated)
+
+    stage_record = profiling.start_stage("free", ())
+    del allocated
+    profiling.finish_stage(stage_record, None)
+
+    profiling.disable_profiling()
+    allocate_record, free_record = profiling.PROFILING["stages"]
+
+    # 256 MB allocated then freed, while the process peak keeps its maximum
+    assert allocate_record["rss_delta_mb"] > 200
+    assert free_record["rss_delta_mb"] < -200
+    assert free_record["process_peak_rss_mb"] >= allocate_record["process_peak_rss_mb"]
@@ -0,0 +1,44 @@
+"""
+Tests of the declared field types and their application.
+"""
+
+
+### Import libraries ###
+import warnings
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+import data_cache
+import schema
+
+
+
+def test_cached_read_parses_and_caches_declared_types(tmp_path):
+    filename = str(tmp_path / "ocean.csv")
+    pd.DataFrame({"lon": [-8.0, -7.5], "lat": [45.0, 45.5], "hs": [0.64, 1.27], "dir": [158.7, 12.0],
+                  "lm": [25.0, 3.0], "ts": [1443654000, 1443664800], "id_windDirection": [3, None]}).to_csv(filename, index=False)
+    field_schema = dict(schema.OCEAN_SCHEMA, id_windDirection=np.uint8)
+
+    missed = data_cache.cached_read_csv(filename, field_schema=field_schema)
+    hit = data_cache.cached_read_csv(filename, field_schema=field_schema)
+
+    # an integer field with a missing value falls back to float32
+    expected_types = dict(field_schema, id_windDirection=np.float32)
+    assert {field: np.dtype(field_type) for field, field_type in expected_types.items()} == dict(missed.dtypes)
+    pd.testing.assert_frame_equal(hit, missed)
+    pd.testing.assert_frame_equal(missed, schema.apply_schema(pd.read_csv(filename), field_schema))
+
+    # reads without the schema keep their own entry and the parsed types
+    assert data_cache.cached_read_csv(filename)["hs"].dtype == np.float64
+
+
+
+def test_empty_frames_take_declared_types_without_warning():
+    empty_batch = pd.DataFrame({"sourcemmsi": np.array([], dtype=np.int64), "volume": np.array([], dtype=object)})
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        compact_batch = schema.apply_schema(empty_batch, schema.AIS_DYNAMIC_SCHEMA)
+
+    assert (compact_batch["sourcemmsi"].dtype, compact_batch["volume"].dtype) == (np.uint32, np.float32)
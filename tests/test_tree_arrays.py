@@ -0,0 +1,41 @@
+"""
+Tests of compiled tree predictions against sklearn.
+"""
+
+
+### Import libraries ###
+import numpy as np
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.ensemble import RandomForestRegressor
+
+### Import external functions ###
+import tree_arrays
+
+
+
+def test_compiled_predictions_match_sklearn(tmp_path):
+    rng = np.random.default_rng(0)
+
+    # mix of continuous, rounded and discrete features, as in the AIS features
+    def synthetic_features(n_rows):
+        return np.column_stack([rng.uniform(0, 360, n_rows), np.round(rng.normal(2, 0.8, n_rows), 2),
+                                rng.integers(1, 17, n_rows), np.round(rng.normal(10, 3, n_rows), 1)])
+
+    X_train, X_predict = synthetic_features(5000), synthetic_features(20000)
+    y_train = 12 + np.sin(np.radians(X_train[:, 0])) - 0.5 * X_train[:, 1] + rng.normal(0, 1, len(X_train))
+
+    # entries equal to the training values, where thresholds matter most
+    X_predict[:5000] = X_train
+
+    estimators = [DecisionTreeRegressor(min_samples_split=4, min_samples_leaf=3, random_state=0),
+                  RandomForestRegressor(n_estimators=5, min_samples_leaf=3, max_samples=0.5, random_state=0)]
+
+    for estimator_idx, estimator in enumerate(estimators):
+        estimator.fit(X_train, y_train)
+        tree_dir = str(tmp_path / str(estimator_idx))
+        tree_arrays.save_tree_arrays(tree_arrays.compile_trees(estimator), tree_dir)
+
+        # chunks smaller than the entries, to cover chunk boundaries
+        predictions = tree_arrays.predict_tree_arrays(tree_arrays.load_tree_arrays(tree_dir), X_predict, chunk_rows=7000)
+
+        np.testing.assert_array_equal(predictions, estimator.predict(X_predict))
@@ -0,0 +1,30 @@
+"""
+Tests of the assignment of AIS timestamps to oceanic partitions.
+"""
+
+
+### Import libraries ###
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+import ts_by_month
+
+
+
+def test_assign_partitions_empty_catalogue():
+    catalogue = pd.DataFrame({"partition": np.array([], dtype=int), "ts_min": np.array([], dtype=np.int64),
+                              "ts_max": np.array([], dtype=np.int64)})
+
+    partition = ts_by_month.assign_partitions(catalogue, np.array([0, 100, 200]))
+
+    assert list(partition) == [-1, -1, -1]
+
+
+
+def test_assign_partitions_gap_tolerance():
+    catalogue = pd.DataFrame({"partition": [0, 1], "ts_min": [0, 1000], "ts_max": [500, 1500]})
+
+    partition = ts_by_month.assign_partitions(catalogue, np.array([-50, 250, 600, 950, 2000]), tolerance=100)
+
+    assert list(partition) == [0, 0, 0, 1, -1]
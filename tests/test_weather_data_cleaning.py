@@ -0,0 +1,60 @@
+"""
+Tests of the weather station dimension and coordinate join.
+"""
+
+
+### Import libraries ###
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+### Import external functions ###
+import data_cache
+import weather_data_cleaning
+
+
+
+def observations(id_station):
+    n_rows = len(id_station)
+
+    return pd.DataFrame({"id_station": id_station, "local_time": ["2015-10-01 00:00:00"] * n_rows,
+                         **{field: np.zeros(n_rows) for field in ["Tn", "Tx", "U", "ff10", "ff3", "VV", "Td", "RRR", "tR", "Ff"]}})
+
+
+
+def test_station_dimension_read_through_cache(tmp_path):
+    weather_stations_filename = str(tmp_path / "stations.csv")
+    pd.DataFrame({"id_station": [7, 8, 7], "name": ["A", "B", "C"],
+                  "latitude": [45.0, 46.0, 50.0], "longitude": [-1.0, -2.0, -3.0]}).to_csv(weather_stations_filename, index=False)
+
+    hits, misses = data_cache.CACHE_STATS["hits"], data_cache.CACHE_STATS["misses"]
+    station_dimension = weather_data_cleaning.load_station_dimension(weather_stations_filename)
+    cached_dimension = weather_data_cleaning.load_station_dimension(weather_stations_filename)
+
+    # the first entry of a repeated station is kept
+    assert list(station_dimension.columns) == weather_data_cleaning.STATION_FIELDS
+    assert station_dimension["latitude"].tolist() == [45.0, 46.0]
+    pd.testing.assert_frame_equal(cached_dimension, station_dimension)
+    assert (data_cache.CACHE_STATS["hits"] - hits, data_cache.CACHE_STATS["misses"] - misses) == (1, 1)
+
+    # a changed CSV restored with its old modification time is read again
+    file_stat = os.stat(weather_stations_filename)
+    pd.DataFrame({"id_station": [7], "latitude": [44.0], "longitude": [0.0]}).to_csv(weather_stations_filename, index=False)
+    os.utime(weather_stations_filename, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns))
+
+    assert weather_data_cleaning.load_station_dimension(weather_stations_filename)["latitude"].tolist() == [44.0]
+
+
+
+def test_weather_coordinates_joined_on_station_with_unknown_warning():
+    weather_stations = pd.DataFrame({"id_station": [7, 8], "latitude": [45.0, 46.0], "longitude": [-1.0, -2.0]})
+    weather_observation = observations([8, 9, 7, 9]).set_index(np.arange(4) * 10)
+
+    with pytest.warns(UserWarning, match="2 weather observations from 1 unknown stations: \\[9\\]"):
+        weather_final = weather_data_cleaning.add_weather_coordinates(weather_observation, weather_stations)
+
+    np.testing.assert_array_equal(weather_final["latitude"].values, [46.0, np.nan, 45.0, np.nan])
+    np.testing.assert_array_equal(weather_final["longitude"].values, [-2.0, np.nan, -1.0, np.nan])
+    assert list(weather_final.index) == [0, 10, 20, 30]
+    assert "id_station" not in weather_final.columns and "Ff" in weather_final.columns
@@ -0,0 +1,103 @@
+"""
+Tests of the weather matching functions.
+"""
+
+
+### Import libraries ###
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+import weather_matching
+
+
+
+def test_weather_timestamps_localised_to_station_timezone():
+    local_time = ["2015-10-01 02:00:00", "2016-01-10 12:00:00"]
+
+    utc_ts = weather_matching.weather_timestamps(local_time, "UTC")
+    paris_ts = weather_matching.weather_timestamps(local_time)
+
+    # summer and winter time in Paris are 2 and 1 hours ahead of UTC
+    assert list(utc_ts - paris_ts) == [7200, 3600]
+
+
+
+def test_weather_timestamps_per_observation_timezone():
+    local_time = pd.Series(["2016-01-10 12:00:00"] * 2, index=[3, 4])
+    timezone = pd.Series(["Europe/London", "Europe/Paris"], index=[3, 4])
+
+    weather_ts = weather_matching.weather_timestamps(local_time, timezone)
+
+    assert weather_ts[0] - weather_ts[1] == 3600
+
+
+
+def test_weather_timestamps_numeric_unchanged():
+    assert list(weather_matching.weather_timestamps(np.array([10, 20]))) == [10, 20]
+
+
+
+def test_wind_direction_bearings_from_table_names():
+    weather_wind_direction = pd.DataFrame({"id_windDirection": [1, 2, 3, 4, 5, 6],
+                                           "name": ["Calme", "Nord", "Nord-Nord-Est", "Ouest-Sud-Ouest", "Variable", "NW"]})
+
+    wind_bearings = weather_matching.wind_direction_bearings(weather_wind_direction)
+
+    np.testing.assert_array_equal(wind_bearings, [np.nan, np.nan, 0.0, 22.5, 247.5, np.nan, 315.0])
+    np.testing.assert_array_equal(weather_matching.wind_direction_bearings(), np.r_[np.nan, np.arange(16) * 22.5])
+
+
+
+def test_wind_blend_leaves_out_codes_without_bearing():
+    wind_bearings = weather_matching.wind_direction_bearings(pd.DataFrame({"id_windDirection": [1, 2, 3, 4],
+                                                                           "name": ["Calme", "N", "E", "NNW"]}))
+    wind_ID = np.array([[1.0, 2.0, 3.0],
+                        [2.0, 4.0, 1.0],
+                        [1.0, 1.0, np.nan],
+                        [np.nan, np.nan, np.nan]])
+    weight = np.array([[10.0, 2.0, 1.0],
+                       [1.0, 3.0, 10.0],
+                       [1.0, 2.0, 0.0],
+                       [1.0, 1.0, 1.0]])
+
+    blended_ID = weather_matching.blend_wind_direction(wind_ID, weight, wind_bearings)
+
+    # calm is left out of blends with directional codes, and kept alone
+    np.testing.assert_array_equal(blended_ID, [2.0, 4.0, 1.0, np.nan])
+
+
+
+def test_interpolation_without_observations_gives_nan():
+    weather_final = pd.DataFrame({"latitude": pd.Series(dtype=np.float64), "longitude": pd.Series(dtype=np.float64),
+                                  "local_time": pd.Series(dtype=np.int64), "id_windDirection": pd.Series(dtype=np.float64),
+                                  "Ff": pd.Series(dtype=np.float64), "P": pd.Series(dtype=np.float64), "T": pd.Series(dtype=np.float64)})
+    station_index = weather_matching.build_station_index(weather_final)
+
+    matched = weather_matching.interpolate_observations(station_index, np.array([0, -1]), np.array([0, 3600]))
+
+    assert matched.shape == (2, len(weather_matching.WEATHER_PARAMETERS))
+    assert np.isnan(matched).all()
+
+
+
+def test_wind_codes_without_bearing_give_nan():
+    wind_bearings = weather_matching.wind_direction_bearings(pd.DataFrame({"id_windDirection": [1, 2], "name": ["Calme", "Variable"]}))
+
+    np.testing.assert_array_equal(weather_matching.degrees_to_wind_id(np.array([0.0, 90.0, np.nan]), wind_bearings), [np.nan] * 3)
+    np.testing.assert_array_equal(weather_matching.blend_wind_direction(np.array([[1.0, 2.0], [np.nan, np.nan]]), np.ones((2, 2)), wind_bearings),
+                                  [1.0, np.nan])
+
+
+
+def test_idw_matching_of_empty_frame():
+    weather_final = pd.DataFrame({"latitude": [45.0, 46.0], "longitude": [-5.0, -4.0], "local_time": [1443657600, 1443657600],
+                                  "id_windDirection": [2.0, 3.0], "Ff": [5.0, 7.0], "P": [101000.0, 100900.0], "T": [285.0, 286.0]})
+    station_index = weather_matching.build_station_index(weather_final)
+    ais_df = pd.DataFrame({"lat": pd.Series(dtype=np.float64), "lon": pd.Series(dtype=np.float64), "t": pd.Series(dtype=np.int64)})
+
+    distance_km, station = weather_matching.query_stations(station_index, ais_df["lat"], ais_df["lon"], k=4)
+    assert distance_km.shape == station.shape == (0, 4)
+
+    weather_matches = weather_matching.match_weather_idw(ais_df, station_index)
+    assert len(weather_matches) == 0 and list(weather_matches.columns) == list(weather_matching.match_weather(ais_df, station_index).columns)
@@ -1,31 +1,148 @@
 """
-oc_data_cleaning.py
+ts_by_month.py
 
-Script to clean oceanic data. Steps include...
+Script to catalogue the time partitions of the oceanic data. Steps include...
 
         X.1     Get timestamp values corresponding to beginning and end of each
-                month.
-        X.2     Combine into array of timestamps.
+                partition (e.g. month) from any number of datasets, files or
+                time ranges.
+        X.2     Combine into a catalogue of partitions sorted by start time.
+        X.3     Assign whole batches of AIS timestamps to their partitions.
 
 
 A full description of the research and references used can be found in README.md
 """
 
-def oc_data_cleaning(oc_oct, oc_nov, oc_dec, oc_jan, oc_feb, oc_mar):
+
+### Import libraries ###
+import numpy as np
+import pandas as pd
+
+
+
+def partition_catalogue(ts_ranges):
+    """
+    X.2 Combine (start, end) timestamp ranges into a catalogue sorted by start
+    time.
+
+    Input:
+
+            ts_ranges       list of (ts_min, ts_max) pairs, one per
+                            partition, in any order.
+
+    Output:
+
+            catalogue       dataframe of partition (position in ts_ranges),
+                            ts_min and ts_max, sorted by ts_min.
+
+    """
+
+    catalogue = pd.DataFrame(list(ts_ranges), columns=["ts_min", "ts_max"])
+    catalogue.insert(0, "partition", np.arange(len(catalogue)))
+
+    catalogue = catalogue.sort_values("ts_min", kind="stable").reset_index(drop=True)
+
+    return catalogue
+
+
+
+def oc_data_cleaning(oc_datasets):
+    """
+    X.1 Get timestamp values corresponding to beginning and end of each
+    oceanic dataset and catalogue them.
+
+    Input:
+
+            oc_datasets     list of oceanic datasets (e.g. one per month).
+
+    Output:
+
+            catalogue       dataframe of partition, ts_min and ts_max sorted
+                            by ts_min.
+
+    """
+
+    # take min and max timestamps for each oceanic dataset
+    ts_ranges = [(oc_data["ts"].min(), oc_data["ts"].max()) for oc_data in oc_datasets]
+
+    return partition_catalogue(ts_ranges)
+
+
+
+def catalogue_from_files(oc_filenames):
+    """
+    X.1 Catalogue oceanic dataset files by reading only their timestamp field.
+
+    Input:
+
+            oc_filenames    list of oceanic dataset filenames.
+
+    Output:
+
+            catalogue       dataframe of partition, ts_min and ts_max sorted
+                            by ts_min, with the filename of each partition.
+
+    """
+
+    ts_ranges = []
+    for oc_filename in oc_filenames:
+        oc_ts = pd.read_csv(oc_filename, usecols=["ts"])["ts"]
+        ts_ranges.append((oc_ts.min(), oc_ts.max()))
+
+    catalogue = partition_catalogue(ts_ranges)
+    catalogue["filename"] = np.asarray(oc_filenames, dtype=object)[catalogue["partition"].values]
+
+    return catalogue
+
+
+
+def assign_partitions(catalogue, AIS_ts, tolerance=None):
     """
-    Get timestamp values corresponding to beginning and end of each month.
+    X.3 Assign AIS timestamps to the partition covering them using a binary
+    search over the sorted partition start times. Timestamps in a gap between
+    partitions, or beyond either end, go to the partition with the closest
+    bound provided it lies within the tolerance.
+
+    Input:
+
+            catalogue       dataframe of partition, ts_min and ts_max sorted
+                            by ts_min.
+            AIS_ts          timestamp(s) of AIS entries.
+            tolerance       largest distance (s) outside a partition's bounds
+                            still assigned to it, None for no limit.
+
+    Output:
+
+            partition       catalogue partition of each entry, -1 where
+                            unassigned (every entry for an empty
+                            catalogue).
 
     """
 
-    # take min and max timestamps for monthly oceanic datasets
-    ts_oct_min, ts_oct_max = min(oc_oct["ts"]), max(oc_oct["ts"]) # 1443654000 to 1446321600
-    ts_nov_min, ts_nov_max = min(oc_nov["ts"]), max(oc_nov["ts"]) # 1446332400 to 1448913600
-    ts_dec_min, ts_dec_max = min(oc_dec["ts"]), max(oc_dec["ts"]) # 1448924400 to 1451592000
-    ts_jan_min, ts_jan_max = min(oc_jan["ts"]), max(oc_jan["ts"]) # 1446332400 to 1448913600
-    ts_feb_min, ts_feb_max = min(oc_feb["ts"]), max(oc_feb["ts"]) # 1454281200 to 1456776000
-    ts_mar_min, ts_mar_max = min(oc_mar["ts"]), max(oc_mar["ts"]) # 1456786800 to 1459454400
+    AIS_ts = np.asarray(AIS_ts)
+
+    # no partition to assign to
+    if len(catalogue) == 0:
+        return np.full(AIS_ts.shape, -1)
+
+    ts_min = catalogue["ts_min"].values
+    ts_max = catalogue["ts_max"].values
+
+    # latest starting partition at or before each timestamp
+    position = np.searchsorted(ts_min, AIS_ts, side="right") - 1
+    before = np.clip(position, 0, len(catalogue) - 1)
+    after = np.clip(position + 1, 0, len(catalogue) - 1)
+
+    # distance outside the bounds of the partitions either side
+    gap_before = np.where(position >= 0, np.maximum(AIS_ts - ts_max[before], 0), np.inf)
+    gap_after = np.where(position + 1 < len(catalogue), ts_min[after] - AIS_ts, np.inf)
+
+    position = np.where(gap_before <= gap_after, before, after)
+    gap = np.minimum(gap_before, gap_after)
+
+    partition = catalogue["partition"].values[position]
 
-    # combine into timestamp object
-    month_ts_array = np.array(ts_oct_min, ts_oct_max, ts_nov_min, ts_nov_max, ts_dec_min, ts_dec_max, ts_jan_min, ts_jan_max, ts_feb_min, ts_feb_max, ts_mar_min, ts_mar_max)
+    if tolerance is not None:
+        partition = np.where(gap <= tolerance, partition, -1)
 
-    return month_ts_array
+    return partition
@@ -5,6 +5,8 @@ Function to join dynamic and static weather datasets. Steps include...
 
         X.1     combine station latitude and longitude from static dataset with
                 dynamic dataset.
+        X.2     build a compact station dimension table keyed on id_station,
+                reading the stations through the columnar cache.
 
 
 A full description of the research and references used can be found in README.md
@@ -12,38 +14,110 @@ A full description of the research and references used can be found in README.md
 """
 
 
+### Import libraries ###
+import warnings
+import numpy as np
+import pandas as pd
+
+### Import external functions ###
+import data_cache
+
+
+# fields kept in the station dimension table
+STATION_FIELDS = ["id_station", "latitude", "longitude"]
+
+
+
+def build_station_dimension(weather_stations):
+    """
+    X.2 Reduce the static weather_stations dataset to a compact dimension
+    table of station id and coordinates, one row per station.
+
+    Input:
+
+            weather_stations            static weather station dataset.
+
+    Output:
+
+            station_dimension           dataframe of id_station, latitude and
+                                        longitude with unique id_station.
+
+    """
+
+    # keep the first entry of any repeated station
+    station_dimension = weather_stations[STATION_FIELDS].drop_duplicates(subset="id_station")
+
+    station_dimension = pd.DataFrame({
+        "id_station": station_dimension["id_station"].values,
+        "latitude": station_dimension["latitude"].values.astype(np.float64),
+        "longitude": station_dimension["longitude"].values.astype(np.float64),
+    })
+
+    return station_dimension
+
+
+
+def load_station_dimension(weather_stations_filename, cache_dir=None, content_hash=False):
+    """
+    X.2 Load the station dimension table, reading only the station fields of
+    the CSV through the columnar cache (see data_cache.cached_read_csv).
+
+    Input:
+
+            weather_stations_filename   static weather station dataset (CSV).
+            cache_dir                   cache directory, defaults to '.cache'
+                                        next to the CSV.
+            content_hash                fingerprint the CSV contents rather
+                                        than its modification time.
+
+    Output:
+
+            station_dimension           dataframe of id_station, latitude and
+                                        longitude with unique id_station.
+
+    """
+
+    weather_stations = data_cache.cached_read_csv(weather_stations_filename, cache_dir=cache_dir, content_hash=content_hash, usecols=STATION_FIELDS)
+    station_dimension = build_station_dimension(weather_stations)
+
+    return station_dimension
+
+
+
 def add_weather_coordinates(weather_observation, weather_stations):
     """
     X.1 Add latitude and longitude coordinates to dynamic weather observations
-    from static weather_stations dataset.
+    from static weather_stations dataset, joined on id_station. Observations
+    from stations missing from weather_stations are reported with a warning
+    and given NaN coordinates.
 
     Input:
 
-            weather_observation         ...
-            weather_stations            ...
+            weather_observation         dynamic weather observations.
+            weather_stations            static weather station dataset or
+                                        station dimension table.
 
     Output:
 
-            weather_final               ...
+            weather_final               weather observations with station
+                                        coordinates.
 
     """
 
-    # define empty latitude and longitude arrays
-    latitude = np.zeros(len(weather_observation))
-    longitude = np.zeros(len(weather_observation))
-
-    # iterate through weather observations and assign coordinates
-    for row in range(len(weather_observation)):
+    # use id_station as key between datasets
+    station_dimension = build_station_dimension(weather_stations).set_index("id_station")
+    station_coordinates = station_dimension.reindex(weather_observation["id_station"].values)
 
-        # use id_station as key between datasets
-        temp_weather_df = weather_stations[weather_stations["id_station"] == weather_observation["id_station"][row]]
-        # assign coordinate values to empty lat and lon arrays
-        latitude[row] = temp_weather_df["latitude"].values[0]
-        longitude[row] = temp_weather_df["longitude"].values[0]
+    # report observations from unknown stations
+    unknown = ~weather_observation["id_station"].isin(station_dimension.index).values
+    if unknown.any():
+        unknown_ids = np.unique(weather_observation["id_station"].values[unknown])
+        warnings.warn("%d weather observations from %d unknown stations: %s" % (unknown.sum(), len(unknown_ids), unknown_ids[:10].tolist()))
 
     # add derived data series to weather_observation dataframe
-    weather_observation["latitude"] = weather_latitude
-    weather_observation["longitude"] = weather_longitude
+    weather_observation = weather_observation.copy()
+    weather_observation["latitude"] = station_coordinates["latitude"].values
+    weather_observation["longitude"] = station_coordinates["longitude"].values
 
     # drop unnecessary fields
     weather_final = weather_observation.drop(["id_station", "Tn", "Tx", "U", "ff10", "ff3", "VV", "Td", "RRR", "tR"], axis=1)
@@ -1,15 +1,68 @@
 """
-compile_datasets.py
-
-Script to compile xxx. Steps include...
-
-        X.1
+weather_matching.py
+
+Script to match dynamic AIS samples with closest matching weather variables.
+Steps include...
+
+        X.1     Find nearest weather elements to a single AIS entry,
+                optionally through a lookup cache keyed on the nearest
+                station coordinates and observation time (see
+                lookup_cache.py).
+        X.2     Build a spatial index over the unique weather stations.
+        X.3     Match a whole AIS dataset with its weather parameters by
+                nearest station and an as-of join on observation time.
+        X.4     Alternatively, blend the k nearest stations within a search
+                radius by inverse great-circle distance weighting, with wind
+                direction averaged on the circle using the bearings of the
+                wind direction table (codes without a bearing, such as calm
+                or variable, are left out of the average).
+        X.5     Optionally, interpolate each station's observations linearly
+                in time between the reports bracketing each AIS entry, unless
+                they are further apart than a staleness limit.
 
 
 A full description of the research and references used can be found in README.md
 """
 
 
+### Import libraries ###
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+### Import external functions ###
+import lookup_cache
+from oceanic_matching import EARTH_RADIUS_KM
+
+
+# weather parameters returned by the matching functions
+WEATHER_PARAMETERS = ["id_windDirection", "Ff", "P", "T"]
+
+# default number of stations blended, largest great-circle distance (km) to
+# a blended station and power of the inverse distance weights
+WEATHER_K_NEAREST = 4
+WEATHER_MAX_RADIUS_KM = 100.0
+IDW_POWER = 2.0
+
+# longest time (s) between two reports still interpolated between
+WEATHER_MAX_GAP = 6 * 3600
+
+# compass points in clockwise order from north, used to read the bearings of
+# the wind direction table's names and, without a table, numbered from 1 as
+# id_windDirection
+COMPASS_POINTS = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE",
+                  "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
+
+# words of compass point names (English and French) and their abbreviations,
+# replaced in this order
+COMPASS_WORDS = [("OUEST", "W"), ("NORTH", "N"), ("NORD", "N"), ("SOUTH", "S"), ("SUD", "S"),
+                 ("EAST", "E"), ("EST", "E"), ("WEST", "W")]
+
+# time zone of the stations' local observation times, used unless the
+# weather dataset gives each station's own "timezone"
+STATION_TIMEZONE = "Europe/Paris"
+
+
 def find_nearest_element(array, value):
     """
     Function to find nearest element in an array.
@@ -37,7 +90,19 @@ def find_nearest_element(array, value):
 
 
 
-def find_nearest_weather_element(weather_final, AIS_lat, AIS_lon, AIS_ts):
+def observation_timestamps(weather_final):
+    """
+    X.1 Convert the observation times of a weather dataset into UTC
+    timestamps (s), in each station's time zone if given (see
+    weather_timestamps).
+
+    """
+
+    return weather_timestamps(weather_final["local_time"].values, weather_final.get("timezone", STATION_TIMEZONE))
+
+
+
+def find_nearest_weather_element(weather_final, AIS_lat, AIS_lon, AIS_ts, weather_ts=None):
     """
     Find elements in dataset of weather variables closest to experimental values
     and return them.
@@ -47,6 +112,8 @@ def find_nearest_weather_element(weather_final, AIS_lat, AIS_lon, AIS_ts):
             AIS_lat
             AIS_lon
             AIS_ts
+            weather_ts      observation timestamps (see
+                            observation_timestamps), parsed here if None.
 
     Output:
 
@@ -56,45 +123,733 @@ def find_nearest_weather_element(weather_final, AIS_lat, AIS_lon, AIS_ts):
 
     """
 
+    if weather_ts is None:
+        weather_ts = observation_timestamps(weather_final)
+
     # find nearest elements in weather datasets
     weather_lat = find_nearest_element(weather_final["latitude"].values, AIS_lat)
     weather_lon = find_nearest_element(weather_final["longitude"].values, AIS_lon)
-    weather_ts = find_nearest_element(weather_final["latitude"].values, AIS_ts)
+    weather_ts = find_nearest_element(weather_ts, AIS_ts)
 
     return weather_lat, weather_lon, weather_ts
 
 
 
+def weather_axes(weather_final, weather_ts=None):
+    """
+    X.1 Return the station coordinate and observation time axes searched by
+    weather lookups (see lookup_cache.source_axes).
+
+    """
+
+    if weather_ts is None:
+        weather_ts = observation_timestamps(weather_final)
+
+    return [lookup_cache.source_axes(weather_final["latitude"].values, weather_final["longitude"].values, weather_ts)]
+
 
-def weather_parameter_matching(AIS_lat, AIS_lon, AIS_ts, weather_final):
+
+def weather_parameter_matching(AIS_lat, AIS_lon, AIS_ts, weather_final, cache=None, weather_ts=None):
+    """
+    X.1 Use coordinates and timestamp from an AIS entry and return closest
+    matching weather variables.
+
+    Inputs:
+
+            AIS_lat        latitude of AIS entry.
+            AIS_lon        longitude of AIS entry.
+            AIS_ts         timestamp of AIS entry.
+            weather_final  weather observations with latitude, longitude,
+                           local_time and weather parameters.
+            cache          lookup cache shared between entries, None to
+                           search for every entry. Entries nearest the same
+                           station coordinates and observation time share
+                           one search.
+            weather_ts     observation timestamps (see
+                           observation_timestamps), parsed here if None.
+                           Pass them when matching many entries so they are
+                           parsed once rather than for every entry.
+
+    Outputs:
+
+            weather_wind_ID     wind direction.
+            weather_Ff          mean wind speed.
+            weather_P           atmospheric pressure.
+            weather_T           air temperature.
+
+    """
+
+    # entries nearest the same station coordinates and time share a cached
+    # search
+    if cache is not None:
+        key = lookup_cache.cell_key(cache, "weather", weather_final, lambda reference: weather_axes(reference, weather_ts),
+                                    0, AIS_lat, AIS_lon, AIS_ts)
+        return lookup_cache.cached_lookup(cache, key, weather_parameter_matching, AIS_lat, AIS_lon, AIS_ts, weather_final, None, weather_ts)
+
+    if weather_ts is None:
+        weather_ts = observation_timestamps(weather_final)
 
     # obtain closest match of weather parameters (lat, lon)
-    weather_lat, weather_lon, weather_ts = find_nearest_weather_element(weather_final, AIS_lat, AIS_lon, AIS_ts)
+    weather_lat, weather_lon, nearest_ts = find_nearest_weather_element(weather_final, AIS_lat, AIS_lon, AIS_ts, weather_ts)
 
 
     # algorithm for getting data assoicated with these points
-    weather_lat_df = weather_final[weather_final["latitude"] == weather_lat]
-    weather_lon_df = weather_lat_df[weather_lat_df["longitude"] == weather_lon]
-    weather_t_df = weather_lon_df[weather_lon_df["local_time"] == weather_ts]
+    weather_t_df = weather_final[(weather_final["latitude"].values == weather_lat)
+                                 & (weather_final["longitude"].values == weather_lon)
+                                 & (weather_ts == nearest_ts)]
 
 
     # obtain wind direction (wind_ID), mean wind speed (Ff), atmospheric
     # pressure (P) and air temperature at 2 meter elevation from that datapoint
-    try:
+    if len(weather_t_df):
+        weather_wind_ID, weather_Ff, weather_P, weather_T = weather_t_df[WEATHER_PARAMETERS].values[0]
 
-        weather_wind_ID[row] = weather_t_df["id_windDirection"].values[0]
-        weather_Ff[row] = weather_t_df["Ff"].values[0]
-        weather_P[row]  = weather_t_df["P"].values[0]
-        weather_T[row]  = weather_t_df["T"].values[0]
+    # account for missing data
+    else:
+        weather_wind_ID, weather_Ff, weather_P, weather_T = np.nan, np.nan, np.nan, np.nan
 
 
-    # account for missing data
-    except:
+    return weather_wind_ID, weather_Ff, weather_P, weather_T
 
-        weather_wind_ID[row] = None
-        weather_Ff[row] = None
-        weather_P[row]  = None
-        weather_T[row]  = None
 
 
-    return weather_wind_ID, weather_Ff, weather_P, weather_T
+def weather_timestamps(local_time, timezone=STATION_TIMEZONE):
+    """
+    X.3 Convert weather observation times into integer UTC timestamps (s) on
+    the same scale as the AIS "t" field. Local date-time strings are
+    localised to their station's time zone first, with times repeated when
+    clocks go back taken as standard time and times skipped when clocks go
+    forward moved past the gap.
+
+    Input:
+
+            local_time          observation times, either timestamps or
+                                local date-time strings.
+            timezone            time zone of every observation, or of each
+                                observation.
+
+    Output:
+
+            weather_ts          integer timestamps (s).
+
+    """
+
+    local_time = pd.Series(local_time)
+
+    if pd.api.types.is_numeric_dtype(local_time):
+        return local_time.values.astype(np.int64)
+
+    local_time = pd.to_datetime(local_time)
+
+    # times already carrying a UTC offset need no time zone
+    if local_time.dt.tz is not None:
+        utc_time = local_time.dt.tz_convert("UTC")
+    else:
+        timezone = pd.Series(np.broadcast_to(np.asarray(timezone, dtype=object), local_time.shape), index=local_time.index)
+        utc_time = pd.Series(pd.NaT, index=local_time.index, dtype="datetime64[ns, UTC]")
+        for zone in timezone.unique():
+            in_zone = (timezone == zone).values
+            utc_time[in_zone] = local_time[in_zone].dt.tz_localize(zone, ambiguous=False, nonexistent='shift_forward').dt.tz_convert("UTC")
+
+    return utc_time.dt.tz_localize(None).values.astype("datetime64[s]").astype(np.int64)
+
+
+
+def station_points(lat, lon):
+    """
+    X.2 Place coordinates on a sphere of the Earth's radius so that straight
+    line distances order stations as great-circle distances do.
+
+    Input:
+
+            lat                 latitude(s) in degrees.
+            lon                 longitude(s) in degrees.
+
+    Output:
+
+            points              array of (x, y, z) points in kilometres.
+
+    """
+
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64))
+    lon_rad = np.radians(np.asarray(lon, dtype=np.float64))
+
+    points = EARTH_RADIUS_KM * np.column_stack([np.cos(lat_rad) * np.cos(lon_rad),
+                                                np.cos(lat_rad) * np.sin(lon_rad),
+                                                np.sin(lat_rad)])
+
+    return points
+
+
+
+def compass_bearing(name):
+    """
+    X.2 Read the bearing (degrees) of a compass point name such as "NNE",
+    "North-northeast" or "Nord-Nord-Est".
+
+    Input:
+
+            name                compass point name.
+
+    Output:
+
+            bearing             bearing of the compass point, NaN for names
+                                that are not one (e.g. calm or variable).
+
+    """
+
+    abbreviation = str(name).upper()
+    for word, letter in COMPASS_WORDS:
+        abbreviation = abbreviation.replace(word, letter)
+
+    # French abbreviations write west as O
+    abbreviation = "".join(letter for letter in abbreviation if letter.isalpha())
+    if set(abbreviation) <= set("NSEO"):
+        abbreviation = abbreviation.replace("O", "W")
+
+    if abbreviation not in COMPASS_POINTS:
+        return np.nan
+
+    return COMPASS_POINTS.index(abbreviation) * 360.0 / len(COMPASS_POINTS)
+
+
+
+def wind_direction_bearings(weather_wind_direction=None):
+    """
+    X.2 Build the bearing (degrees) of each id_windDirection code from the
+    wind direction table, taken from its "degrees" field if it has one and
+    read from its compass point names otherwise.
+
+    Input:
+
+            weather_wind_direction  wind direction table with id_windDirection
+                                    and degrees or name (or direction)
+                                    fields, None for 16 compass points
+                                    numbered clockwise from 1 at north.
+
+    Output:
+
+            wind_bearings       array of the bearing of each code, indexed by
+                                code, NaN for codes without one (e.g. calm or
+                                variable).
+
+    """
+
+    if weather_wind_direction is None:
+        wind_ID = np.arange(1, len(COMPASS_POINTS) + 1)
+        bearings = np.arange(len(COMPASS_POINTS)) * 360.0 / len(COMPASS_POINTS)
+
+    else:
+        wind_ID = weather_wind_direction["id_windDirection"].values.astype(np.int64)
+        if "degrees" in weather_wind_direction.columns:
+            bearings = weather_wind_direction["degrees"].values.astype(np.float64)
+        else:
+            name_field = "name" if "name" in weather_wind_direction.columns else "direction"
+            bearings = np.array([compass_bearing(name) for name in weather_wind_direction[name_field].values], dtype=np.float64)
+
+    wind_bearings = np.full(wind_ID.max() + 1 if len(wind_ID) else 1, np.nan)
+    wind_bearings[wind_ID] = bearings % 360.0
+
+    return wind_bearings
+
+
+
+def build_station_index(weather_final, weather_wind_direction=None):
+    """
+    X.2 Build a KD-tree over the unique weather stations, identified by their
+    coordinates, and key every observation to its station.
+
+    Input:
+
+            weather_final       weather observations with latitude, longitude,
+                                local_time and weather parameters.
+            weather_wind_direction  wind direction table (see
+                                wind_direction_bearings), None for 16
+                                compass points.
+
+    Output:
+
+            station_index       dictionary of the KD-tree, the station
+                                coordinates, the observations sorted by time
+                                with a station key and the bearing of each
+                                wind direction code.
+
+    """
+
+    # observations from unknown stations carry no coordinates
+    weather_final = weather_final.dropna(subset=["latitude", "longitude"])
+
+    # number each unique (latitude, longitude) pair as a station
+    station_key = weather_final.groupby(["latitude", "longitude"], sort=True).ngroup().values
+    stations = weather_final[["latitude", "longitude"]].drop_duplicates().sort_values(["latitude", "longitude"])
+
+    observations = pd.DataFrame({"station": station_key,
+                                 "weather_ts": observation_timestamps(weather_final)})
+    for parameter in WEATHER_PARAMETERS:
+        observations[parameter] = weather_final[parameter].values
+
+    station_index = {
+        "tree": cKDTree(station_points(stations["latitude"].values, stations["longitude"].values)),
+        "latitude": stations["latitude"].values,
+        "longitude": stations["longitude"].values,
+        "observations": observations.sort_values("weather_ts", kind="stable").reset_index(drop=True),
+        "wind_bearings": wind_direction_bearings(weather_wind_direction),
+    }
+
+    return station_index
+
+
+
+def match_weather(ais_df, station_index, tolerance=3 * 3600, direction="nearest", interpolate=False, max_gap=WEATHER_MAX_GAP):
+    """
+    X.3 Match every entry of an AIS dataset with weather parameters in two
+    steps: the nearest station to each entry is found through the station
+    index, then the station's observation closest in time is joined with a
+    sorted as-of join.
+
+    Inputs:
+
+            ais_df              dynamic AIS dataset with lat, lon and t fields.
+            station_index       weather station KD-tree index.
+            tolerance           largest time difference (s) between an AIS
+                                entry and a joined observation.
+            direction           "nearest", "backward" or "forward" as-of
+                                search within each station.
+            interpolate         True to interpolate between the reports
+                                bracketing each entry (see
+                                interpolate_observations) rather than join
+                                the closest one.
+            max_gap             longest time (s) between two reports still
+                                interpolated between.
+
+    Outputs:
+
+            weather_matches     dataframe of id_windDirection, Ff, P and T
+                                aligned with ais_df, with NaN where no
+                                observation lies within the tolerance.
+
+    """
+
+    # 1. nearest station for every AIS entry at once
+    _, station = station_index["tree"].query(station_points(ais_df["lat"].values, ais_df["lon"].values))
+
+    # 2. as-of join (or interpolation) on time within each station
+    if interpolate:
+        matched = interpolate_observations(station_index, station, ais_df["t"].values, max_gap, tolerance)
+    else:
+        matched = station_observations(station_index, station, ais_df["t"].values, tolerance, direction)
+
+    weather_matches = pd.DataFrame(matched, columns=WEATHER_PARAMETERS, index=ais_df.index)
+
+    return weather_matches
+
+
+
+def station_observations(station_index, station, AIS_ts, tolerance=3 * 3600, direction="nearest"):
+    """
+    X.3 Join each AIS entry with the observation of a given station closest
+    in time, through a sorted as-of join.
+
+    Inputs:
+
+            station_index       weather station KD-tree index.
+            station             station of each AIS entry, -1 for none.
+            AIS_ts              timestamps of AIS entries.
+            tolerance           largest time difference (s) between an AIS
+                                entry and a joined observation.
+            direction           "nearest", "backward" or "forward" as-of
+                                search within each station.
+
+    Outputs:
+
+            matched             array of id_windDirection, Ff, P and T, one
+                                row per entry, NaN where no observation lies
+                                within the tolerance.
+
+    """
+
+    ais_keys = pd.DataFrame({"row": np.arange(len(AIS_ts)),
+                             "station": np.asarray(station, dtype=np.int64),
+                             "weather_ts": np.asarray(AIS_ts).astype(np.int64)})
+    ais_keys = ais_keys.sort_values("weather_ts", kind="stable")
+
+    joined = pd.merge_asof(ais_keys, station_index["observations"], on="weather_ts", by="station",
+                           tolerance=int(tolerance), direction=direction)
+
+    matched = np.empty((len(AIS_ts), len(WEATHER_PARAMETERS)))
+    matched[joined["row"].values] = joined[WEATHER_PARAMETERS].values.astype(np.float64)
+
+    return matched
+
+
+
+def chord_to_great_circle(chord_km):
+    """
+    X.4 Convert straight-line distances between points of station_points
+    into great-circle distances (km).
+
+    """
+
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord_km) / (2.0 * EARTH_RADIUS_KM), 0.0, 1.0))
+
+
+
+def great_circle_to_chord(distance_km):
+    """
+    X.4 Convert great-circle distances (km) into straight-line distances
+    between points of station_points.
+
+    """
+
+    return 2.0 * EARTH_RADIUS_KM * np.sin(np.minimum(np.asarray(distance_km, dtype=np.float64), np.pi * EARTH_RADIUS_KM) / (2.0 * EARTH_RADIUS_KM))
+
+
+
+def query_stations(station_index, AIS_lat, AIS_lon, k=WEATHER_K_NEAREST, max_radius_km=WEATHER_MAX_RADIUS_KM):
+    """
+    X.4 Find the k nearest stations to every AIS entry in one batched query,
+    keeping only stations within the search radius.
+
+    Inputs:
+
+            station_index       weather station KD-tree index.
+            AIS_lat             latitudes of AIS entries.
+            AIS_lon             longitudes of AIS entries.
+            k                   number of stations per entry.
+            max_radius_km       largest great-circle distance (km) to a
+                                station.
+
+    Outputs:
+
+            distance_km         great-circle distances, shape (entries, k),
+                                inf where fewer stations lie in the radius.
+            station             station numbers, shape (entries, k), -1
+                                where fewer stations lie in the radius.
+
+    """
+
+    AIS_points = station_points(AIS_lat, AIS_lon)
+    chord_km, station = station_index["tree"].query(AIS_points, k=k, distance_upper_bound=great_circle_to_chord(max_radius_km))
+    chord_km, station = chord_km.reshape(len(AIS_points), k), station.reshape(len(AIS_points), k)
+
+    # missing neighbours are returned with the number of stations as index
+    found = station < station_index["tree"].n
+    distance_km = np.where(found, chord_to_great_circle(np.where(found, chord_km, 0.0)), np.inf)
+    station = np.where(found, station, -1)
+
+    return distance_km, station
+
+
+
+def wind_id_to_degrees(wind_ID, wind_bearings):
+    """
+    X.4 Convert id_windDirection codes to bearings (degrees), NaN for missing
+    codes and codes without a bearing.
+
+    """
+
+    wind_ID = np.asarray(wind_ID, dtype=np.float64)
+    known = np.isfinite(wind_ID) & (wind_ID >= 0) & (wind_ID < len(wind_bearings))
+
+    return np.where(known, wind_bearings[np.where(known, wind_ID, 0).astype(np.int64)], np.nan)
+
+
+
+def degrees_to_wind_id(degrees, wind_bearings):
+    """
+    X.4 Convert bearings (degrees) to the id_windDirection code of the
+    nearest bearing on the circle, the lowest code on ties, keeping NaN. All
+    are NaN where no code has a bearing.
+
+    """
+
+    degrees = np.asarray(degrees, dtype=np.float64)
+    directional_ID = np.flatnonzero(np.isfinite(wind_bearings))
+
+    if len(directional_ID) == 0:
+        return np.full(degrees.shape, np.nan)
+
+    # angular distance to each directional code's bearing
+    difference = np.abs((degrees[..., None] - wind_bearings[directional_ID] + 180.0) % 360.0 - 180.0)
+    nearest_ID = directional_ID[np.argmin(np.nan_to_num(difference, nan=0.0), axis=-1)].astype(np.float64)
+
+    return np.where(np.isnan(degrees), np.nan, nearest_ID)
+
+
+
+def blend_wind_direction(wind_ID, weight, wind_bearings):
+    """
+    X.4 Blend id_windDirection codes on the circle by given weights. Codes
+    without a bearing (e.g. calm or variable) are left out of the blend,
+    and only where no code has a bearing is the most heavily weighted code
+    kept.
+
+    Inputs:
+
+            wind_ID             codes, shape (entries, k).
+            weight              weights, shape (entries, k).
+            wind_bearings       bearing of each code (see
+                                wind_direction_bearings).
+
+    Outputs:
+
+            blended_ID          code of the blended bearing of each entry,
+                                NaN where no weighted code exists.
+
+    """
+
+    wind_ID = np.asarray(wind_ID, dtype=np.float64)
+    degrees = wind_id_to_degrees(wind_ID, wind_bearings)
+
+    blended = weighted_blend(degrees[:, :, None], weight, np.array([True]))[:, 0]
+    blended_ID = degrees_to_wind_id(blended, wind_bearings)
+
+    # entries with no bearing keep the most heavily weighted code
+    weight = np.where(np.isnan(wind_ID), 0.0, weight)
+    undirected = np.isnan(blended_ID) & (weight.max(axis=1) > 0)
+    strongest = wind_ID[np.arange(len(wind_ID)), np.argmax(weight, axis=1)]
+    blended_ID[undirected] = strongest[undirected]
+
+    return blended_ID
+
+
+
+def weighted_blend(values, weight, circular):
+    """
+    X.4 Blend values by given weights, leaving missing values out. Circular
+    parameters (degrees) are blended as unit vectors.
+
+    Inputs:
+
+            values              array of shape (entries, k, parameters).
+            weight              weights, shape (entries, k).
+            circular            boolean array marking circular parameters.
+
+    Outputs:
+
+            blended             array of shape (entries, parameters), NaN
+                                where no weighted value exists.
+
+    """
+
+    weight = np.where(np.isnan(values), 0.0, weight[:, :, None])
+    values = np.nan_to_num(values)
+    total_weight = weight.sum(axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        blended = (weight * values).sum(axis=1) / total_weight
+
+    radians = np.radians(values[:, :, circular])
+    blended_cos = (weight[:, :, circular] * np.cos(radians)).sum(axis=1)
+    blended_sin = (weight[:, :, circular] * np.sin(radians)).sum(axis=1)
+
+    blended[:, circular] = np.degrees(np.arctan2(blended_sin, blended_cos)) % 360.0
+    blended[total_weight == 0] = np.nan
+
+    return blended
+
+
+
+def idw_blend(values, distance_km, circular, power=IDW_POWER):
+    """
+    X.4 Blend the values of neighbouring stations by inverse distance
+    weighting (see weighted_blend).
+
+    Inputs:
+
+            values              array of shape (entries, k, parameters).
+            distance_km         great-circle distances, shape (entries, k).
+            circular            boolean array marking circular parameters.
+            power               power of the inverse distance weights.
+
+    Outputs:
+
+            blended             array of shape (entries, parameters), NaN
+                                where no neighbour has a value.
+
+    """
+
+    return weighted_blend(values, idw_weights(distance_km, power), circular)
+
+
+
+def idw_weights(distance_km, power=IDW_POWER):
+    """
+    X.4 Return the inverse distance weights of neighbouring stations, zero
+    for missing (infinitely distant) neighbours.
+
+    """
+
+    # a station at the entry's position outweighs every other
+    return 1.0 / np.maximum(distance_km, 1e-6) ** power
+
+
+
+def match_weather_idw(ais_df, station_index, k=WEATHER_K_NEAREST, max_radius_km=WEATHER_MAX_RADIUS_KM,
+                      tolerance=3 * 3600, power=IDW_POWER, interpolate=False, max_gap=WEATHER_MAX_GAP):
+    """
+    X.4 Match every entry of an AIS dataset with weather parameters blended
+    from its k nearest stations by great-circle distance. Ff, P and T are
+    inverse distance weighted and wind direction is averaged on the circle
+    with the same weights, leaving out codes without a bearing (see
+    blend_wind_direction). Entries with no station within the search radius
+    (e.g. on the open sea) get NaN.
+
+    Inputs:
+
+            ais_df              dynamic AIS dataset with lat, lon and t fields.
+            station_index       weather station KD-tree index.
+            k                   number of stations blended.
+            max_radius_km       largest great-circle distance (km) to a
+                                blended station.
+            tolerance           largest time difference (s) between an AIS
+                                entry and a station's observation.
+            power               power of the inverse distance weights.
+            interpolate         True to interpolate each station's reports in
+                                time (see interpolate_observations).
+            max_gap             longest time (s) between two reports still
+                                interpolated between.
+
+    Outputs:
+
+            weather_matches     dataframe of id_windDirection, Ff, P and T
+                                aligned with ais_df.
+
+    """
+
+    distance_km, station = query_stations(station_index, ais_df["lat"].values, ais_df["lon"].values, k, max_radius_km)
+
+    # observations of each neighbour, as (entries, k, parameters)
+    if interpolate:
+        values = np.stack([interpolate_observations(station_index, station[:, neighbour], ais_df["t"].values, max_gap, tolerance)
+                           for neighbour in range(station.shape[1])], axis=1)
+    else:
+        values = np.stack([station_observations(station_index, station[:, neighbour], ais_df["t"].values, tolerance)
+                           for neighbour in range(station.shape[1])], axis=1)
+
+    # wind direction codes are blended on the circle, the rest linearly
+    wind = WEATHER_PARAMETERS.index("id_windDirection")
+    blended = idw_blend(values, distance_km, np.zeros(len(WEATHER_PARAMETERS), dtype=bool), power)
+    blended[:, wind] = blend_wind_direction(values[:, :, wind], idw_weights(distance_km, power), station_index["wind_bearings"])
+
+    weather_matches = pd.DataFrame(blended, columns=WEATHER_PARAMETERS, index=ais_df.index)
+
+    return weather_matches
+
+
+
+def station_series(station_index):
+    """
+    X.5 Sort the observations by station then time, once per station index,
+    and key each to a single sortable (station, time) value.
+
+    Input:
+
+            station_index       weather station KD-tree index.
+
+    Output:
+
+            series              dictionary of the sorted (station, time) keys,
+                                timestamps and parameters of the observations,
+                                and the time origin and span used in the keys.
+
+    """
+
+    if "series" in station_index:
+        return station_index["series"]
+
+    observations = station_index["observations"]
+    station = observations["station"].values.astype(np.int64)
+    weather_ts = observations["weather_ts"].values.astype(np.int64)
+    order = np.lexsort((weather_ts, station))
+
+    # times are offset from the origin so each station's keys form a block
+    ts_origin = weather_ts.min() if len(weather_ts) else 0
+    ts_span = (weather_ts.max() - ts_origin + 1) if len(weather_ts) else 1
+
+    values = observations[WEATHER_PARAMETERS].values.astype(np.float64)[order]
+
+    series = {
+        "key": station[order] * ts_span + (weather_ts[order] - ts_origin),
+        "weather_ts": weather_ts[order],
+        "station": station[order],
+        "values": values,
+        "ts_origin": ts_origin,
+        "ts_span": ts_span,
+    }
+    station_index["series"] = series
+
+    return series
+
+
+
+def interpolate_observations(station_index, station, AIS_ts, max_gap=WEATHER_MAX_GAP, tolerance=3 * 3600):
+    """
+    X.5 Interpolate a given station's observations linearly in time at each
+    AIS entry. The reports either side of every entry are found with one
+    binary search over the sorted (station, time) keys. Reports further apart
+    than the staleness limit are not blended; the closer one is used instead
+    if it lies within the tolerance, as are single reports before the first or
+    after the last. Wind direction is interpolated on the circle, leaving out
+    codes without a bearing (see blend_wind_direction).
+
+    Inputs:
+
+            station_index       weather station KD-tree index.
+            station             station of each AIS entry, -1 for none.
+            AIS_ts              timestamps of AIS entries.
+            max_gap             longest time (s) between two reports still
+                                interpolated between.
+            tolerance           largest time difference (s) between an AIS
+                                entry and a report used alone.
+
+    Outputs:
+
+            matched             array of id_windDirection, Ff, P and T, one
+                                row per entry, NaN where no report is usable.
+
+    """
+
+    series = station_series(station_index)
+    station = np.asarray(station, dtype=np.int64)
+    AIS_ts = np.asarray(AIS_ts).astype(np.int64)
+
+    # without observations no report is usable
+    if len(series["key"]) == 0:
+        return np.full((len(AIS_ts), len(WEATHER_PARAMETERS)), np.nan)
+
+    # latest report at or before each entry, within the entry's station
+    offset = np.clip(AIS_ts - series["ts_origin"], -1, series["ts_span"])
+    right = np.searchsorted(series["key"], station * series["ts_span"] + offset, side="right")
+    left = right - 1
+
+    n_obs = len(series["key"])
+    has_left = (left >= 0) & (series["station"][np.clip(left, 0, n_obs - 1)] == station) & (station >= 0)
+    has_right = (right < n_obs) & (series["station"][np.clip(right, 0, n_obs - 1)] == station) & (station >= 0)
+    left, right = np.clip(left, 0, n_obs - 1), np.clip(right, 0, n_obs - 1)
+
+    # time weights of the two reports, blending only across short gaps
+    left_dt = np.where(has_left, AIS_ts - series["weather_ts"][left], np.inf)
+    right_dt = np.where(has_right, series["weather_ts"][right] - AIS_ts, np.inf)
+    blend = has_left & has_right & (left_dt + right_dt <= max_gap)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        right_weight = np.where(blend, left_dt / (left_dt + right_dt), 0.0)
+    left_weight = np.where(blend, 1.0 - right_weight, 0.0)
+
+    # otherwise the closer report alone, within the tolerance
+    use_left = ~blend & (left_dt <= right_dt) & (left_dt <= tolerance)
+    use_right = ~blend & (right_dt < left_dt) & (right_dt <= tolerance)
+    left_weight[use_left] = 1.0
+    right_weight[use_right] = 1.0
+
+    values = np.stack([series["values"][left], series["values"][right]], axis=1)
+    weight = np.column_stack([left_weight, right_weight])
+
+    # blend the two reports, leaving missing values out, with wind direction
+    # codes blended on the circle
+    wind = WEATHER_PARAMETERS.index("id_windDirection")
+    matched = weighted_blend(values, weight, np.zeros(len(WEATHER_PARAMETERS), dtype=bool))
+    matched[:, wind] = blend_wind_direction(values[:, :, wind], weight, station_index["wind_bearings"])
+
+    return matched